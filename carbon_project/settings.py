@@ -44,7 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'predictor.profiling.SlowRequestProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'predictor.staticfiles.StaticAssetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,13 +61,19 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -123,6 +131,196 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+
+# Predictor performance settings
+
+# Micro-batching of concurrent single predictions: rows arriving within
+# WINDOW_MS (or until MAX_BATCH_SIZE rows) share one model.predict call. A
+# row not answered within RESULT_TIMEOUT_MS is predicted directly instead
+PREDICTOR_MICROBATCH = {
+    'ENABLED': False,
+    'WINDOW_MS': 2.0,
+    'MAX_BATCH_SIZE': 64,
+    'RESULT_TIMEOUT_MS': 1000,
+}
+
+# Async API views (/api/async/...): model calls run on a bounded executor,
+# at most MAX_CONCURRENCY requests per process are in flight and callers
+# waiting longer than QUEUE_TIMEOUT_S for a slot get a 503
+PREDICTOR_ASYNC = {
+    'EXECUTOR_WORKERS': 4,
+    'MAX_CONCURRENCY': 256,
+    'QUEUE_TIMEOUT_S': 1.0,
+}
+
+# Admission control for /api/predict/: a request whose expected latency
+# ((in-flight // WORKERS + 1) * moving p95 service time) exceeds
+# LATENCY_BUDGET_MS is shed with 503 + Retry-After, or served by the
+# analytic engine when DEGRADE is True
+PREDICTOR_ADMISSION = {
+    'ENABLED': True,
+    'LATENCY_BUDGET_MS': 2000,
+    'WORKERS': 1,
+    'DEGRADE': False,
+}
+
+# Per-client token buckets for the predictor API, keyed by X-API-Key when
+# it is listed in API_KEYS (client IP otherwise). The client IP is
+# REMOTE_ADDR; behind NUM_PROXIES trusted reverse proxies it is read from
+# X-Forwarded-For instead. Buckets refill at RATE tokens/s up to BURST; batch
+# requests cost one token per row. Setting SHARED_LIMIT_PER_MINUTE adds a
+# cross-process cap stored in the SHARED_CACHE cache alias, which must be a
+# cache all workers share (not the default local-memory cache)
+PREDICTOR_THROTTLE = {
+    'ENABLED': True,
+    'RATE': 1000,
+    'BURST': 10000,
+    'MAX_BUCKETS': 10000,
+    'SHARED_LIMIT_PER_MINUTE': None,
+    'SHARED_CACHE': 'default',
+    'API_KEYS': (),
+    'NUM_PROXIES': 0,
+}
+
+# /api/metrics/: with MULTIPROCESS_DIR set each worker copies its counters
+# into an mmap'd file there every FLUSH_INTERVAL_S and a scrape sums them;
+# exited workers' files are folded into predictor_dead.bin by the next
+# worker to start (clear the directory on deploy)
+PREDICTOR_METRICS = {
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL_S': 1.0,
+}
+
+# Input drift: every prediction is binned against the training histograms
+# stored in the model artifact (and flagged when an input is outside the
+# training range); every INTERVAL_S a background thread scores the window,
+# whose counts halve every HALF_LIFE_S, by PSI and KS. Once it holds
+# MIN_SAMPLES, features over either threshold are reported as drifting.
+PREDICTOR_DRIFT = {
+    'ENABLED': True,
+    'INTERVAL_S': 10,
+    'HALF_LIFE_S': 3600,
+    'MIN_SAMPLES': 200,
+    'PSI_THRESHOLD': 0.2,
+    'KS_THRESHOLD': 0.1,
+}
+
+# /api/live/: each worker keeps its newest SIZE predictions in a ring buffer
+# and streams new ones as server-sent events (a new stream starts with the
+# last BACKLOG). With SOCKET_DIR set, workers also forward their predictions
+# to each other over Unix datagram sockets there, so every stream sees all
+# of them. Streams close after MAX_STREAM_S and the browser reconnects.
+# Every stream holds a worker thread: a worker serves at most
+# MAX_SUBSCRIBERS of them and answers more with 503 (Retry-After
+# RETRY_AFTER_S).
+PREDICTOR_LIVE = {
+    'ENABLED': True,
+    'SIZE': 256,
+    'BACKLOG': 20,
+    'SOCKET_DIR': None,
+    'HEARTBEAT_S': 15,
+    'MAX_STREAM_S': 300,
+    'MAX_SUBSCRIBERS': 8,
+    'RETRY_AFTER_S': 30,
+}
+
+# Request profiler: samples SAMPLE_RATE of requests under PATH_PREFIXES plus
+# every request slower than SLOW_THRESHOLD_MS, keeping the newest
+# MAX_PROFILES collapsed-stack profiles in DIRECTORY (listed at
+# /admin/profiles/). Disabled, the middleware is removed from the stack
+PREDICTOR_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    'SLOW_THRESHOLD_MS': 500,
+    'INTERVAL_MS': 5,
+    'PATH_PREFIXES': ['/api/'],
+    'DIRECTORY': BASE_DIR / 'profiles',
+    'MAX_PROFILES': 100,
+}
+
+# PredictionLog retention: archive_predictions moves rows older than
+# MAX_AGE_DAYS into gzipped NDJSON files partitioned by day under
+# ARCHIVE_DIR (YYYY/MM/DD/predictions-<first id>-<last id>.ndjson.gz),
+# deleting them from the table BATCH_SIZE rows at a time
+PREDICTOR_RETENTION = {
+    'MAX_AGE_DAYS': 365,
+    'ARCHIVE_DIR': BASE_DIR / 'archive',
+    'BATCH_SIZE': 10000,
+}
+
+# HTTP caching of /api/materials/, /api/model-info/, the home page and
+# GET /api/predict/: ETags follow the model artifact's version hash (plus
+# the factor version and inputs for predictions); responses may be reused
+# for MAX_AGE / PREDICT_MAX_AGE seconds, then revalidate to a 304.
+# PREDICT_GET=False turns the GET form of predict off
+PREDICTOR_HTTP_CACHE = {
+    'MAX_AGE': 300,
+    'PREDICT_MAX_AGE': 3600,
+    'PREDICT_GET': True,
+}
+
+# Rendered home and insights pages (and their {% cache %} fragments) are
+# kept in the CACHE alias for TIMEOUT seconds under the model, factor and
+# template versions; use a shared cache backend to share them across workers
+PREDICTOR_PAGE_CACHE = {
+    'ENABLED': True,
+    'TIMEOUT': 3600,
+    'CACHE': 'default',
+}
+
+# Emission-factor registry: each process caches the factor tables and
+# checks the FactorVersion counter at most every CHECK_INTERVAL_S seconds
+# (changes made in the same process apply on commit)
+PREDICTOR_FACTORS = {
+    'CHECK_INTERVAL_S': 5.0,
+}
+
+# Opt-in SQLite tuning for concurrent log writes: with ENABLED the default
+# database uses predictor.sqlite_backend (WAL, synchronous=NORMAL,
+# busy_timeout, CACHE_SIZE_KB page cache, MMAP_SIZE bytes of mmap I/O,
+# BEGIN IMMEDIATE transactions, BUSY_RETRIES retries with exponential
+# backoff from BUSY_BACKOFF_MS) and keeps connections for CONN_MAX_AGE seconds
+PREDICTOR_SQLITE = {
+    'ENABLED': False,
+    'BUSY_TIMEOUT_MS': 5000,
+    'SYNCHRONOUS': 'NORMAL',
+    'CACHE_SIZE_KB': 65536,
+    'MMAP_SIZE': 256 * 1024 * 1024,
+    'BUSY_RETRIES': 5,
+    'BUSY_BACKOFF_MS': 10,
+    'CONN_MAX_AGE': 600,
+}
+
+if PREDICTOR_SQLITE['ENABLED']:
+    DATABASES['default'].update({
+        'ENGINE': 'predictor.sqlite_backend',
+        'CONN_MAX_AGE': PREDICTOR_SQLITE['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Production static assets: with ENABLED, `manage.py build_assets` collects
+# STATIC_ROOT under content-hashed names with .gz/.br siblings (brotli if
+# installed), after rewriting videos into BUILD_DIR (index first, or
+# re-encoded at VIDEO_MAX_HEIGHT / VIDEO_CRF with --transcode), and
+# StaticAssetMiddleware serves it: hashed names are immutable for a year,
+# other files are cached for MAX_AGE seconds, and byte ranges get a 206.
+# Text assets under COMPRESS_MIN_BYTES are left uncompressed
+PREDICTOR_STATIC = {
+    'ENABLED': not DEBUG,
+    'BUILD_DIR': BASE_DIR / 'build' / 'static',
+    'MAX_AGE': 60,
+    'COMPRESS_MIN_BYTES': 512,
+    'VIDEO_MAX_HEIGHT': 720,
+    'VIDEO_CRF': 30,
+}
+
+if PREDICTOR_STATIC['ENABLED']:
+    STATICFILES_DIRS.insert(0, PREDICTOR_STATIC['BUILD_DIR'])
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'predictor.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
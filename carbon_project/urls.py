@@ -16,8 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from predictor.admin import admin_urls
 
 urlpatterns = [
+    path('admin/', include(admin_urls)),
     path('admin/', admin.site.urls),
     path('api/', include('predictor.urls')),
     path('', include('core.urls')),
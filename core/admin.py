@@ -1,18 +1,220 @@
+import datetime
+
 from django.contrib import admin
-from .models import MaterialFactor, PredictionLog
+from django.contrib.admin.views.main import IGNORED_PARAMS, ChangeList
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+
+from predictor.analytics import day_counts
+from predictor.factors import registry as factor_registry
+from .models import ManufacturingIntensity, MaterialFactor, PredictionLog, TransportFactor
 
 
 @admin.register(MaterialFactor)
 class MaterialFactorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'emission_factor_kg_co2_per_kg', 'manufacturing_intensity', 'biodegradable']
+    list_display = ['name', 'category', 'emission_factor_kg_co2_per_kg', 'manufacturing_multiplier',
+                    'manufacturing_intensity', 'biodegradable']
     list_filter = ['category', 'manufacturing_intensity', 'biodegradable']
     search_fields = ['name', 'category']
 
 
+@admin.register(TransportFactor)
+class TransportFactorAdmin(admin.ModelAdmin):
+    list_display = ['mode', 'kg_co2_per_kg_per_1000km']
+
+
+@admin.register(ManufacturingIntensity)
+class ManufacturingIntensityAdmin(admin.ModelAdmin):
+    list_display = ['level', 'base_kg_co2_per_kg']
+
+
+# Query-string key holding the keyset position ("<created_at iso>_<id>")
+CURSOR_VAR = 'cursor'
+
+# Results are counted exactly up to this many rows, estimated beyond it
+COUNT_CAP = 10000
+
+
+class MaterialListFilter(admin.SimpleListFilter):
+    """Material choices from the factor registry instead of SELECT DISTINCT over the log"""
+    title = 'material'
+    parameter_name = 'material'
+
+    def lookups(self, request, model_admin):
+        return [(name, name) for name in sorted(factor_registry.get().materials)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(material=self.value())
+        return queryset
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist that never scans the whole table: pages by (created_at, id)
+    keyset, counts at most COUNT_CAP rows (estimating larger results from
+    the daily rollups) and builds the date drilldown from the rollups
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = getattr(request, 'keyset_cursor', None)
+        super().__init__(request, *args, **kwargs)
+
+    def get_results(self, request):
+        queryset = self.queryset
+        if self.cursor:
+            created_at, pk = self.cursor
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+        rows = list(queryset[:self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        self.result_list = rows[:self.list_per_page]
+        self.next_cursor = None
+        if has_next:
+            last = self.result_list[-1]
+            self.next_cursor = f'{last.created_at.isoformat()}_{last.pk}'
+
+        self.result_count, self.count_is_estimate = self._count()
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = has_next or bool(self.cursor)
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+    def _count(self):
+        """(count, is_estimate) - exact below COUNT_CAP, from rollups above it when possible"""
+        capped = self.queryset.order_by()[:COUNT_CAP + 1].count()
+        if capped <= COUNT_CAP:
+            return capped, False
+        counts = self._day_counts()
+        if counts is None:
+            return COUNT_CAP, True
+        start, end = self._date_range()
+        return sum(n for day, n in counts.items()
+                   if (start is None or day >= start) and (end is None or day < end)), True
+
+    def _day_counts(self):
+        """Per-day counts for the active filters, or None when rollups can't answer them"""
+        if not hasattr(self, '_counts'):
+            dimension_filters = {key: self.params[key] for key in ('material', 'transport_mode') if key in self.params}
+            other = set(self.params) - set(dimension_filters) - set(IGNORED_PARAMS) - {
+                f'{self.date_hierarchy}__{part}' for part in ('year', 'month', 'day')
+            }
+            if self.query or other or len(dimension_filters) > 1:
+                self._counts = None
+            else:
+                dimension, value = next(iter(dimension_filters.items()), ('transport_mode', None))
+                self._counts = day_counts(dimension, value, start=self._oldest_day())
+        return self._counts
+
+    def _oldest_day(self):
+        """Midnight of the oldest row still in the table (rollups outlive retention)"""
+        oldest = PredictionLog.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        if oldest is None:
+            return None
+        return timezone.localtime(oldest).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _lookups(self):
+        field = self.date_hierarchy
+        return [self.params.get(f'{field}__{part}') for part in ('year', 'month', 'day')]
+
+    def _date_range(self):
+        """[start, end) dates selected in the date hierarchy"""
+        year, month, day = self._lookups()
+        if not year:
+            return None, None
+        if day and month:
+            start = datetime.date(int(year), int(month), int(day))
+            return start, start + datetime.timedelta(days=1)
+        if month:
+            start = datetime.date(int(year), int(month), 1)
+            return start, (start + datetime.timedelta(days=32)).replace(day=1)
+        return datetime.date(int(year), 1, 1), datetime.date(int(year) + 1, 1, 1)
+
+    def rollup_date_hierarchy(self):
+        """Same context as the admin date_hierarchy tag, built from per-day rollup counts"""
+        field = self.date_hierarchy
+        year_field, month_field, day_field = (f'{field}__{part}' for part in ('year', 'month', 'day'))
+        year, month, day = self._lookups()
+        counts = self._day_counts()
+        if counts is None:
+            counts = day_counts(start=self._oldest_day())
+        days = sorted(d for d, n in counts.items() if n)
+
+        def link(filters):
+            return self.get_query_string(filters, [f'{field}__', CURSOR_VAR])
+
+        if not (year or month or day) and days:
+            if days[0].year == days[-1].year:
+                year = days[0].year
+                if days[0].month == days[-1].month:
+                    month = days[0].month
+
+        if year and month and day:
+            selected = datetime.date(int(year), int(month), int(day))
+            return {
+                'show': True,
+                'back': {'link': link({year_field: year, month_field: month}),
+                         'title': capfirst(formats.date_format(selected, 'YEAR_MONTH_FORMAT'))},
+                'choices': [{'title': capfirst(formats.date_format(selected, 'MONTH_DAY_FORMAT'))}],
+            }
+        if year and month:
+            return {
+                'show': True,
+                'back': {'link': link({year_field: year}), 'title': str(year)},
+                'choices': [
+                    {'link': link({year_field: year, month_field: month, day_field: d.day}),
+                     'title': capfirst(formats.date_format(d, 'MONTH_DAY_FORMAT'))}
+                    for d in days if d.year == int(year) and d.month == int(month)
+                ],
+            }
+        if year:
+            months = sorted({d.replace(day=1) for d in days if d.year == int(year)})
+            return {
+                'show': True,
+                'back': {'link': link({}), 'title': 'All dates'},
+                'choices': [
+                    {'link': link({year_field: year, month_field: m.month}),
+                     'title': capfirst(formats.date_format(m, 'YEAR_MONTH_FORMAT'))}
+                    for m in months
+                ],
+            }
+        return {
+            'show': True,
+            'back': None,
+            'choices': [
+                {'link': link({year_field: y}), 'title': str(y)}
+                for y in sorted({d.year for d in days})
+            ],
+        }
+
+
 @admin.register(PredictionLog)
 class PredictionLogAdmin(admin.ModelAdmin):
     list_display = ['product_name', 'material', 'weight_kg', 'transport_mode', 'predicted_co2_kg', 'created_at']
-    list_filter = ['material', 'transport_mode', 'created_at']
+    list_filter = [MaterialListFilter, 'transport_mode', 'created_at']
     search_fields = ['product_name', 'material']
     readonly_fields = ['created_at']
     date_hierarchy = 'created_at'
+    # Keyset pagination needs the fixed (-created_at, -id) order
+    sortable_by = ()
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def changelist_view(self, request, extra_context=None):
+        # Take the cursor out of GET so the changelist doesn't treat it as a field lookup
+        request.keyset_cursor = None
+        if CURSOR_VAR in request.GET:
+            request.GET = request.GET.copy()
+            created_at, _, pk = request.GET.pop(CURSOR_VAR)[-1].rpartition('_')
+            try:
+                cursor_time = datetime.datetime.fromisoformat(created_at)
+                if timezone.is_naive(cursor_time):
+                    cursor_time = timezone.make_aware(cursor_time)
+                request.keyset_cursor = (cursor_time, int(pk))
+            except ValueError:
+                pass
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,84 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('dimension', models.CharField(choices=[('material', 'Material'), ('transport_mode', 'Transport mode')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum_co2', models.FloatField(default=0.0)),
+                ('min_co2', models.FloatField(null=True)),
+                ('max_co2', models.FloatField(null=True)),
+                ('sum_material_co2', models.FloatField(default=0.0)),
+                ('min_material_co2', models.FloatField(null=True)),
+                ('max_material_co2', models.FloatField(null=True)),
+                ('sum_manufacturing_co2', models.FloatField(default=0.0)),
+                ('min_manufacturing_co2', models.FloatField(null=True)),
+                ('max_manufacturing_co2', models.FloatField(null=True)),
+                ('sum_transport_co2', models.FloatField(default=0.0)),
+                ('min_transport_co2', models.FloatField(null=True)),
+                ('max_transport_co2', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Rollups',
+                'ordering': ['bucket_start', 'dimension', 'value'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('dimension', models.CharField(choices=[('material', 'Material'), ('transport_mode', 'Transport mode')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum_co2', models.FloatField(default=0.0)),
+                ('min_co2', models.FloatField(null=True)),
+                ('max_co2', models.FloatField(null=True)),
+                ('sum_material_co2', models.FloatField(default=0.0)),
+                ('min_material_co2', models.FloatField(null=True)),
+                ('max_material_co2', models.FloatField(null=True)),
+                ('sum_manufacturing_co2', models.FloatField(default=0.0)),
+                ('min_manufacturing_co2', models.FloatField(null=True)),
+                ('max_manufacturing_co2', models.FloatField(null=True)),
+                ('sum_transport_co2', models.FloatField(default=0.0)),
+                ('min_transport_co2', models.FloatField(null=True)),
+                ('max_transport_co2', models.FloatField(null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Hourly Rollups',
+                'ordering': ['bucket_start', 'dimension', 'value'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'bucket_start', 'value'), name='daily_rollup_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyrollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'bucket_start', 'value'), name='hourly_rollup_key'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_prediction_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='co2_digest',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='hourlyrollup',
+            name='co2_digest',
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_rollup_digests'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='predictionlog',
+            index=models.Index(fields=['created_at'], name='predlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionlog',
+            index=models.Index(fields=['material', 'created_at'], name='predlog_material_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictionlog',
+            index=models.Index(fields=['transport_mode', 'created_at'], name='predlog_mode_created_idx'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.0.1 on 2026-10-19 17:31
+
+from django.db import migrations, models
+
+
+# Factors previously hard-coded in predictor/training/train_model.py
+# (kg CO2e per kg, manufacturing multiplier) and predictor/services.py
+MATERIALS = {
+    'Material': {
+        'Cotton': (5.5, 1.3), 'Polyester': (6.2, 1.5), 'Wool': (10.4, 1.4), 'Leather': (17.0, 2.0),
+        'Steel': (2.8, 1.8), 'Aluminum': (8.2, 2.5), 'Plastic': (3.5, 1.6), 'Glass': (0.9, 1.2),
+        'Paper': (1.3, 1.0), 'Wood': (0.5, 0.8),
+    },
+    'Animal Product': {
+        'Beef': (27.0, 1.2), 'Lamb': (24.0, 1.2), 'Pork': (12.1, 1.1), 'Chicken': (6.9, 1.0),
+        'Turkey': (10.9, 1.0),
+    },
+    'Seafood': {'Fish_Farmed': (5.1, 0.9), 'Fish_Wild': (2.9, 0.8), 'Shrimp': (18.0, 1.3)},
+    'Dairy & Eggs': {'Milk': (1.9, 0.7), 'Cheese': (13.5, 1.0), 'Eggs': (4.8, 0.9), 'Butter': (12.0, 0.9)},
+    'Plant Protein': {'Tofu': (2.0, 0.8), 'Lentils': (0.9, 0.6), 'Beans': (1.0, 0.6), 'Nuts': (2.3, 0.7)},
+    'Grain': {'Rice': (4.0, 0.8), 'Wheat': (1.4, 0.7), 'Oats': (1.6, 0.7), 'Corn': (1.1, 0.7)},
+    'Produce': {
+        'Tomatoes': (2.1, 0.6), 'Potatoes': (0.5, 0.5), 'Lettuce': (0.9, 0.5), 'Apples': (0.4, 0.5),
+        'Bananas': (0.7, 0.5),
+    },
+}
+
+TRANSPORT = {'AIR': 0.95, 'SEA': 0.015, 'ROAD': 0.12, 'RAIL': 0.025}
+
+INTENSITIES = {'LOW': 0.5, 'MEDIUM': 1.5, 'HIGH': 3.5}
+
+
+def seed_factors(apps, schema_editor):
+    MaterialFactor = apps.get_model('core', 'MaterialFactor')
+    TransportFactor = apps.get_model('core', 'TransportFactor')
+    ManufacturingIntensity = apps.get_model('core', 'ManufacturingIntensity')
+    FactorVersion = apps.get_model('core', 'FactorVersion')
+    for category, materials in MATERIALS.items():
+        for name, (factor, multiplier) in materials.items():
+            material, created = MaterialFactor.objects.get_or_create(name=name, defaults={
+                'category': category, 'emission_factor_kg_co2_per_kg': factor,
+            })
+            material.manufacturing_multiplier = multiplier
+            material.save(update_fields=['manufacturing_multiplier'])
+    for mode, factor in TRANSPORT.items():
+        TransportFactor.objects.get_or_create(mode=mode, defaults={'kg_co2_per_kg_per_1000km': factor})
+    for level, base in INTENSITIES.items():
+        ManufacturingIntensity.objects.get_or_create(level=level, defaults={'base_kg_co2_per_kg': base})
+    FactorVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_prediction_log_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactorVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ManufacturingIntensity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(max_length=20, unique=True)),
+                ('base_kg_co2_per_kg', models.FloatField()),
+            ],
+            options={
+                'verbose_name_plural': 'Manufacturing Intensities',
+                'ordering': ['base_kg_co2_per_kg'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransportFactor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(max_length=20, unique=True)),
+                ('kg_co2_per_kg_per_1000km', models.FloatField()),
+            ],
+            options={
+                'verbose_name_plural': 'Transport Factors',
+                'ordering': ['mode'],
+            },
+        ),
+        migrations.AddField(
+            model_name='materialfactor',
+            name='manufacturing_multiplier',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.RunPython(seed_factors, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,8 @@ class MaterialFactor(models.Model):
         ],
         default='MEDIUM'
     )
+    # Scales the intensity's manufacturing base for this material
+    manufacturing_multiplier = models.FloatField(default=1.0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -25,6 +27,41 @@ class MaterialFactor(models.Model):
         return f"{self.name} ({self.category})"
 
 
+class TransportFactor(models.Model):
+    """Transport emission factor per mode"""
+    mode = models.CharField(max_length=20, unique=True)  # e.g., "SEA"
+    kg_co2_per_kg_per_1000km = models.FloatField()
+    
+    class Meta:
+        verbose_name_plural = "Transport Factors"
+        ordering = ['mode']
+    
+    def __str__(self):
+        return f"{self.mode} ({self.kg_co2_per_kg_per_1000km} kg CO2e/kg/1000 km)"
+
+
+class ManufacturingIntensity(models.Model):
+    """Manufacturing emissions per kg for an intensity level, before the material multiplier"""
+    level = models.CharField(max_length=20, unique=True)  # e.g., "MEDIUM"
+    base_kg_co2_per_kg = models.FloatField()
+    
+    class Meta:
+        verbose_name_plural = "Manufacturing Intensities"
+        ordering = ['base_kg_co2_per_kg']
+    
+    def __str__(self):
+        return f"{self.level} ({self.base_kg_co2_per_kg} kg CO2e/kg)"
+
+
+class FactorVersion(models.Model):
+    """Counter bumped whenever an emission-factor table changes (single row)"""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"factors v{self.version}"
+
+
 class PredictionLog(models.Model):
     """Stores user queries for future analytics and model retraining"""
     product_name = models.CharField(max_length=200)
@@ -50,6 +87,75 @@ class PredictionLog(models.Model):
     class Meta:
         verbose_name_plural = "Prediction Logs"
         ordering = ['-created_at']
+        # Admin ordering/date_hierarchy/list_filter, export and retention ranges
+        indexes = [
+            models.Index(fields=['created_at'], name='predlog_created_idx'),
+            models.Index(fields=['material', 'created_at'], name='predlog_material_created_idx'),
+            models.Index(fields=['transport_mode', 'created_at'], name='predlog_mode_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product_name} - {self.predicted_co2_kg:.2f} kg CO2e"
+
+
+class PredictionRollup(models.Model):
+    """
+    Pre-aggregated PredictionLog statistics for one time bucket and one
+    dimension value (e.g. material=Cotton), maintained by compact_rollups
+    """
+    DIMENSIONS = [
+        ('material', 'Material'),
+        ('transport_mode', 'Transport mode'),
+    ]
+    
+    bucket_start = models.DateTimeField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    value = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+    sum_co2 = models.FloatField(default=0.0)
+    min_co2 = models.FloatField(null=True)
+    max_co2 = models.FloatField(null=True)
+    sum_material_co2 = models.FloatField(default=0.0)
+    min_material_co2 = models.FloatField(null=True)
+    max_material_co2 = models.FloatField(null=True)
+    sum_manufacturing_co2 = models.FloatField(default=0.0)
+    min_manufacturing_co2 = models.FloatField(null=True)
+    max_manufacturing_co2 = models.FloatField(null=True)
+    sum_transport_co2 = models.FloatField(default=0.0)
+    min_transport_co2 = models.FloatField(null=True)
+    max_transport_co2 = models.FloatField(null=True)
+    # Serialized predictor.sketches.TDigest of predicted_co2_kg
+    co2_digest = models.BinaryField(null=True, editable=False)
+    
+    class Meta:
+        abstract = True
+        ordering = ['bucket_start', 'dimension', 'value']
+    
+    def __str__(self):
+        return f"{self.bucket_start:%Y-%m-%d %H:%M} {self.dimension}={self.value} ({self.count})"
+
+
+class HourlyRollup(PredictionRollup):
+    class Meta(PredictionRollup.Meta):
+        verbose_name_plural = "Hourly Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'bucket_start', 'value'], name='hourly_rollup_key'),
+        ]
+
+
+class DailyRollup(PredictionRollup):
+    class Meta(PredictionRollup.Meta):
+        verbose_name_plural = "Daily Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'bucket_start', 'value'], name='daily_rollup_key'),
+        ]
+
+
+class RollupCheckpoint(models.Model):
+    """Highest PredictionLog id already folded into the rollups"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
@@ -0,0 +1,230 @@
+/**
+ * C4Future service worker (rendered by core.views.service_worker_view)
+ *
+ * - Shell: pages and assets precached per CACHE_VERSION, which follows the
+ *   static manifest, so a deploy installs a new worker and drops old caches
+ * - Pages: network first, cached copy offline
+ * - Videos: cache first (ranges sliced from the cached file)
+ * - /api/materials/, /api/model-info/: stale-while-revalidate
+ * - POST /api/predict/ offline: queued in IndexedDB and replayed when back
+ *   online; pages get a 'prediction-replayed' message with the result
+ */
+const CACHE_VERSION = '{{ version }}';
+const PRECACHE_URLS = {{ precache_urls|safe }};
+const MEDIA_URLS = {{ media_urls|safe }};
+
+const SHELL_CACHE = `c4future-shell-${CACHE_VERSION}`;
+const MEDIA_CACHE = 'c4future-media';
+const API_CACHE = 'c4future-api';
+const CACHES = [SHELL_CACHE, MEDIA_CACHE, API_CACHE];
+
+const SWR_PATHS = ['/api/materials/', '/api/model-info/'];
+const PREDICT_PATH = '/api/predict/';
+const QUEUE_DB = 'c4future-queue';
+const QUEUE_STORE = 'predictions';
+const SYNC_TAG = 'replay-predictions';
+
+// ========== LIFECYCLE ==========
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        for (const name of await caches.keys()) {
+            if (name.startsWith('c4future-') && !CACHES.includes(name)) {
+                await caches.delete(name);
+            }
+        }
+        // Videos from earlier deploys have different hashed names
+        const media = await caches.open(MEDIA_CACHE);
+        for (const request of await media.keys()) {
+            if (!MEDIA_URLS.includes(new URL(request.url).pathname)) {
+                await media.delete(request);
+            }
+        }
+        await self.clients.claim();
+        await replayQueue();
+    })());
+});
+
+// ========== ROUTING ==========
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+
+    if (request.method === 'POST' && url.pathname === PREDICT_PATH) {
+        event.respondWith(predictOrQueue(request));
+        return;
+    }
+    if (request.method !== 'GET') return;
+
+    if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    } else if (MEDIA_URLS.includes(url.pathname)) {
+        event.respondWith(cacheFirstMedia(event, request));
+    } else if (url.origin === self.location.origin && SWR_PATHS.includes(url.pathname)) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    } else if (PRECACHE_URLS.includes(url.origin === self.location.origin ? url.pathname : url.href)) {
+        event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+    }
+});
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            const cache = await caches.open(SHELL_CACHE);
+            await cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request, { ignoreSearch: true });
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+async function staleWhileRevalidate(event, request) {
+    const cache = await caches.open(API_CACHE);
+    const cached = await cache.match(request);
+    const refresh = fetch(request).then(response => {
+        if (response.ok) return cache.put(request, response.clone()).then(() => response);
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refresh.catch(() => undefined));
+        return cached;
+    }
+    return refresh;
+}
+
+async function cacheFirstMedia(event, request) {
+    const cache = await caches.open(MEDIA_CACHE);
+    const cached = await cache.match(request.url);
+    if (!cached) {
+        // Media elements ask for ranges; answer from the network and store the whole file for next time
+        event.waitUntil(
+            fetch(request.url).then(response => response.ok ? cache.put(request.url, response) : undefined)
+                .catch(() => undefined)
+        );
+        return fetch(request);
+    }
+
+    const range = request.headers.get('Range');
+    if (!range) return cached;
+    const body = await cached.blob();
+    const match = /^bytes=(\d*)-(\d*)$/.exec(range.trim());
+    if (!match || (!match[1] && !match[2])) return cached;
+    let start, end;
+    if (match[1]) {
+        start = Number(match[1]);
+        end = match[2] ? Math.min(Number(match[2]), body.size - 1) : body.size - 1;
+    } else {
+        start = Math.max(body.size - Number(match[2]), 0);
+        end = body.size - 1;
+    }
+    if (start >= body.size || start > end) {
+        return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${body.size}` } });
+    }
+    return new Response(body.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            'Content-Type': cached.headers.get('Content-Type') || 'video/mp4',
+            'Content-Length': String(end - start + 1),
+            'Content-Range': `bytes ${start}-${end}/${body.size}`,
+            'Accept-Ranges': 'bytes'
+        }
+    });
+}
+
+// ========== OFFLINE PREDICTION QUEUE ==========
+
+function openQueue() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(QUEUE_DB, 1);
+        open.onupgradeneeded = () => open.result.createObjectStore(QUEUE_STORE, { keyPath: 'id', autoIncrement: true });
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function queueTransaction(mode, operation) {
+    const db = await openQueue();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(QUEUE_STORE, mode);
+        const request = operation(transaction.objectStore(QUEUE_STORE));
+        transaction.oncomplete = () => resolve(request.result);
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
+
+async function predictOrQueue(request) {
+    const body = await request.clone().text();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const id = await queueTransaction('readwrite', store => store.add({
+            body: body,
+            csrfToken: request.headers.get('X-CSRFToken'),
+            queuedAt: Date.now()
+        }));
+        if (self.registration.sync) {
+            self.registration.sync.register(SYNC_TAG).catch(() => undefined);
+        }
+        return new Response(JSON.stringify({
+            success: false,
+            queued: true,
+            queue_id: id,
+            error: "You're offline; the prediction will be sent when you reconnect"
+        }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+    }
+}
+
+let replaying = null;
+
+// One replay at a time (sync, activate and page messages can overlap)
+function replayQueue() {
+    if (!replaying) replaying = sendQueued().finally(() => { replaying = null; });
+    return replaying;
+}
+
+/**
+ * Send queued predictions in order; stops at the first network failure and
+ * drops entries the server rejects (they would fail again)
+ */
+async function sendQueued() {
+    const entries = await queueTransaction('readonly', store => store.getAll());
+    for (const entry of entries) {
+        let response;
+        try {
+            response = await fetch(PREDICT_PATH, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'X-CSRFToken': entry.csrfToken || '' },
+                body: entry.body
+            });
+        } catch (error) {
+            return;
+        }
+        if (response.status === 429 || response.status >= 500) return;
+        const result = await response.json().catch(() => ({ success: false, error: `HTTP ${response.status}` }));
+        await queueTransaction('readwrite', store => store.delete(entry.id));
+        for (const client of await self.clients.matchAll({ type: 'window' })) {
+            client.postMessage({ type: 'prediction-replayed', queue_id: entry.id, result: result });
+        }
+    }
+}
+
+self.addEventListener('sync', event => {
+    if (event.tag === SYNC_TAG) event.waitUntil(replayQueue());
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'replay-predictions') event.waitUntil(replayQueue());
+});
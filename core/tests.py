@@ -1,3 +1,140 @@
-from django.test import TestCase
+import datetime
+import os
+import re
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from predictor.analytics import compact_rollups
+from predictor.http_cache import cached_page
+from predictor.services import CarbonFootprintService
+from predictor.tests import get_test_service
+from .models import PredictionLog
+
+
+class PredictionLogAdminTests(TestCase):
+    url = '/admin/core/predictionlog/'
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        start = datetime.datetime(2026, 1, 30, tzinfo=datetime.timezone.utc)
+        PredictionLog.objects.bulk_create([
+            PredictionLog(product_name=f'Item {i}', material='Cotton' if i % 3 else 'Steel', weight_kg=1.0,
+                          transport_mode='SEA', transport_distance_km=10.0, predicted_co2_kg=1.0)
+            for i in range(30)
+        ])
+        for i, pk in enumerate(PredictionLog.objects.order_by('id').values_list('id', flat=True)):
+            PredictionLog.objects.filter(pk=pk).update(created_at=start + datetime.timedelta(hours=4 * i))
+        compact_rollups()
+
+    def page_ids(self, response):
+        return [int(pk) for pk in re.findall(r'/admin/core/predictionlog/(\d+)/change/', response.content.decode())]
+
+    def test_keyset_pages_cover_every_row_once(self):
+        seen, url = [], self.url + '?material=Cotton'
+        with mock.patch('core.admin.PredictionLogAdmin.list_per_page', 7):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                seen += self.page_ids(response)
+                cursor = re.search(r'href="(\?[^"]*cursor=[^"]+)"', response.content.decode())
+                url = self.url + cursor.group(1).replace('&amp;', '&') if cursor else None
+        self.assertEqual(seen, list(PredictionLog.objects.filter(material='Cotton').order_by('-created_at', '-id')
+                                    .values_list('id', flat=True)))
+
+    def test_changelist_never_scans_for_counts_filters_or_dates(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, '>Steel</a>')
+        self.assertContains(response, 'created_at__year=2026">January 2026</a>')
+        sql = ' '.join(q['sql'] for q in queries).upper()
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('SELECT COUNT(*) AS "__COUNT" FROM "CORE_PREDICTIONLOG"', sql)
+
+    def test_large_results_are_estimated_from_rollups(self):
+        with mock.patch('core.admin.COUNT_CAP', 5):
+            response = self.client.get(self.url, {'created_at__year': 2026, 'created_at__month': 2})
+        self.assertContains(response, '~18 Prediction Logs')
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_render_once_per_model_version(self):
+        for path, method in (('/', 'get_available_materials'), ('/insights/', 'get_model_info')):
+            first = self.client.get(path)
+            with mock.patch.object(CarbonFootprintService, method) as service_call:
+                cached = self.client.get(path)
+            service_call.assert_not_called()
+            self.assertEqual(cached.content, first.content)
+            self.assertEqual(cached['ETag'], first['ETag'])
+
+    def test_model_reload_invalidates_pages_and_fragments(self):
+        self.client.get('/')
+        artifacts = dict(self.service._model_artifacts)
+        encoder = mock.Mock(classes_=['Unobtainium'])
+        CarbonFootprintService.use_artifacts(dict(artifacts, material_encoder=encoder))
+        try:
+            self.assertContains(self.client.get('/'), '<option value="Unobtainium">')
+        finally:
+            CarbonFootprintService.use_artifacts(artifacts)
+        self.assertNotContains(self.client.get('/'), 'Unobtainium')
+
+    def test_hit_keeps_the_miss_headers(self):
+        @cached_page('base.html')
+        def view(request):
+            response = HttpResponse('<p>page</p>', content_type='text/html; charset=latin-1')
+            response['Vary'] = 'Accept-Language'
+            response['Cache-Control'] = 'private, max-age=60'
+            response.set_cookie('session', 'per-user')
+            return response
+
+        request = RequestFactory().get('/cached/')
+        miss, hit = view(request), view(request)
+        self.assertEqual(hit.content, miss.content)
+        for header in ('Content-Type', 'Vary', 'Cache-Control'):
+            self.assertEqual(hit[header], miss[header])
+        self.assertNotIn('session', hit.cookies)
+
+    @override_settings(PREDICTOR_PAGE_CACHE={'ENABLED': False})
+    def test_disabled_cache_renders_every_request(self):
+        self.client.get('/')
+        with mock.patch.object(CarbonFootprintService, 'get_available_materials', return_value=['Kevlar']):
+            self.assertContains(self.client.get('/'), '<option value="Kevlar">')
+
+
+class ServiceWorkerTests(TestCase):
+    def worker_constants(self):
+        response = self.client.get('/sw.js')
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertIn('no-cache', response['Cache-Control'])
+        source = response.content.decode()
+        return (re.search(r"CACHE_VERSION = '(\w+)'", source).group(1),
+                re.search(r'PRECACHE_URLS = (\[.*\]);', source).group(1))
+
+    def test_cache_version_follows_the_shell_assets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('css/main.css', 'js/app.js'):
+                os.makedirs(os.path.join(directory, os.path.dirname(name)), exist_ok=True)
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write('/* v1 */')
+            with override_settings(STATICFILES_DIRS=[directory]):
+                version, precache = self.worker_constants()
+                self.assertIn('"/static/css/main.css"', precache)
+                self.assertEqual(self.worker_constants()[0], version)
+                with open(os.path.join(directory, 'js', 'app.js'), 'w') as f:
+                    f.write('/* version 2 */')
+                self.assertNotEqual(self.worker_constants()[0], version)
@@ -5,4 +5,5 @@ urlpatterns = [
     path('', views.home_view, name='home'),
     path('results/', views.results_view, name='results'),
     path('insights/', views.insights_view, name='insights'),
+    path('sw.js', views.service_worker_view, name='service_worker'),
 ]
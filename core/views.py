@@ -1,7 +1,26 @@
+import json
+
 from django.shortcuts import render
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from predictor.http_cache import cached_page, conditional_get, fragment_timeout, page_etag, page_version
 from predictor.services import CarbonFootprintService
+from predictor.staticfiles import static_version
+
+
+HOME_TEMPLATES = ('home.html', 'base.html')
+INSIGHTS_TEMPLATES = ('insights.html', 'base.html')
+
+# Precached by the service worker (Chart.js as linked from base.html)
+SHELL_ASSETS = ('css/main.css', 'js/app.js')
+CHART_JS_URL = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js'
+# Cached on first play
+MEDIA_ASSETS = ('videos/background.mp4', 'videos/results_bg.mp4')
 
 
+@conditional_get(page_etag(*HOME_TEMPLATES))
+@cached_page(*HOME_TEMPLATES)
 def home_view(request):
     """Landing page with product input form"""
     service = CarbonFootprintService()
@@ -9,7 +28,11 @@ def home_view(request):
     
     context = {
         'materials': materials,
-        'transport_modes': ['AIR', 'SEA', 'ROAD', 'RAIL']
+        'transport_modes': ['AIR', 'SEA', 'ROAD', 'RAIL'],
+        # The estimator in app.js keeps /api/factors/?v=<version> in localStorage
+        'factors_version': service.get_factor_table()[1] if materials else None,
+        'page_version': page_version(*HOME_TEMPLATES),
+        'fragment_timeout': fragment_timeout(),
     }
     return render(request, 'home.html', context)
 
@@ -19,12 +42,37 @@ def results_view(request):
     return render(request, 'results.html')
 
 
+@conditional_get(page_etag(*INSIGHTS_TEMPLATES))
+@cached_page(*INSIGHTS_TEMPLATES)
 def insights_view(request):
     """Model insights and compensation strategies"""
     service = CarbonFootprintService()
     model_info = service.get_model_info()
+    try:
+        # Charts load the precomputed payload from /api/insights/?v=<version>
+        insights_version = service.get_insights()[1] if model_info else None
+    except RuntimeError:
+        insights_version = None
     
     context = {
-        'model_info': model_info
+        'model_info': model_info,
+        'insights_version': insights_version,
+        'page_version': page_version(*INSIGHTS_TEMPLATES),
+        'fragment_timeout': fragment_timeout(),
     }
     return render(request, 'insights.html', context)
+
+
+def service_worker_view(request):
+    """Service worker, served from the site root so its scope covers every page and the API"""
+    context = {
+        'version': static_version(*SHELL_ASSETS, *MEDIA_ASSETS),
+        'precache_urls': json.dumps([
+            reverse('home'), reverse('results'), *(static(name) for name in SHELL_ASSETS), CHART_JS_URL,
+        ]),
+        'media_urls': json.dumps([static(name) for name in MEDIA_ASSETS]),
+    }
+    response = render(request, 'sw.js', context, content_type='application/javascript')
+    # Browsers check for a new worker on navigation; never let an HTTP cache delay that
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -1,3 +1,55 @@
 from django.contrib import admin
+from django.http import FileResponse, Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
 
-# Register your models here.
+from .export import CONTENT_TYPES, DEFAULT_CHUNK_SIZE, build_filters, export_filename, stream_export
+from .profiling import get_profile_store
+
+
+def profile_list_view(request):
+    """List stored request profiles, newest first"""
+    context = dict(
+        admin.site.each_context(request),
+        title='Request profiles',
+        profiles=get_profile_store().list(),
+    )
+    return TemplateResponse(request, 'admin/predictor/profiles.html', context)
+
+
+def profile_download_view(request, profile_id):
+    """Download a profile as collapsed stacks (flamegraph.pl / speedscope input)"""
+    path = get_profile_store().path(profile_id)
+    if path is None:
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.folded',
+                        content_type='text/plain')
+
+
+def prediction_export_view(request):
+    """
+    Stream PredictionLog rows
+    GET ?format=csv|ndjson|parquet&start=YYYY-MM-DD&end=YYYY-MM-DD&material=Cotton&gzip=1&archive=1
+    """
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true')
+    include_archive = request.GET.get('archive') in ('1', 'true')
+    try:
+        chunk_size = int(request.GET.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        filters = build_filters(request.GET.get('start'), request.GET.get('end'), request.GET.get('material'))
+        chunks = stream_export(fmt, filters, chunk_size, compress, include_archive)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    content_type = 'application/gzip' if compress else CONTENT_TYPES[fmt]
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    return response
+
+
+admin_urls = [
+    path('profiles/', admin.site.admin_view(profile_list_view), name='predictor_profiles'),
+    path('profiles/<str:profile_id>/download/', admin.site.admin_view(profile_download_view),
+         name='predictor_profile_download'),
+    path('predictions/export/', admin.site.admin_view(prediction_export_view), name='predictor_prediction_export'),
+]
@@ -0,0 +1,132 @@
+"""
+Admission control for the predict endpoint
+Estimates how long a new request would take from the number of requests
+already in flight and a moving p95 of service time, and sheds (or
+degrades) requests that would blow the latency budget anyway
+"""
+import math
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .metrics import register_collector
+
+
+ADMIT = 'admit'
+DEGRADE = 'degrade'
+SHED = 'shed'
+
+
+class AdmissionController:
+    """In-flight tracking and moving-p95 latency estimate"""
+
+    def __init__(self, latency_budget_ms=2000, workers=1, degrade=False, window=512, min_samples=20):
+        self.latency_budget = latency_budget_ms / 1000
+        self.workers = max(workers, 1)
+        self.degrade = degrade
+        self.min_samples = min_samples
+        self._samples = np.zeros(window)
+        self._count = 0
+        self._p95 = 0.0
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.admitted = 0
+        self.degraded = 0
+        self.shed = 0
+
+    @property
+    def p95(self):
+        return self._p95
+
+    def expected_latency(self, in_flight=None):
+        """Service-time estimate for a request arriving now"""
+        in_flight = self.in_flight if in_flight is None else in_flight
+        return (in_flight // self.workers + 1) * self._p95
+
+    def acquire(self):
+        """
+        Decide ADMIT, DEGRADE or SHED for a new request
+
+        A request that finds a worker idle is always admitted: it can't
+        queue, and its service time refreshes the p95, so a past latency
+        spike can't keep the endpoint shedding forever.
+        """
+        with self._lock:
+            if (self.in_flight >= self.workers and self._count >= self.min_samples
+                    and self.expected_latency() > self.latency_budget):
+                if not self.degrade:
+                    self.shed += 1
+                    return SHED
+                self.degraded += 1
+                self.in_flight += 1
+                return DEGRADE
+            self.admitted += 1
+            self.in_flight += 1
+            return ADMIT
+
+    def release(self, service_time=None):
+        """Finish a request; service_time (seconds) feeds the p95 estimate"""
+        with self._lock:
+            self.in_flight -= 1
+            if service_time is None:
+                return
+            self._samples[self._count % len(self._samples)] = service_time
+            self._count += 1
+            # Recomputing the percentile is O(window); amortize it
+            if self._count <= self.min_samples or self._count % 16 == 0:
+                self._p95 = float(np.percentile(self._samples[:min(self._count, len(self._samples))], 95))
+
+    def retry_after(self):
+        """Seconds a shed client should wait before retrying"""
+        return max(1, math.ceil(self.expected_latency()))
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'admitted': self.admitted,
+            'degraded': self.degraded,
+            'shed': self.shed,
+            'p95_service_ms': round(self._p95 * 1000, 3),
+            'latency_budget_ms': self.latency_budget * 1000,
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Process-wide controller configured from PREDICTOR_ADMISSION, or None when disabled"""
+    global _controller
+    config = getattr(settings, 'PREDICTOR_ADMISSION', {})
+    if not config.get('ENABLED', True):
+        return None
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    latency_budget_ms=config.get('LATENCY_BUDGET_MS', 2000),
+                    workers=config.get('WORKERS', 1),
+                    degrade=config.get('DEGRADE', False),
+                )
+    return _controller
+
+
+def _expose_gauges():
+    """Process-local admission gauges for /api/metrics/"""
+    if _controller is None:
+        return []
+    pid = os.getpid()
+    return [
+        '# HELP predictor_admission_in_flight Requests currently being served by this process',
+        '# TYPE predictor_admission_in_flight gauge',
+        f'predictor_admission_in_flight{{pid="{pid}"}} {_controller.in_flight}',
+        '# HELP predictor_admission_p95_seconds Moving p95 of model service time',
+        '# TYPE predictor_admission_p95_seconds gauge',
+        f'predictor_admission_p95_seconds{{pid="{pid}"}} {_controller.p95}',
+    ]
+
+
+register_collector(_expose_gauges)
@@ -0,0 +1,326 @@
+"""
+Hourly and daily rollups of PredictionLog per material and transport mode
+
+compact_rollups() folds new log rows (id > checkpoint) into HourlyRollup
+and DailyRollup in batches; query_rollups() reads the rollups and merges in
+the not-yet-compacted tail straight from the log, so answers stay fresh
+between compactions while the heavy GROUP BY only ever runs over new rows.
+Each rollup row also carries a t-digest of predicted_co2_kg (see
+predictor.sketches) so quantiles over any range come from merged digests.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from core.models import DailyRollup, HourlyRollup, PredictionLog, RollupCheckpoint
+from .sketches import TDigest, merge_digests
+
+
+CHECKPOINT = 'predictions'
+
+DIMENSIONS = ('material', 'transport_mode')
+
+GRANULARITIES = {'hour': HourlyRollup, 'day': DailyRollup}
+
+# Rollup field suffix -> PredictionLog column
+STAT_SOURCES = {
+    'co2': 'predicted_co2_kg',
+    'material_co2': 'material_co2',
+    'manufacturing_co2': 'manufacturing_co2',
+    'transport_co2': 'transport_co2',
+}
+
+STAT_FIELDS = ('count',) + tuple(
+    f'{agg}_{name}' for name in STAT_SOURCES for agg in ('sum', 'min', 'max')
+)
+
+DEFAULT_BATCH_SIZE = 50000
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+_STAT_KEYS = tuple((f'sum_{name}', f'min_{name}', f'max_{name}') for name in STAT_SOURCES)
+
+
+def merge_stats(into, other):
+    """Fold one stats dict into another (count/sum add, min/max combine)"""
+    if not into:
+        into.update(other)
+        for sum_key, _, _ in _STAT_KEYS:
+            if into[sum_key] is None:
+                into[sum_key] = 0.0
+        return into
+    into['count'] += other['count']
+    for sum_key, min_key, max_key in _STAT_KEYS:
+        if other[sum_key]:
+            into[sum_key] += other[sum_key]
+        low, high = other[min_key], other[max_key]
+        if low is not None and (into[min_key] is None or low < into[min_key]):
+            into[min_key] = low
+        if high is not None and (into[max_key] is None or high > into[max_key]):
+            into[max_key] = high
+    return into
+
+
+def aggregate_log(queryset, dimension, kind):
+    """GROUP BY (truncated created_at, dimension) -> {(bucket, value): stats}"""
+    aggregates = {'count': Count('id')}
+    for name, source in STAT_SOURCES.items():
+        aggregates[f'sum_{name}'] = Sum(source)
+        aggregates[f'min_{name}'] = Min(source)
+        aggregates[f'max_{name}'] = Max(source)
+    rows = (queryset.annotate(bucket=Trunc('created_at', kind))
+            .values('bucket', dimension).annotate(**aggregates).order_by())
+    return {
+        (row.pop('bucket'), row.pop(dimension)): row
+        for row in rows
+    }
+
+
+def digest_log(queryset, dimension, granularity):
+    """predicted_co2_kg t-digests per (bucket, dimension value)"""
+    values = {}
+    rows = queryset.values_list('created_at', dimension, 'predicted_co2_kg').iterator(chunk_size=5000)
+    for created_at, value, co2 in rows:
+        values.setdefault((_floor(created_at, granularity), value), []).append(co2)
+    return {key: TDigest.from_values(co2) for key, co2 in values.items()}
+
+
+def _load_digest(data):
+    return TDigest.from_bytes(bytes(data)) if data is not None else TDigest()
+
+
+def _day_of(bucket):
+    local = timezone.localtime(bucket)
+    return timezone.make_aware(datetime.datetime.combine(local.date(), datetime.time.min))
+
+
+def _upsert(model, dimension, deltas, digests):
+    """Merge stats deltas and digests into existing rollup rows, creating missing ones"""
+    if not deltas:
+        return
+    existing = {
+        (row.bucket_start, row.value): row
+        for row in model.objects.filter(
+            dimension=dimension,
+            bucket_start__in={bucket for bucket, _ in deltas},
+            value__in={value for _, value in deltas},
+        )
+    }
+    to_create, to_update = [], []
+    for (bucket, value), stats in deltas.items():
+        row = existing.get((bucket, value))
+        if row is None:
+            to_create.append(model(bucket_start=bucket, dimension=dimension, value=value,
+                                   co2_digest=digests[bucket, value].to_bytes(), **merge_stats({}, stats)))
+        else:
+            merged = merge_stats({field: getattr(row, field) for field in STAT_FIELDS}, stats)
+            for field, amount in merged.items():
+                setattr(row, field, amount)
+            row.co2_digest = _load_digest(row.co2_digest).merge(digests[bucket, value]).to_bytes()
+            to_update.append(row)
+    model.objects.bulk_create(to_create, batch_size=500)
+    model.objects.bulk_update(to_update, STAT_FIELDS + ('co2_digest',), batch_size=500)
+
+
+def compact_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fold every PredictionLog row past the checkpoint into the rollups
+
+    Each batch is applied in one transaction together with the checkpoint,
+    so an interrupted run never double counts. The checkpoint is read inside
+    that transaction with SELECT ... FOR UPDATE (the sqlite backend's BEGIN
+    IMMEDIATE takes the write lock instead), so concurrent runs take turns
+    rather than folding the same rows twice. Rows are merged into existing
+    buckets, so a bucket still receiving rows is simply extended next run.
+
+    Returns:
+        number of log rows compacted
+    """
+    RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            checkpoint = RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+            pending = PredictionLog.objects.filter(id__gt=checkpoint.last_id).order_by('id')
+            upto = pending.values_list('id', flat=True)[batch_size - 1:batch_size].first()
+            if upto is None:
+                upto = pending.aggregate(last=Max('id'))['last']
+                if upto is None:
+                    return compacted
+
+            rows = PredictionLog.objects.filter(id__gt=checkpoint.last_id, id__lte=upto)
+            for dimension in DIMENSIONS:
+                hourly = aggregate_log(rows, dimension, 'hour')
+                hourly_digests = digest_log(rows, dimension, 'hour')
+                daily, per_day = {}, {}
+                for (bucket, value), stats in hourly.items():
+                    day = (_day_of(bucket), value)
+                    merge_stats(daily.setdefault(day, {}), stats)
+                    per_day.setdefault(day, []).append(hourly_digests[bucket, value])
+                daily_digests = {key: merge_digests(digests) for key, digests in per_day.items()}
+                _upsert(HourlyRollup, dimension, hourly, hourly_digests)
+                _upsert(DailyRollup, dimension, daily, daily_digests)
+            compacted += rows.count()
+            checkpoint.last_id = upto
+            checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+
+def rebuild_rollups(batch_size=DEFAULT_BATCH_SIZE):
+    """Drop all rollups and recompact the whole log (e.g. after adding digests)"""
+    with transaction.atomic():
+        HourlyRollup.objects.all().delete()
+        DailyRollup.objects.all().delete()
+        RollupCheckpoint.objects.filter(name=CHECKPOINT).delete()
+    return compact_rollups(batch_size)
+
+
+def uncompacted_logs(**filters):
+    """PredictionLog rows not yet folded into the rollups"""
+    last_id = RollupCheckpoint.objects.filter(name=CHECKPOINT).values_list('last_id', flat=True).first() or 0
+    # A closed id range keeps SQLite on the primary key instead of a
+    # created_at/material index covering the whole table
+    upto = PredictionLog.objects.aggregate(last=Max('id'))['last'] or last_id
+    return PredictionLog.objects.filter(id__gt=last_id, id__lte=upto, **filters)
+
+
+def _floor(moment, granularity):
+    local = timezone.localtime(moment)
+    if granularity == 'day':
+        local = local.replace(hour=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_aggregates():
+    aggregates = {'count': Sum('count')}
+    for sum_key, min_key, max_key in _STAT_KEYS:
+        aggregates[sum_key] = Sum(sum_key)
+        aggregates[min_key] = Min(min_key)
+        aggregates[max_key] = Max(max_key)
+    return aggregates
+
+
+def query_rollups(granularity='day', dimension='material', start=None, end=None, values=None,
+                  include_series=True, include_tail=True, quantiles=DEFAULT_QUANTILES):
+    """
+    Per-value totals, and optionally the per-bucket series, over [start, end)
+
+    start and end are floored to their buckets, so a bucket is counted whole
+    or not at all (a rollup row can't be split at end). Totals are aggregated in the database
+    over the rollup rows; quantiles of predicted_co2_kg (p50, p90, ... keys)
+    come from merging the rows' t-digests. With include_tail, rows logged
+    since the last compaction are aggregated from PredictionLog and merged in.
+
+    Raises:
+        ValueError for an unknown granularity or dimension, or a quantile outside [0, 1]
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}' (choose from {', '.join(GRANULARITIES)})")
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}' (choose from {', '.join(DIMENSIONS)})")
+    if any(not 0 <= q <= 1 for q in quantiles):
+        raise ValueError('Quantiles must be between 0 and 1')
+
+    filters = {'dimension': dimension}
+    log_filters = {}
+    if start is not None:
+        start = _floor(start, granularity)
+        filters['bucket_start__gte'] = log_filters['created_at__gte'] = start
+    if end is not None:
+        end = _floor(end, granularity)
+        filters['bucket_start__lt'] = log_filters['created_at__lt'] = end
+    if values:
+        filters['value__in'] = log_filters[f'{dimension}__in'] = values
+
+    rollups = GRANULARITIES[granularity].objects.filter(**filters)
+    totals = {
+        row.pop('value'): row
+        for row in rollups.values('value').annotate(**_rollup_aggregates()).order_by()
+    }
+    series = {}
+    series_digests = {}
+    total_digests = {}
+    if include_series:
+        fields = STAT_FIELDS + (('co2_digest',) if quantiles else ())
+        for row in rollups.values('bucket_start', 'value', *fields):
+            key = (row.pop('bucket_start'), row.pop('value'))
+            if quantiles:
+                series_digests[key] = digest = _load_digest(row.pop('co2_digest'))
+                total_digests.setdefault(key[1], []).append(digest)
+            series[key] = row
+    elif quantiles:
+        for value, data in rollups.values_list('value', 'co2_digest'):
+            total_digests.setdefault(value, []).append(_load_digest(data))
+
+    if include_tail:
+        tail = uncompacted_logs(**log_filters)
+        for key, stats in aggregate_log(tail, dimension, granularity).items():
+            merge_stats(totals.setdefault(key[1], {}), stats)
+            if include_series:
+                merge_stats(series.setdefault(key, {}), stats)
+        if quantiles:
+            for key, digest in digest_log(tail, dimension, granularity).items():
+                total_digests.setdefault(key[1], []).append(digest)
+                if include_series:
+                    series_digests[key] = series_digests.get(key, TDigest()).merge(digest)
+
+    result = {
+        'totals': [
+            _with_quantiles(_with_mean(dict(stats, value=value)),
+                            merge_digests(total_digests.get(value, ())), quantiles)
+            for value, stats in sorted(totals.items())
+        ],
+    }
+    if include_series:
+        result['series'] = [
+            _with_quantiles(_with_mean(dict(stats, bucket=bucket.isoformat(), value=value)),
+                            series_digests.get((bucket, value)), quantiles)
+            for (bucket, value), stats in sorted(series.items())
+        ]
+    return result
+
+
+def day_counts(dimension='transport_mode', value=None, start=None, end=None):
+    """
+    Predictions per local day over [start, end) from the daily rollups plus
+    the uncompacted tail; with the default dimension and no value every
+    prediction is counted exactly once. Bounds are floored to local days.
+    """
+    filters, log_filters = {'dimension': dimension}, {}
+    if value is not None:
+        filters['value'] = log_filters[dimension] = value
+    if start is not None:
+        filters['bucket_start__gte'] = log_filters['created_at__gte'] = _floor(start, 'day')
+    if end is not None:
+        filters['bucket_start__lt'] = log_filters['created_at__lt'] = _floor(end, 'day')
+
+    counts = {}
+    for row in DailyRollup.objects.filter(**filters).values('bucket_start').annotate(n=Sum('count')).order_by():
+        day = timezone.localtime(row['bucket_start']).date()
+        counts[day] = counts.get(day, 0) + row['n']
+
+    tail = (uncompacted_logs(**log_filters)
+            .annotate(day=TruncDate('created_at')).values('day').annotate(n=Count('id')).order_by())
+    for row in tail:
+        counts[row['day']] = counts.get(row['day'], 0) + row['n']
+    return counts
+
+
+def _with_mean(stats):
+    stats['mean_co2'] = stats['sum_co2'] / stats['count'] if stats['count'] else None
+    return stats
+
+
+def quantile_key(q):
+    return f"p{q * 100:g}"
+
+
+def _with_quantiles(stats, digest, quantiles):
+    if quantiles:
+        estimates = digest.quantile(quantiles) if digest is not None and digest.weights.size else None
+        for i, q in enumerate(quantiles):
+            stats[quantile_key(q)] = float(estimates[i]) if estimates is not None else None
+    return stats
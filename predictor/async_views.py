@@ -0,0 +1,228 @@
+"""
+Native async API views for ASGI deployments
+CPU-bound model calls run on a dedicated bounded executor so the event
+loop stays free, and a process-wide limit caps in-flight work (under WSGI
+every request runs on its own event loop, so a per-loop limit would
+never bind); the predict view goes through the same admission control
+as the sync one
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from core.models import PredictionLog
+from .admission import DEGRADE, SHED, get_admission_controller
+from .http_cache import conditional_get, json_api_etag
+from .live import publish as publish_live
+from .metrics import ADMISSION, STAGE_SECONDS, record_response
+from .throttling import add_rate_limit_headers, check_throttle
+from .services import CarbonFootprintService, model_version
+from .views import parse_prediction_input, prediction_log_fields
+
+
+_executor = None
+_limit = None
+_limit_lock = threading.Lock()
+
+# How often a request waiting for a slot checks again
+SLOT_POLL_S = 0.005
+
+
+def _config(key, default):
+    return getattr(settings, 'PREDICTOR_ASYNC', {}).get(key, default)
+
+
+def get_executor():
+    """Bounded thread pool reserved for model calls"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=_config('EXECUTOR_WORKERS', 4),
+            thread_name_prefix='predictor-model',
+        )
+    return _executor
+
+
+def _get_limit():
+    """Process-wide concurrency limit shared by every event loop"""
+    global _limit
+    if _limit is None:
+        with _limit_lock:
+            if _limit is None:
+                _limit = threading.BoundedSemaphore(_config('MAX_CONCURRENCY', 256))
+    return _limit
+
+
+async def acquire_slot(limit, timeout):
+    """
+    Take a slot without blocking the event loop: a free slot is taken at
+    once, otherwise the request re-checks every SLOT_POLL_S until timeout
+    """
+    deadline = time.monotonic() + timeout
+    while not limit.acquire(blocking=False):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(SLOT_POLL_S)
+    return True
+
+
+async def run_model(func, *args, **kwargs):
+    """Run a CPU-bound service call on the model executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), lambda: func(*args, **kwargs))
+
+
+def _load_model():
+    CarbonFootprintService()
+    model_version()
+
+
+async def ensure_model_loaded():
+    """Load the model and hash its artifact once, on the executor rather than the event loop"""
+    instance = CarbonFootprintService._instance
+    if instance is None or (instance._model_version is None and instance._model_path):
+        await run_model(_load_model)
+
+
+class AsyncAPIView(View):
+    """Base view: admission through the concurrency limit, JSON errors"""
+
+    # Apply TokenBucketThrottle, like the sync view's throttle_classes
+    throttled = False
+    # Conditional GET on this ETag function, like the sync view's conditional_get
+    etag_func = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        await ensure_model_loaded()
+        if self.throttled:
+            response = check_throttle(request, self)
+            if response is not None:
+                return response
+            return add_rate_limit_headers(request, await self._dispatch(request, *args, **kwargs))
+        return await self._dispatch(request, *args, **kwargs)
+
+    async def _dispatch(self, request, *args, **kwargs):
+        limit = _get_limit()
+        if not await acquire_slot(limit, _config('QUEUE_TIMEOUT_S', 1.0)):
+            response = JsonResponse({
+                'success': False,
+                'error': 'Server busy, please retry'
+            }, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+        try:
+            handle = self._handle
+            if self.etag_func is not None:
+                handle = conditional_get(self.etag_func, vary=('Accept',))(handle)
+            return await handle(request, *args, **kwargs)
+        finally:
+            limit.release()
+
+    async def _handle(self, request, *args, **kwargs):
+        return await super().dispatch(request, *args, **kwargs)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncPredictView(AsyncAPIView):
+    """Async variant of PredictCarbonFootprintView"""
+    throttled = True
+
+    async def post(self, request):
+        """POST /api/async/predict/ - same body and response as /api/predict/"""
+        started = time.perf_counter()
+        response = await self._admit(request)
+        STAGE_SECONDS.observe('total', time.perf_counter() - started)
+        record_response('async_predict', response.status_code)
+        return response
+
+    async def _admit(self, request):
+        """Admission control as in PredictCarbonFootprintView._admit"""
+        admission = get_admission_controller()
+        if admission is None:
+            return await self._predict(request)
+
+        decision = admission.acquire()
+        ADMISSION.inc(decision)
+        if decision == SHED:
+            response = JsonResponse({
+                'success': False,
+                'error': 'Server overloaded, please retry later'
+            }, status=503)
+            response['Retry-After'] = str(admission.retry_after())
+            return response
+
+        engine = 'analytic' if decision == DEGRADE else 'model'
+        started = time.perf_counter()
+        try:
+            return await self._predict(request, engine=engine)
+        finally:
+            admission.release(time.perf_counter() - started if engine == 'model' else None)
+
+    async def _predict(self, request, engine='model'):
+        try:
+            data = json.loads(request.body or b'{}')
+            params, error = parse_prediction_input(data)
+            if error:
+                return JsonResponse({
+                    'success': False,
+                    'error': error
+                }, status=400)
+            product_name = params.pop('product_name')
+
+            service = CarbonFootprintService()
+            result = await run_model(service.predict, **params, engine=engine)
+
+            if not result['success']:
+                return JsonResponse(result, status=400)
+
+            await PredictionLog.objects.acreate(**prediction_log_fields(product_name, params, result))
+            publish_live(params, result, engine)
+
+            return JsonResponse(result)
+
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Invalid input: {str(e)}'
+            }, status=400)
+
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Server error: {str(e)}'
+            }, status=500)
+
+
+class AsyncMaterialsView(AsyncAPIView):
+    """Async variant of GetMaterialsView"""
+    throttled = True
+    etag_func = staticmethod(json_api_etag)
+
+    async def get(self, request):
+        service = CarbonFootprintService()
+        return JsonResponse({
+            'success': True,
+            'materials': service.get_available_materials()
+        })
+
+
+class AsyncModelInfoView(AsyncAPIView):
+    """Async variant of ModelInfoView"""
+    throttled = True
+    etag_func = staticmethod(json_api_etag)
+
+    async def get(self, request):
+        service = CarbonFootprintService()
+        return JsonResponse({
+            'success': True,
+            'model_info': service.get_model_info()
+        })
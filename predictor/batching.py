@@ -0,0 +1,191 @@
+"""
+Micro-batching for concurrent single-row predictions
+Rows submitted within a short window are stacked into one matrix so the
+fixed cost of model.predict is paid once per batch instead of per request.
+The active batcher's stats are exposed on /api/metrics/.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .metrics import register_collector
+
+
+# Upper bounds (ms) of the queueing-delay histogram buckets; last is +Inf
+DELAY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, float('inf'))
+
+# Queued after the last row by stop()
+_STOP = object()
+
+
+class BatcherStopped(RuntimeError):
+    """A row was submitted to a batcher that has been stopped"""
+
+
+class BatchStats:
+    """Batch-size distribution and queueing delay, written by the worker thread only"""
+
+    def __init__(self):
+        self.batch_sizes = {}
+        self.delay_buckets = [0] * len(DELAY_BUCKETS_MS)
+        self.delay_sum_ms = 0.0
+        self.rows = 0
+        self.batches = 0
+        self.fallbacks = 0
+
+    def record(self, size, delays_ms):
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        self.batches += 1
+        self.rows += size
+        for delay in delays_ms:
+            self.delay_sum_ms += delay
+            for i, bound in enumerate(DELAY_BUCKETS_MS):
+                if delay <= bound:
+                    self.delay_buckets[i] += 1
+                    break
+
+    def snapshot(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0,
+            'fallbacks': self.fallbacks,
+            'batch_sizes': dict(sorted(dict(self.batch_sizes).items())),
+            'queue_delay_ms': {
+                'mean': round(self.delay_sum_ms / self.rows, 3) if self.rows else 0,
+                'buckets': dict(zip(['+Inf' if b == float('inf') else b for b in DELAY_BUCKETS_MS],
+                                    self.delay_buckets)),
+            },
+        }
+
+
+class MicroBatcher:
+    """Collects single rows for up to window_ms or max_batch_size, then predicts once"""
+
+    def __init__(self, predict_fn, window_ms=2.0, max_batch_size=64):
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.stats = BatchStats()
+        self.stopped = False
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='predictor-microbatch', daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self):
+        """False once stopped, or in a forked child (threads don't survive a fork)"""
+        return not self.stopped and self._thread.is_alive()
+
+    def submit(self, row):
+        """Queue one feature row; the returned Future resolves to its prediction"""
+        future = Future()
+        if self.stopped:
+            future.set_exception(BatcherStopped('micro-batcher stopped'))
+        else:
+            self._queue.put((row, future, time.perf_counter()))
+        return future
+
+    def stop(self):
+        """Let the worker thread finish the rows already queued, then exit"""
+        self.stopped = True
+        self._queue.put(_STOP)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.window
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            predictions = self.predict_fn(np.array([row for row, _, _ in batch], dtype=np.float64))
+        except Exception:
+            # One bad row must not fail its neighbours: retry the rows one by
+            # one so only the offending ones get the exception
+            self.stats.fallbacks += 1
+            predictions = None
+        self.stats.record(len(batch), [(started - enqueued) * 1000 for _, _, enqueued in batch])
+
+        for i, (row, future, _) in enumerate(batch):
+            if predictions is not None:
+                future.set_result(predictions[i])
+                continue
+            try:
+                future.set_result(self.predict_fn(np.array([row], dtype=np.float64))[0])
+            except Exception as e:
+                future.set_exception(e)
+
+
+# ====== METRICS ======
+
+_active = None
+
+
+def activate(batcher):
+    """Make batcher the one whose stats this process exposes"""
+    global _active
+    _active = batcher
+    return batcher
+
+
+def _reset_after_fork():
+    # The batcher's worker thread doesn't survive a fork
+    global _active
+    _active = None
+
+
+def _expose_stats():
+    """Process-local micro-batching metrics for /api/metrics/"""
+    if _active is None:
+        return []
+    stats = _active.stats
+    pid = os.getpid()
+    lines = []
+    for name, value, help_text in (
+        ('batches', stats.batches, 'Micro-batches predicted by this process'),
+        ('rows', stats.rows, 'Rows predicted through micro-batches by this process'),
+        ('fallbacks', stats.fallbacks, 'Micro-batches that failed and were retried row by row'),
+    ):
+        lines.append(f'# HELP predictor_microbatch_{name}_total {help_text}')
+        lines.append(f'# TYPE predictor_microbatch_{name}_total counter')
+        lines.append(f'predictor_microbatch_{name}_total{{pid="{pid}"}} {value}')
+
+    name = 'predictor_microbatch_queue_delay_seconds'
+    lines.append(f'# HELP {name} Time rows waited for their micro-batch in this process')
+    lines.append(f'# TYPE {name} histogram')
+    cumulative = 0
+    for bound, count in zip(DELAY_BUCKETS_MS, stats.delay_buckets):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound / 1000)
+        lines.append(f'{name}_bucket{{pid="{pid}",le="{le}"}} {cumulative}')
+    lines.append(f'{name}_sum{{pid="{pid}"}} {stats.delay_sum_ms / 1000!r}')
+    lines.append(f'{name}_count{{pid="{pid}"}} {cumulative}')
+    return lines
+
+
+register_collector(_expose_stats)
+os.register_at_fork(after_in_child=_reset_after_fork)
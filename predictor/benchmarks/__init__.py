@@ -0,0 +1,117 @@
+"""
+Microbenchmark harness for the predictor hot paths
+Run with `python manage.py benchmark run`, compare two result files with
+`python manage.py benchmark compare BASELINE CURRENT`
+"""
+import json
+import os
+import platform
+import statistics
+import time
+
+import numpy as np
+import sklearn
+
+
+_benchmarks = []
+
+
+def benchmark(name, rows=1):
+    """Register fn(ctx) -> callable under name; rows scales ops/s to rows/s"""
+    def decorator(setup):
+        _benchmarks.append((name, rows, setup))
+        return setup
+    return decorator
+
+
+def registered_benchmarks():
+    return list(_benchmarks)
+
+
+def measure(fn, rounds=7, min_round_time=0.05):
+    """
+    Time fn() over several rounds, each long enough to swamp timer noise
+
+    Returns:
+        dict with per-call median/min/max seconds, rounds and loops per round
+    """
+    fn()  # warm-up
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_round_time / elapsed) + 1))
+
+    samples = [elapsed / loops]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+
+    return {
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'max_s': max(samples),
+        'rounds': rounds,
+        'loops': loops,
+    }
+
+
+def environment():
+    """Machine and library details stored alongside results"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save_results(path, results, meta):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """
+    Compare median times benchmark by benchmark
+
+    Returns:
+        list of (name, baseline_s, current_s, ratio, status) where status is
+        'regression', 'improvement', 'ok', 'new' or 'missing'
+    """
+    rows = []
+    base_results = baseline['results']
+    current_results = current['results']
+    for name in sorted(set(base_results) | set(current_results)):
+        if name not in current_results:
+            rows.append((name, base_results[name]['median_s'], None, None, 'missing'))
+            continue
+        if name not in base_results:
+            rows.append((name, None, current_results[name]['median_s'], None, 'new'))
+            continue
+        before = base_results[name]['median_s']
+        after = current_results[name]['median_s']
+        ratio = after / before if before else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, before, after, ratio, status))
+    return rows
@@ -0,0 +1,154 @@
+"""
+Predictor hot-path benchmarks
+Each entry receives the shared context and returns the callable to time
+"""
+import os
+import tempfile
+
+import joblib
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.test import Client
+
+from predictor.services import BATCH_INPUT_COLUMNS, MODEL_PATH, CarbonFootprintService
+from predictor.training import train_model
+from . import benchmark
+
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+TRAINING_DATA = os.path.join('predictor', 'training', 'training_data.csv')
+
+
+def build_context(train_samples=2000):
+    """
+    Load the model artifact, or train one on the fly when none is present,
+    and sample benchmark inputs from the training data
+    """
+    context = {}
+    if os.path.exists(MODEL_PATH):
+        context['model_path'] = MODEL_PATH
+        context['model_source'] = 'artifact'
+    else:
+        artifacts, _ = train_model.train_model(train_model.generate_synthetic_dataset(num_samples=train_samples))
+        handle, path = tempfile.mkstemp(suffix='.joblib')
+        os.close(handle)
+        joblib.dump(artifacts, path)
+        context['model_path'] = path
+        context['model_source'] = f'trained ({train_samples} samples)'
+
+    service = object.__new__(CarbonFootprintService)
+    service._load_model(context['model_path'], verbose=False)
+    context['service'] = CarbonFootprintService.use_artifacts(service._model_artifacts)
+
+    df = pd.read_csv(TRAINING_DATA, usecols=list(BATCH_INPUT_COLUMNS))
+    df = df.sample(n=max(BATCH_SIZES), replace=True, random_state=42)
+    context['columns'] = {name: df[name].to_numpy() for name in BATCH_INPUT_COLUMNS}
+    context['row'] = {name: df[name].iloc[0] for name in BATCH_INPUT_COLUMNS}
+    return context
+
+
+def cleanup_context(context):
+    if context['model_path'] != MODEL_PATH:
+        os.remove(context['model_path'])
+
+
+@benchmark('service.load_model')
+def bench_load_model(ctx):
+    def run():
+        service = object.__new__(CarbonFootprintService)
+        service._load_model(ctx['model_path'], verbose=False)
+    return run
+
+
+@benchmark('service.predict')
+def bench_predict(ctx):
+    service, row = ctx['service'], ctx['row']
+    return lambda: service.predict(**row)
+
+
+@benchmark('service.predict_analytic')
+def bench_predict_analytic(ctx):
+    service, row = ctx['service'], ctx['row']
+    return lambda: service.predict(**row, engine='analytic')
+
+
+@benchmark('service.encode')
+def bench_encode(ctx):
+    artifacts = ctx['service']._model_artifacts
+    row = ctx['row']
+
+    def run():
+        artifacts['material_encoder'].transform([row['material']])
+        artifacts['transport_encoder'].transform([row['transport_mode']])
+        artifacts['intensity_encoder'].transform([row['manufacturing_intensity']])
+    return run
+
+
+@benchmark('service.breakdown')
+def bench_breakdown(ctx):
+    service, row = ctx['service'], ctx['row']
+    artifacts = service._model_artifacts
+    args = (artifacts['material_encoder'].transform([row['material']])[0], row['weight_kg'],
+            artifacts['transport_encoder'].transform([row['transport_mode']])[0], row['transport_distance_km'],
+            artifacts['intensity_encoder'].transform([row['manufacturing_intensity']])[0])
+    return lambda: service._calculate_breakdown(*args)
+
+
+@benchmark('service.compensation')
+def bench_compensation(ctx):
+    return lambda: ctx['service']._calculate_compensation(12.5)
+
+
+@benchmark('service.equivalency')
+def bench_equivalency(ctx):
+    return lambda: ctx['service']._get_equivalency(12.5)
+
+
+@benchmark('view.predict')
+def bench_view_predict(ctx):
+    client = Client(HTTP_HOST='localhost')
+    payload = dict(ctx['row'], product_name='Benchmark')
+
+    def run():
+        # Roll back the PredictionLog insert so repeated runs stay comparable
+        with transaction.atomic():
+            client.post('/api/predict/', payload, content_type='application/json')
+            transaction.set_rollback(True)
+    return run
+
+
+def _register_page(name, path):
+    @benchmark(f'view.{name}')
+    def bench_page(ctx):
+        client = Client(HTTP_HOST='localhost')
+        return lambda: client.get(path)
+
+    @benchmark(f'view.{name}_uncached')
+    def bench_page_uncached(ctx):
+        client = Client(HTTP_HOST='localhost')
+        cache = caches[settings.PREDICTOR_PAGE_CACHE.get('CACHE', 'default')]
+
+        def run():
+            # Drop the page and fragment entries so every call renders
+            cache.clear()
+            client.get(path)
+        return run
+
+
+_register_page('home', '/')
+_register_page('insights', '/insights/')
+
+
+def _register_batch(size):
+    @benchmark(f'service.predict_batch[{size}]', rows=size)
+    def bench_batch(ctx):
+        service = ctx['service']
+        columns = {name: values[:size] for name, values in ctx['columns'].items()}
+        return lambda: service.predict_batch(columns)
+
+
+for _size in BATCH_SIZES:
+    _register_batch(_size)
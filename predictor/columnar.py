@@ -0,0 +1,146 @@
+"""
+Columnar wire formats for bulk predictions
+Parsers and renderers that move parallel column arrays in and out of
+DRF without building one Python object per row
+"""
+import io
+
+import numpy as np
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+
+def columns_from_data(data):
+    """Normalize parsed request data into a dict of NumPy columns"""
+    if isinstance(data, np.ndarray):
+        if data.dtype.names is None:
+            raise ParseError('.npy payload must be a structured array with named fields')
+        return {name: data[name] for name in data.dtype.names}
+
+    if not isinstance(data, dict) or not isinstance(data.get('columns'), dict):
+        raise ParseError("Expected a body of the form {'columns': {name: [values...]}}")
+
+    return {name: _decode_column(values) for name, values in data['columns'].items()}
+
+
+def _decode_column(values):
+    """Decode a column that is either a list or a typed raw buffer"""
+    if isinstance(values, dict):
+        # {'dtype': '<f8', 'data': <bytes>} - zero-copy view over the buffer
+        try:
+            return np.frombuffer(values['data'], dtype=np.dtype(values['dtype']))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ParseError(f'Invalid typed column: {e}')
+    return np.asarray(values)
+
+
+def _encode_column(values):
+    """Encode a NumPy column as a typed raw buffer (msgpack only)"""
+    values = np.ascontiguousarray(values)
+    if values.dtype.kind in 'iuf':
+        return {'dtype': values.dtype.str, 'data': values.tobytes()}
+    return values.tolist()
+
+
+class NpyParser(BaseParser):
+    """Structured NumPy array (.npy) with one field per input column"""
+    media_type = 'application/x-npy'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return np.load(io.BytesIO(stream.read()), allow_pickle=False)
+        except (ValueError, OSError) as e:
+            raise ParseError(f'Invalid .npy payload: {e}')
+
+
+class NpzParser(BaseParser):
+    """NumPy archive (.npz) with one array per input column"""
+    media_type = 'application/x-npz'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            archive = np.load(io.BytesIO(stream.read()), allow_pickle=False)
+            return {'columns': {name: archive[name] for name in archive.files}}
+        except (ValueError, OSError) as e:
+            raise ParseError(f'Invalid .npz payload: {e}')
+
+
+class MsgpackParser(BaseParser):
+    """Struct-of-arrays msgpack body: {'columns': {name: list | typed buffer}}"""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as e:
+            raise ParseError(f'Invalid msgpack payload: {e}')
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON renderer that understands NumPy columns"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'columns' in data:
+            data = dict(data, columns={name: np.asarray(values).tolist()
+                                       for name, values in data['columns'].items()})
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class NpyRenderer(BaseRenderer):
+    """Render result columns as a single structured .npy array"""
+    media_type = 'application/x-npy'
+    format = 'npy'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        columns = data['columns']
+        names = list(columns)
+        n = len(columns[names[0]]) if names else 0
+        out = np.empty(n, dtype=[(name, np.asarray(columns[name]).dtype) for name in names])
+        for name in names:
+            out[name] = columns[name]
+        buf = io.BytesIO()
+        np.save(buf, out, allow_pickle=False)
+        return buf.getvalue()
+
+
+class NpzRenderer(BaseRenderer):
+    """Render result columns as a .npz archive"""
+    media_type = 'application/x-npz'
+    format = 'npz'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buf = io.BytesIO()
+        np.savez(buf, **data['columns'])
+        return buf.getvalue()
+
+
+class MsgpackRenderer(BaseRenderer):
+    """Render result columns as struct-of-arrays msgpack with typed buffers"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        payload = dict(data, columns={name: _encode_column(values)
+                                      for name, values in data['columns'].items()})
+        return msgpack.packb(payload, use_bin_type=True)
+
+
+COLUMNAR_PARSERS = [JSONParser, NpyParser, NpzParser]
+COLUMNAR_RENDERERS = [ColumnarJSONRenderer, NpyRenderer, NpzRenderer]
+
+if msgpack is not None:
+    COLUMNAR_PARSERS.append(MsgpackParser)
+    COLUMNAR_RENDERERS.append(MsgpackRenderer)
+
@@ -0,0 +1,306 @@
+"""
+Input drift against the training distribution
+
+Training stores a compact reference in the model artifact under 'drift':
+quantile-binned histograms of the numeric inputs (weight, distance), class
+counts of the categorical ones, and the training range of every numeric
+input (distance per transport mode, since each mode was sampled from its
+own range). Artifacts trained before this get the reference built once
+from the saved training data.
+
+Every prediction adds one count per feature to this process's live
+histograms (a bisect over a dozen edges, no lock) and is flagged when an
+input lies outside the training range, i.e. the model is extrapolating.
+A background thread scores the live histograms every
+PREDICTOR_DRIFT['INTERVAL_S'] with the population stability index (PSI)
+and, for numeric inputs, the Kolmogorov-Smirnov distance between the
+binned distributions, then decays the counts so the window follows recent
+traffic (HALF_LIFE_S). Features over the thresholds are reported as
+drifting in responses and on /api/metrics/.
+"""
+import os
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .insights import TRAINING_DATA
+from .metrics import DRIFT_INPUTS, DRIFT_OUT_OF_RANGE, register_collector
+
+
+NUMERIC = ('weight_kg', 'transport_distance_km')
+
+# Feature -> artifact encoder key
+CATEGORICAL = {
+    'material': 'material_encoder',
+    'transport_mode': 'transport_encoder',
+    'manufacturing_intensity': 'intensity_encoder',
+}
+
+FEATURES = ('material', 'weight_kg', 'transport_mode', 'transport_distance_km', 'manufacturing_intensity')
+
+REFERENCE_BINS = 10
+
+# Floor for bin shares in PSI, so empty bins don't make it infinite
+PSI_EPSILON = 1e-4
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_DRIFT', {})
+
+
+def build_reference(artifacts, df, bins=REFERENCE_BINS):
+    """
+    Drift reference for a model from its training inputs
+
+    Args:
+        artifacts: model artifact dict (for the encoder classes)
+        df: training rows with the raw input columns
+    """
+    numeric = {}
+    for feature in NUMERIC:
+        values = df[feature].to_numpy(dtype=np.float64)
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+        numeric[feature] = {
+            'edges': edges.tolist(),
+            'counts': np.histogram(values, edges)[0].tolist(),
+        }
+    categorical = {}
+    for feature, key in CATEGORICAL.items():
+        classes = [str(c) for c in artifacts[key].classes_]
+        counts = df[feature].astype(str).value_counts()
+        categorical[feature] = {'classes': classes, 'counts': [int(counts.get(c, 0)) for c in classes]}
+    distance = df.groupby('transport_mode')['transport_distance_km'].agg(['min', 'max'])
+    return {
+        'n': int(len(df)),
+        'numeric': numeric,
+        'categorical': categorical,
+        'distance_by_mode': {str(mode): [float(row['min']), float(row['max'])] for mode, row in distance.iterrows()},
+    }
+
+
+def reference_from_training_data(artifacts, path=TRAINING_DATA):
+    """Reference for artifacts trained without one, from the saved training data"""
+    df = pd.read_csv(path)
+    return build_reference(artifacts, df[df['material'].isin(artifacts['material_encoder'].classes_)])
+
+
+def _shares(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum()
+    return counts / total if total else counts
+
+
+def psi(expected, actual):
+    """Population stability index between two histograms over the same bins"""
+    p = np.maximum(_shares(expected), PSI_EPSILON)
+    q = np.maximum(_shares(actual), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected, actual):
+    """Largest gap between the cumulative distributions of two histograms"""
+    return float(np.max(np.abs(np.cumsum(_shares(expected)) - np.cumsum(_shares(actual)))))
+
+
+class DriftMonitor:
+    """Live input histograms for one model, scored against its reference"""
+
+    def __init__(self, reference, transport_classes):
+        self.reference = reference
+        self.edges = {f: reference['numeric'][f]['edges'] for f in NUMERIC}
+        # Numeric bins: below the training minimum, the quantile bins, above the maximum
+        self.expected = {f: [0] + reference['numeric'][f]['counts'] + [0] for f in NUMERIC}
+        self.expected.update({f: reference['categorical'][f]['counts'] for f in CATEGORICAL})
+        self.live = {f: [0.0] * len(counts) for f, counts in self.expected.items()}
+        self.out_of_range = dict.fromkeys(NUMERIC, 0.0)
+        self.window = 0.0
+        # Distance range per transport encoder code
+        by_mode = reference['distance_by_mode']
+        overall = (self.edges['transport_distance_km'][0], self.edges['transport_distance_km'][-1])
+        self.distance_ranges = [tuple(by_mode.get(str(mode), overall)) for mode in transport_classes]
+        self.psi = {}
+        self.ks = {}
+        self.drifting = ()
+
+    def _numeric_bin(self, feature, value):
+        edges = self.edges[feature]
+        i = bisect_right(edges, value)
+        # The top edge (the training maximum) belongs to the last quantile bin
+        return i - 1 if i == len(edges) and value == edges[-1] else i
+
+    def observe(self, material_code, weight_kg, transport_code, distance_km, intensity_code):
+        """
+        Count one prediction's inputs (encoder codes for categoricals)
+
+        Returns:
+            list of inputs outside the training range
+        """
+        live = self.live
+        live['material'][material_code] += 1
+        live['transport_mode'][transport_code] += 1
+        live['manufacturing_intensity'][intensity_code] += 1
+        weight_bin = self._numeric_bin('weight_kg', weight_kg)
+        live['weight_kg'][weight_bin] += 1
+        live['transport_distance_km'][self._numeric_bin('transport_distance_km', distance_km)] += 1
+        self.window += 1
+        DRIFT_INPUTS.inc('weight_kg')
+        DRIFT_INPUTS.inc('transport_distance_km')
+
+        out_of_range = []
+        if weight_bin == 0 or weight_bin == len(live['weight_kg']) - 1:
+            out_of_range.append('weight_kg')
+        low, high = self.distance_ranges[transport_code]
+        if not low <= distance_km <= high:
+            out_of_range.append('transport_distance_km')
+        for feature in out_of_range:
+            self.out_of_range[feature] += 1
+            DRIFT_OUT_OF_RANGE.inc(feature)
+        return out_of_range
+
+    def observe_batch(self, material_codes, weight_kg, transport_codes, distance_km, intensity_codes):
+        """
+        Vectorized observe() for a batch
+
+        Returns:
+            boolean array, True for rows with an input outside the training range
+        """
+        n = len(weight_kg)
+        if not n:
+            return np.zeros(0, dtype=bool)
+        columns = {
+            'material': material_codes,
+            'transport_mode': transport_codes,
+            'manufacturing_intensity': intensity_codes,
+        }
+        for feature, values in (('weight_kg', weight_kg), ('transport_distance_km', distance_km)):
+            edges = np.asarray(self.edges[feature])
+            bins = np.searchsorted(edges, values, side='right')
+            bins[(bins == len(edges)) & (values == edges[-1])] -= 1
+            columns[feature] = bins
+        for feature, values in columns.items():
+            counts = np.bincount(values, minlength=len(self.live[feature]))
+            live = self.live[feature]
+            for i in np.flatnonzero(counts):
+                live[i] += int(counts[i])
+        self.window += n
+
+        ranges = np.asarray(self.distance_ranges)[transport_codes]
+        weight_bins = columns['weight_kg']
+        flags = {
+            'weight_kg': (weight_bins == 0) | (weight_bins == len(self.live['weight_kg']) - 1),
+            'transport_distance_km': (distance_km < ranges[:, 0]) | (distance_km > ranges[:, 1]),
+        }
+        for feature, flagged in flags.items():
+            DRIFT_INPUTS.inc(feature, n)
+            count = int(flagged.sum())
+            if count:
+                self.out_of_range[feature] += count
+                DRIFT_OUT_OF_RANGE.inc(feature, count)
+        return flags['weight_kg'] | flags['transport_distance_km']
+
+    def check(self, *codes_and_values):
+        """observe() plus the drift summary returned with a prediction"""
+        out_of_range = self.observe(*codes_and_values)
+        return {
+            'flagged': bool(out_of_range),
+            'out_of_range': out_of_range,
+            'drifting': list(self.drifting),
+        }
+
+    def score(self, min_samples=200, psi_threshold=0.2, ks_threshold=0.1, decay=1.0):
+        """Recompute PSI/KS over the window, then decay the live counts"""
+        if self.window >= min_samples:
+            self.psi = {f: psi(self.expected[f], self.live[f]) for f in FEATURES}
+            self.ks = {f: binned_ks(self.expected[f], self.live[f]) for f in NUMERIC}
+            self.drifting = tuple(
+                f for f in FEATURES if self.psi[f] > psi_threshold or self.ks.get(f, 0.0) > ks_threshold
+            )
+        else:
+            self.psi, self.ks, self.drifting = {}, {}, ()
+        if decay < 1.0:
+            for counts in self.live.values():
+                counts[:] = [c * decay for c in counts]
+            for feature in NUMERIC:
+                self.out_of_range[feature] *= decay
+            self.window *= decay
+
+
+# ====== BACKGROUND SCORING ======
+
+_monitor = None
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def _score_forever():
+    while True:
+        config = _config()
+        interval = config.get('INTERVAL_S', 10)
+        time.sleep(interval)
+        monitor = _monitor
+        if monitor is not None:
+            monitor.score(
+                min_samples=config.get('MIN_SAMPLES', 200),
+                psi_threshold=config.get('PSI_THRESHOLD', 0.2),
+                ks_threshold=config.get('KS_THRESHOLD', 0.1),
+                decay=0.5 ** (interval / config.get('HALF_LIFE_S', 3600)),
+            )
+
+
+def activate(monitor):
+    """Make monitor the one scored (and exposed) for this process"""
+    global _monitor, _scorer
+    _monitor = monitor
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = threading.Thread(target=_score_forever, name='predictor-drift', daemon=True)
+                _scorer.start()
+    return monitor
+
+
+def enabled():
+    return _config().get('ENABLED', True)
+
+
+def _reset_after_fork():
+    # The scoring thread doesn't survive a fork; a worker starts its own
+    global _monitor, _scorer
+    _monitor = None
+    _scorer = None
+
+
+def _expose_gauges():
+    """Process-local drift gauges for /api/metrics/"""
+    monitor = _monitor
+    if monitor is None:
+        return []
+    pid = os.getpid()
+    lines = [
+        '# HELP predictor_drift_window_inputs Predictions in the decayed drift window of this process',
+        '# TYPE predictor_drift_window_inputs gauge',
+        f'predictor_drift_window_inputs{{pid="{pid}"}} {monitor.window:.1f}',
+        '# HELP predictor_drift_out_of_range_ratio Share of inputs in the window outside the training range',
+        '# TYPE predictor_drift_out_of_range_ratio gauge',
+    ]
+    for feature in NUMERIC:
+        ratio = monitor.out_of_range[feature] / monitor.window if monitor.window else 0.0
+        lines.append(f'predictor_drift_out_of_range_ratio{{feature="{feature}",pid="{pid}"}} {ratio:.6f}')
+    for name, scores, help_text in (
+        ('psi', monitor.psi, 'Population stability index of the window against training'),
+        ('ks', monitor.ks, 'Kolmogorov-Smirnov distance of the window against training (binned)'),
+    ):
+        if scores:
+            lines.append(f'# HELP predictor_drift_{name} {help_text}')
+            lines.append(f'# TYPE predictor_drift_{name} gauge')
+            for feature, value in scores.items():
+                lines.append(f'predictor_drift_{name}{{feature="{feature}",pid="{pid}"}} {value:.6f}')
+    return lines
+
+
+register_collector(_expose_gauges)
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,236 @@
+"""
+Streaming export of PredictionLog history
+Rows are read in keyset pages over the primary key with values_list(), so
+neither model instances nor the full result set are ever held in memory,
+and encoded chunk by chunk as CSV, NDJSON or Parquet (optionally gzipped)
+"""
+import csv
+import datetime
+import io
+import itertools
+import json
+import zlib
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import PredictionLog
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+
+EXPORT_FIELDS = (
+    'id', 'created_at', 'product_name', 'material', 'weight_kg', 'transport_mode',
+    'transport_distance_km', 'predicted_co2_kg', 'material_co2', 'manufacturing_co2',
+    'transport_co2', 'trees_to_offset',
+)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+# Larger pages are clamped: one page is held in memory (and, for Parquet, is
+# one row group) while it is encoded
+MAX_CHUNK_SIZE = 50000
+
+
+def _parse_bound(value, name, end=False):
+    """ISO date or datetime -> aware datetime; a bare end date includes that whole day"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid {name} '{value}' (expected YYYY-MM-DD or an ISO datetime)")
+        if end:
+            day += datetime.timedelta(days=1)
+        parsed = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def build_filters(start=None, end=None, material=None):
+    """
+    Queryset filters for an export
+
+    Raises:
+        ValueError for unparseable dates
+    """
+    filters = {}
+    if start:
+        filters['created_at__gte'] = _parse_bound(start, 'start')
+    if end:
+        filters['created_at__lt'] = _parse_bound(end, 'end', end=True)
+    if material:
+        filters['material'] = material
+    return filters
+
+
+def iter_chunks(filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of row tuples, paging by primary key (WHERE id > last ORDER BY id LIMIT n)"""
+    queryset = PredictionLog.objects.filter(**filters).order_by('id').values_list(*EXPORT_FIELDS)
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+class _Buffer(io.RawIOBase):
+    """Write target that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class CSVEncoder:
+    def __init__(self):
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text)
+
+    def _flush(self):
+        data = self._text.getvalue().encode()
+        self._text.seek(0)
+        self._text.truncate()
+        return data
+
+    def header(self):
+        self._writer.writerow(EXPORT_FIELDS)
+        return self._flush()
+
+    def encode(self, chunk):
+        self._writer.writerows(
+            (row[0], row[1].isoformat()) + row[2:] for row in chunk
+        )
+        return self._flush()
+
+    def footer(self):
+        return b''
+
+
+class NDJSONEncoder:
+    def header(self):
+        return b''
+
+    def encode(self, chunk):
+        lines = []
+        for row in chunk:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['created_at'] = record['created_at'].isoformat()
+            lines.append(json.dumps(record))
+        return ('\n'.join(lines) + '\n').encode()
+
+    def footer(self):
+        return b''
+
+
+class ParquetEncoder:
+    """One row group per chunk; the footer is written when the export ends"""
+
+    def __init__(self):
+        if pa is None:
+            raise ValueError('Parquet export requires pyarrow (pip install pyarrow)')
+        self._schema = pa.schema([
+            ('id', pa.int64()),
+            ('created_at', pa.timestamp('us', tz='UTC')),
+            ('product_name', pa.string()),
+            ('material', pa.string()),
+            ('weight_kg', pa.float64()),
+            ('transport_mode', pa.string()),
+            ('transport_distance_km', pa.float64()),
+            ('predicted_co2_kg', pa.float64()),
+            ('material_co2', pa.float64()),
+            ('manufacturing_co2', pa.float64()),
+            ('transport_co2', pa.float64()),
+            ('trees_to_offset', pa.float64()),
+        ])
+        self._buffer = _Buffer()
+        self._writer = pq.ParquetWriter(self._buffer, self._schema, compression='snappy')
+
+    def header(self):
+        return self._buffer.drain()
+
+    def encode(self, chunk):
+        columns = dict(zip(EXPORT_FIELDS, zip(*chunk)))
+        self._writer.write_table(pa.Table.from_pydict(columns, schema=self._schema))
+        return self._buffer.drain()
+
+    def footer(self):
+        self._writer.close()
+        return self._buffer.drain()
+
+
+ENCODERS = {
+    'csv': CSVEncoder,
+    'ndjson': NDJSONEncoder,
+    'parquet': ParquetEncoder,
+}
+
+
+def stream_export(fmt, filters, chunk_size=DEFAULT_CHUNK_SIZE, compress=False, include_archive=False):
+    """
+    Generate the encoded export as a sequence of byte strings
+    With include_archive, rows moved out by retention come first;
+    chunk_size is clamped to MAX_CHUNK_SIZE
+
+    Raises:
+        ValueError for unknown formats, a chunk_size below 1 or a missing
+        optional dependency (raised eagerly, before the first chunk is requested)
+    """
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown format '{fmt}' (choose from {', '.join(ENCODERS)})")
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be a positive integer')
+    chunk_size = min(chunk_size, MAX_CHUNK_SIZE)
+    encoder = ENCODERS[fmt]()
+    chunks = iter_chunks(filters, chunk_size)
+    if include_archive:
+        from .retention import iter_archive_chunks  # retention builds on this module
+        chunks = itertools.chain(iter_archive_chunks(filters, chunk_size), chunks)
+    return _generate(encoder, chunks, compress)
+
+
+def _generate(encoder, chunks, compress):
+    # wbits=31 -> gzip container, compressed incrementally per chunk
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(data):
+        return compressor.compress(data) if compressor else data
+
+    yield emit(encoder.header())
+    for chunk in chunks:
+        yield emit(encoder.encode(chunk))
+    yield emit(encoder.footer())
+    if compressor:
+        yield compressor.flush()
+
+
+def export_filename(fmt, compress=False):
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    return f"predictions-{stamp}.{fmt}" + ('.gz' if compress else '')
@@ -0,0 +1,237 @@
+"""
+Emission-factor registry
+
+MaterialFactor, TransportFactor and ManufacturingIntensity are the single
+source of emission factors. Each process loads them once into FactorTables
+(NumPy arrays plus name -> index maps) stamped with the FactorVersion
+counter. Saving or deleting a factor bumps the counter (signals; a bulk
+import bumps it once); the saving process drops its tables when the
+transaction commits, and every other process compares the counter at most
+once per CHECK_INTERVAL_S, so requests never query the factor tables.
+"""
+import csv
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import FactorVersion, ManufacturingIntensity, MaterialFactor, TransportFactor
+
+
+# Used for labels the model knows but the registry doesn't
+DEFAULT_MATERIAL_FACTOR = 3.0
+DEFAULT_MANUFACTURING_MULTIPLIER = 1.0
+DEFAULT_TRANSPORT_FACTOR = 0.1
+DEFAULT_INTENSITY_BASE = 1.5
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_FACTORS', {})
+
+
+class FactorTables:
+    """One immutable snapshot of the factor tables"""
+
+    def __init__(self, version, materials, transport, intensities):
+        self.version = version
+        self.materials = [name for name, _, _ in materials]
+        self.material_factor = np.array([factor for _, factor, _ in materials], dtype=np.float64)
+        self.manufacturing_multiplier = np.array([multiplier for _, _, multiplier in materials], dtype=np.float64)
+        self.transport_modes = [mode for mode, _ in transport]
+        self.transport_factor = np.array([factor for _, factor in transport], dtype=np.float64)
+        self.intensities = [level for level, _ in intensities]
+        self.intensity_base = np.array([base for _, base in intensities], dtype=np.float64)
+        self._material_index = {name: i for i, name in enumerate(self.materials)}
+        self._transport_index = {mode: i for i, mode in enumerate(self.transport_modes)}
+        self._intensity_index = {level: i for i, level in enumerate(self.intensities)}
+
+    @staticmethod
+    def _align(index, values, labels, default):
+        return np.array([values[index[label]] if label in index else default for label in labels], dtype=np.float64)
+
+    def aligned(self, material_classes, transport_classes, intensity_classes):
+        """
+        Factor arrays indexed by model encoder code
+
+        Returns:
+            (material_factor, manufacturing_multiplier, transport_factor, intensity_base)
+        """
+        return (
+            self._align(self._material_index, self.material_factor, material_classes, DEFAULT_MATERIAL_FACTOR),
+            self._align(self._material_index, self.manufacturing_multiplier, material_classes,
+                        DEFAULT_MANUFACTURING_MULTIPLIER),
+            self._align(self._transport_index, self.transport_factor, transport_classes, DEFAULT_TRANSPORT_FACTOR),
+            self._align(self._intensity_index, self.intensity_base, intensity_classes, DEFAULT_INTENSITY_BASE),
+        )
+
+    def material(self, name):
+        """(emission factor, manufacturing multiplier) for a material name"""
+        i = self._material_index[name]
+        return float(self.material_factor[i]), float(self.manufacturing_multiplier[i])
+
+    def transport(self, mode):
+        return float(self.transport_factor[self._transport_index[mode]])
+
+    def intensity(self, level):
+        return float(self.intensity_base[self._intensity_index[level]])
+
+
+def current_version():
+    return FactorVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def load_tables():
+    # Version first: rows changed after this read carry a newer version and get reloaded
+    version = current_version()
+    # Materials in seed (pk) order: the training script samples from this list, so a
+    # name order would give a different dataset for the same seed
+    return FactorTables(
+        version,
+        list(MaterialFactor.objects.order_by('pk')
+             .values_list('name', 'emission_factor_kg_co2_per_kg', 'manufacturing_multiplier')),
+        list(TransportFactor.objects.order_by('mode').values_list('mode', 'kg_co2_per_kg_per_1000km')),
+        list(ManufacturingIntensity.objects.order_by('base_kg_co2_per_kg')
+             .values_list('level', 'base_kg_co2_per_kg')),
+    )
+
+
+class FactorRegistry:
+    """Process-wide FactorTables cache"""
+
+    def __init__(self):
+        self._tables = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        return time.monotonic() - self._checked_at >= _config().get('CHECK_INTERVAL_S', 5.0)
+
+    def get(self):
+        """Current tables; hits the database only on first use or after CHECK_INTERVAL_S"""
+        tables = self._tables
+        if tables is None or self._stale():
+            with self._lock:
+                tables = self._tables
+                if tables is None or self._stale():
+                    if tables is None or current_version() != tables.version:
+                        tables = self._tables = load_tables()
+                    self._checked_at = time.monotonic()
+        return tables
+
+    def invalidate(self):
+        self._tables = None
+
+
+registry = FactorRegistry()
+
+
+def bump_version():
+    """Mark the factor tables changed, for this process on commit and for others on their next check"""
+    if not FactorVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        FactorVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    transaction.on_commit(registry.invalidate)
+
+
+@receiver([post_save, post_delete], sender=MaterialFactor)
+@receiver([post_save, post_delete], sender=TransportFactor)
+@receiver([post_save, post_delete], sender=ManufacturingIntensity)
+def _factor_changed(sender, **kwargs):
+    bump_version()
+
+
+def _parse_bool(value):
+    if value.strip().lower() in ('1', 'true', 'yes', 'y'):
+        return True
+    if value.strip().lower() in ('0', 'false', 'no', 'n', ''):
+        return False
+    raise ValueError(f"'{value}' is not a boolean")
+
+
+def _parse_intensity(value):
+    level = value.strip().upper()
+    if level not in ('LOW', 'MEDIUM', 'HIGH'):
+        raise ValueError(f"'{value}' is not LOW, MEDIUM or HIGH")
+    return level
+
+
+def _parse_factor(value):
+    number = float(value)
+    if not np.isfinite(number) or number < 0:
+        raise ValueError(f"'{value}' is not a non-negative number")
+    return number
+
+
+# kind -> (model, key column, {column: parser}, columns required for new rows)
+IMPORT_KINDS = {
+    'materials': (MaterialFactor, 'name', {
+        'category': str.strip,
+        'emission_factor_kg_co2_per_kg': _parse_factor,
+        'manufacturing_multiplier': _parse_factor,
+        'manufacturing_intensity': _parse_intensity,
+        'biodegradable': _parse_bool,
+    }, ('category', 'emission_factor_kg_co2_per_kg')),
+    'transport': (TransportFactor, 'mode', {
+        'kg_co2_per_kg_per_1000km': _parse_factor,
+    }, ('kg_co2_per_kg_per_1000km',)),
+    'intensities': (ManufacturingIntensity, 'level', {
+        'base_kg_co2_per_kg': _parse_factor,
+    }, ('base_kg_co2_per_kg',)),
+}
+
+
+def import_factors(kind, file):
+    """
+    Upsert factor rows from a CSV file (header row required)
+
+    Rows are matched on the key column (name, mode or level); columns left
+    out of the file keep their current values, or the model default for new
+    rows. The whole file is applied in one transaction with one version bump.
+
+    Returns:
+        number of rows imported
+
+    Raises:
+        ValueError for an unknown kind, missing columns or unparseable values
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown factor kind '{kind}' (choose from {', '.join(IMPORT_KINDS)})")
+    model, key, parsers, required = IMPORT_KINDS[kind]
+    reader = csv.DictReader(file)
+    header = [name.strip() for name in reader.fieldnames or []]
+    unknown = [name for name in header if name != key and name not in parsers]
+    if key not in header or unknown:
+        raise ValueError(f"CSV header must contain '{key}' and only {', '.join(parsers)}"
+                         + (f" (unknown: {', '.join(unknown)})" if unknown else ''))
+    columns = [name for name in header if name != key]
+    reader.fieldnames = header
+
+    rows = {}
+    for line, record in enumerate(reader, start=2):
+        name = (record[key] or '').strip()
+        if not name:
+            raise ValueError(f"Line {line}: empty {key}")
+        if kind != 'materials':
+            name = name.upper()
+        try:
+            rows[name] = {column: parsers[column](record[column] or '') for column in columns}
+        except ValueError as e:
+            raise ValueError(f"Line {line}: {e}") from None
+
+    existing = set(model.objects.filter(**{f'{key}__in': list(rows)}).values_list(key, flat=True))
+    missing = [column for column in required if column not in columns]
+    if missing and set(rows) - existing:
+        raise ValueError(f"New {kind} rows need columns: {', '.join(missing)}")
+
+    with transaction.atomic():
+        if columns:
+            model.objects.bulk_create(
+                [model(**{key: name}, **values) for name, values in rows.items()],
+                update_conflicts=True, unique_fields=[key], update_fields=columns, batch_size=500,
+            )
+        bump_version()
+    return len(rows)
@@ -0,0 +1,198 @@
+"""
+HTTP caching for read-only predictor responses
+
+conditional_get() computes a view's ETag before the view runs: a request
+whose If-None-Match matches gets a 304 straight away (the view, the
+service and the serializer never run), and a 200 gets the ETag plus
+Cache-Control: public, max-age=PREDICTOR_HTTP_CACHE[<max_age_key>].
+ETags derive from the loaded model artifact's version hash, so clients
+revalidate cheaply until the model is reloaded. Prediction ETags add the
+emission-factor version and the inputs.
+
+cached_page() keeps the rendered HTML of model-driven pages in the
+PREDICTOR_PAGE_CACHE cache under the same model, factor and template
+versions (the views pass that version to their {% cache %} fragments), so
+a reload or a factor edit switches every page to fresh keys and the old
+entries age out.
+"""
+import functools
+import hashlib
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .factors import registry as factor_registry
+from .services import model_version
+from .staticfiles import static_version
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_HTTP_CACHE', {})
+
+
+def _page_config():
+    return getattr(settings, 'PREDICTOR_PAGE_CACHE', {})
+
+
+def conditional_get(etag_func, max_age_key='MAX_AGE', vary=()):
+    """
+    Decorate a view with ETag-based conditional GET
+
+    etag_func(request, *args, **kwargs) returns the ETag (unquoted) or None
+    to serve the request uncached. Responses that aren't 200, or that set
+    their own ETag or Cache-Control, are passed through untouched. Async
+    views get an async wrapper (etag_func itself stays synchronous).
+    """
+    def finish(response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=_config().get(max_age_key, 300))
+        patch_vary_headers(response, vary)
+        return response
+
+    def is_final(response):
+        return response.status_code != 200 or response.has_header('ETag') or response.has_header('Cache-Control')
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag = etag_func(request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                etag = quote_etag(etag)
+                response = get_conditional_response(request, etag=etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if is_final(response):
+                        return response
+                elif response.status_code != 304:
+                    return response
+                return finish(response, etag)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = etag_func(request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if etag is None:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(etag)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if is_final(response):
+                    return response
+            elif response.status_code != 304:
+                return response
+            return finish(response, etag)
+        return wrapper
+    return decorator
+
+
+def api_etag(request, *args, **kwargs):
+    """Model version plus the negotiated renderer (JSON and the browsable API differ)"""
+    version = model_version()
+    if version is None:
+        return None
+    return f'{version}-{request.accepted_renderer.format}'
+
+
+def json_api_etag(request, *args, **kwargs):
+    """api_etag for plain Django views, which always answer JSON"""
+    version = model_version()
+    if version is None:
+        return None
+    return f'{version}-json'
+
+
+def predict_etag(request, *args, **kwargs):
+    """Model and factor versions plus the canonical inputs; None disables caching (bad input, GET off)"""
+    from .views import parse_prediction_input  # views import this module
+
+    version = model_version()
+    if version is None or not _config().get('PREDICT_GET', True):
+        return None
+    try:
+        params, error = parse_prediction_input(request.query_params)
+    except ValueError:
+        return None
+    if error:
+        return None
+    key = '|'.join(repr(params[name]) for name in (
+        'material', 'weight_kg', 'transport_mode', 'transport_distance_km', 'manufacturing_intensity'
+    ))
+    inputs = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return f'{version}-f{factor_registry.get().version}-{inputs}-{request.accepted_renderer.format}'
+
+
+@functools.lru_cache(maxsize=None)
+def template_version(*names):
+    """Hash of template sources, read once per process (a deploy restarts workers)"""
+    digest = hashlib.sha1()
+    for name in names:
+        with open(get_template(name).origin.name, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def page_version(*templates):
+    """
+    Model, factor, template and static-manifest versions of a page rendered
+    from the given templates (it links hashed asset names); None without a model
+    """
+    version = model_version()
+    if version is None:
+        return None
+    return f'{version}-f{factor_registry.get().version}-{template_version(*templates)}-{static_version()}'
+
+
+def page_etag(*templates):
+    """ETag func for a page that renders model data into the given templates"""
+    def etag_func(request, *args, **kwargs):
+        return page_version(*templates)
+    return etag_func
+
+
+def fragment_timeout():
+    """{% cache %} timeout for page fragments (0 renders them uncached)"""
+    config = _page_config()
+    return config.get('TIMEOUT', 3600) if config.get('ENABLED', True) else 0
+
+
+# Response headers not replayed from the page cache
+UNCACHED_HEADERS = ('set-cookie', 'content-length')
+
+
+def cached_page(*templates):
+    """
+    Decorate a page view with a full-page cache keyed by page_version(*templates)
+
+    A hit is a single cache read; the view (and the service behind it) only
+    runs on a miss. The body is stored with the response's headers (minus
+    Set-Cookie), so a hit carries the same Content-Type, Vary and
+    Cache-Control as the miss. Non-200 responses are never stored.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = _page_config()
+            version = page_version(*templates) if request.method in ('GET', 'HEAD') else None
+            if version is None or not config.get('ENABLED', True):
+                return view(request, *args, **kwargs)
+            cache = caches[config.get('CACHE', 'default')]
+            key = f'predictor-page-response:{request.path}:{version}'
+            cached = cache.get(key)
+            if cached is not None:
+                content, headers = cached
+                return HttpResponse(content, headers=headers)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                headers = [(name, value) for name, value in response.items() if name.lower() not in UNCACHED_HEADERS]
+                cache.set(key, (response.content, headers), config.get('TIMEOUT', 3600))
+            return response
+        return wrapper
+    return decorator
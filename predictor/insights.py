@@ -0,0 +1,152 @@
+"""
+Model insights payload for /insights/ and /api/insights/
+
+build_insights() runs at training time and is stored in the model artifact
+under 'insights': feature importances, partial-dependence curves, the
+emission-factor tables and held-out residual distributions by material
+category. Everything is plain JSON data, so serving it is a dictionary
+lookup; artifacts trained before this existed get the same payload built
+once from the saved training data. The payload is deterministic (fixed
+seed, no timestamps), so every worker derives the same ETag from it.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.models import ManufacturingIntensity, MaterialFactor, TransportFactor
+
+
+TRAINING_DATA = os.path.join('predictor', 'training', 'training_data.csv')
+
+# Feature index -> artifact encoder key for the categorical features
+CATEGORICAL = {0: 'material_encoder', 2: 'transport_encoder', 4: 'intensity_encoder'}
+
+PD_SAMPLE_ROWS = 300
+PD_GRID_POINTS = 20
+RESIDUAL_BINS = 20
+
+
+def _round(values, digits=4):
+    return [round(float(v), digits) for v in values]
+
+
+def partial_dependence(model, X, artifacts, rng):
+    """
+    Mean prediction as each feature sweeps its grid with the others held at
+    sampled rows; every grid point of every feature goes through one predict call
+    """
+    sample = X[rng.choice(len(X), size=min(PD_SAMPLE_ROWS, len(X)), replace=False)]
+    grids = []
+    for i in range(X.shape[1]):
+        if i in CATEGORICAL:
+            grids.append(np.arange(len(artifacts[CATEGORICAL[i]].classes_), dtype=np.float64))
+        else:
+            grids.append(np.unique(np.quantile(X[:, i], np.linspace(0.05, 0.95, PD_GRID_POINTS))))
+
+    blocks = []
+    for i, grid in enumerate(grids):
+        block = np.repeat(sample[np.newaxis], len(grid), axis=0)
+        block[:, :, i] = grid[:, np.newaxis]
+        blocks.append(block.reshape(-1, X.shape[1]))
+    means = model.predict(np.concatenate(blocks)).reshape(-1, len(sample)).mean(axis=1)
+
+    curves, offset = [], 0
+    for i, grid in enumerate(grids):
+        y = means[offset:offset + len(grid)]
+        offset += len(grid)
+        if i in CATEGORICAL:
+            curves.append({'kind': 'categorical', 'x': [str(c) for c in artifacts[CATEGORICAL[i]].classes_],
+                           'y': _round(y)})
+        else:
+            curves.append({'kind': 'numeric', 'x': _round(grid), 'y': _round(y)})
+    return curves
+
+
+def residual_distributions(residuals, categories):
+    """Shared-bin histograms and percentiles of residuals per category"""
+    low, high = np.percentile(residuals, [1, 99]) if len(residuals) else (0.0, 0.0)
+    edges = np.linspace(low, high, RESIDUAL_BINS + 1) if high > low else np.array([low - 1, high + 1])
+    groups = []
+    for category in sorted(set(categories)):
+        values = residuals[categories == category]
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        groups.append({
+            'category': category,
+            'n': int(len(values)),
+            'mean': round(float(values.mean()), 4),
+            'p5': round(float(p5), 4), 'p50': round(float(p50), 4), 'p95': round(float(p95), 4),
+            'counts': np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)[0].tolist(),
+        })
+    return {'edges': _round(edges), 'categories': groups}
+
+
+def factor_tables():
+    return {
+        'materials': [
+            {'name': name, 'category': category, 'factor': factor, 'multiplier': multiplier}
+            for name, category, factor, multiplier in MaterialFactor.objects.order_by('-emission_factor_kg_co2_per_kg')
+            .values_list('name', 'category', 'emission_factor_kg_co2_per_kg', 'manufacturing_multiplier')
+        ],
+        'transport': [
+            {'mode': mode, 'factor': factor}
+            for mode, factor in TransportFactor.objects.order_by('kg_co2_per_kg_per_1000km')
+            .values_list('mode', 'kg_co2_per_kg_per_1000km')
+        ],
+        'intensities': [
+            {'level': level, 'base': base}
+            for level, base in ManufacturingIntensity.objects.order_by('base_kg_co2_per_kg')
+            .values_list('level', 'base_kg_co2_per_kg')
+        ],
+    }
+
+
+def build_insights(artifacts, X, y, n_samples, seed=42):
+    """
+    Insights payload for a trained model
+
+    Args:
+        artifacts: model artifact dict (model, encoders, feature_names, metrics)
+        X, y: held-out feature matrix (training column order) and targets
+        n_samples: size of the training dataset
+    """
+    model = artifacts['model']
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    factors = factor_tables()
+
+    category_of = {m['name']: m['category'] for m in factors['materials']}
+    materials = artifacts['material_encoder'].classes_[X[:, 0].astype(np.intp)]
+    categories = np.array([category_of.get(m, 'Other') for m in materials])
+
+    return {
+        'n_samples': int(n_samples),
+        'metrics': {k: round(float(v), 4) for k, v in artifacts['metrics'].items()},
+        'feature_importances': [
+            {'feature': name, 'importance': round(float(importance), 4)}
+            for name, importance in zip(artifacts['feature_names'], model.feature_importances_)
+        ],
+        'partial_dependence': dict(zip(artifacts['feature_names'], partial_dependence(model, X, artifacts, rng))),
+        'factors': factors,
+        'residuals': residual_distributions(y - model.predict(X), categories),
+    }
+
+
+def insights_from_training_data(artifacts, path=TRAINING_DATA, max_rows=2000):
+    """
+    Payload for artifacts trained without insights, from the saved training
+    data (residuals are in-sample, so retrain for held-out ones)
+    """
+    df = pd.read_csv(path)
+    n_samples = len(df)
+    df = df[df['material'].isin(artifacts['material_encoder'].classes_)]
+    df = df.sample(n=min(max_rows, len(df)), random_state=42)
+    X = np.column_stack([
+        artifacts['material_encoder'].transform(df['material']),
+        df['weight_kg'],
+        artifacts['transport_encoder'].transform(df['transport_mode']),
+        df['transport_distance_km'],
+        artifacts['intensity_encoder'].transform(df['manufacturing_intensity']),
+    ])
+    return build_insights(artifacts, X, df['total_co2_kg'].to_numpy(), n_samples)
@@ -0,0 +1,377 @@
+"""
+Live feed of recent predictions for /api/live/
+
+Each worker process keeps its newest PREDICTOR_LIVE['SIZE'] predictions in
+a fixed-size ring buffer. Publishing from the predict path is one short
+locked slot write plus waking a single dispatcher thread, whatever the
+number of subscribers: the dispatcher does the fan-out (waking every
+stream, forwarding to other workers) off the request thread, and each
+stream reads the ring from its own position, so a slow client only falls
+behind (and skips what the ring has overwritten) without holding anyone up.
+
+With SOCKET_DIR set, every worker binds a Unix datagram socket there; the
+dispatcher forwards the worker's own predictions to its peers and a
+receiver thread appends theirs to the local ring, so a stream on any
+worker sees the traffic of all of them. Sends never block: a peer that
+can't keep up loses entries.
+
+Event ids carry the worker's boot token and ring sequence number, so an
+EventSource reconnecting with Last-Event-ID to the same worker resumes
+where it left off.
+
+Under WSGI a stream is a generator holding a worker thread; under ASGI it
+is an async generator on the event loop (astream()), woken by the
+dispatcher through call_soon_threadsafe, so no thread is held while idle.
+"""
+import asyncio
+import atexit
+import glob
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+from .metrics import register_collector
+
+
+PEER_REFRESH_S = 1.0
+MAX_DATAGRAM = 8192
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_LIVE', {})
+
+
+class RingBuffer:
+    """Fixed number of slots addressed by an ever-increasing sequence number"""
+
+    def __init__(self, size):
+        self.size = size
+        self._slots = [None] * size
+        self._lock = threading.Lock()
+        self.next_seq = 0
+
+    def append(self, item):
+        """Store item, overwriting the oldest once full; returns its sequence number"""
+        with self._lock:
+            seq = self.next_seq
+            self._slots[seq % self.size] = item
+            self.next_seq = seq + 1
+        return seq
+
+    def since(self, seq):
+        """(seq, item) pairs after seq that are still in the ring, oldest first"""
+        with self._lock:
+            end = self.next_seq
+            start = max(seq + 1, end - self.size, 0)
+            return [(s, self._slots[s % self.size]) for s in range(start, end)]
+
+
+class LiveFeed:
+    """Per-process ring of encoded entries plus the dispatcher that fans them out"""
+
+    def __init__(self, size, socket_dir=None):
+        self.ring = RingBuffer(size)
+        self.boot = secrets.token_hex(4)
+        self.subscribers = 0
+        self._pending = threading.Event()
+        self._changed = threading.Condition()
+        # (loop, asyncio.Event) per async stream
+        self._async_waiters = set()
+        self._forwarded = -1
+        self._sender = None
+        self._socket_path = None
+        self._peers = []
+        self._peers_at = 0.0
+        if socket_dir:
+            self._open_socket(socket_dir)
+        threading.Thread(target=self._dispatch, name='predictor-live-dispatch', daemon=True).start()
+
+    # ====== PUBLISHING ======
+
+    def publish(self, entry):
+        """Append one prediction (a JSON-serializable dict) from this worker"""
+        self.ring.append((json.dumps(entry, separators=(',', ':')), True))
+        self._pending.set()
+
+    def _dispatch(self):
+        while True:
+            self._pending.wait()
+            self._pending.clear()
+            if self._sender is not None:
+                self._forward()
+            with self._changed:
+                self._changed.notify_all()
+                waiters = list(self._async_waiters)
+            for loop, changed in waiters:
+                try:
+                    loop.call_soon_threadsafe(changed.set)
+                except RuntimeError:
+                    pass  # the loop has been closed
+
+    def _forward(self):
+        entries = self.ring.since(self._forwarded)
+        if not entries:
+            return
+        self._forwarded = entries[-1][0]
+        peers = self._current_peers()
+        for _, (data, local) in entries:
+            if not local:
+                continue
+            payload = data.encode()
+            for peer in peers:
+                try:
+                    self._sender.sendto(payload, peer)
+                except BlockingIOError:
+                    pass  # the peer's receive buffer is full; it misses this one
+                except (ConnectionRefusedError, FileNotFoundError):
+                    self._drop_peer(peer)
+                except OSError:
+                    pass
+
+    # ====== PEERS ======
+
+    def _open_socket(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self._socket_dir = directory
+        self._socket_path = os.path.join(directory, f'live_{os.getpid()}_{self.boot}.sock')
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.bind(self._socket_path)
+        # Sends go through their own non-blocking socket; the bound one only receives
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        threading.Thread(target=self._receive, name='predictor-live-receive', daemon=True).start()
+
+    def _current_peers(self):
+        now = time.monotonic()
+        if now - self._peers_at > PEER_REFRESH_S:
+            self._peers = [
+                path for path in glob.glob(os.path.join(self._socket_dir, 'live_*.sock'))
+                if path != self._socket_path
+            ]
+            self._peers_at = now
+        return self._peers
+
+    def _drop_peer(self, peer):
+        """A socket file nobody is bound to belongs to a worker that has exited"""
+        try:
+            os.unlink(peer)
+        except OSError:
+            pass
+        if peer in self._peers:
+            self._peers.remove(peer)
+
+    def _receive(self):
+        while True:
+            try:
+                data = self._receiver.recv(MAX_DATAGRAM)
+            except OSError:
+                return
+            self.ring.append((data.decode(), False))
+            self._pending.set()
+
+    def close(self):
+        if self._socket_path is not None:
+            self._receiver.close()
+            self._sender.close()
+            try:
+                os.unlink(self._socket_path)
+            except OSError:
+                pass
+            self._socket_path = None
+
+    # ====== SUBSCRIBING ======
+
+    def wait(self, after, timeout):
+        """Block until an entry newer than sequence number after arrives; False on timeout"""
+        with self._changed:
+            if self.ring.next_seq - 1 > after:
+                return True
+            return self._changed.wait(timeout) or self.ring.next_seq - 1 > after
+
+    def start_position(self, last_event_id, backlog):
+        """Sequence number a new stream continues after"""
+        boot, _, seq = (last_event_id or '').partition('-')
+        if boot == self.boot and seq.isdigit():
+            return min(int(seq), self.ring.next_seq - 1)
+        return max(self.ring.next_seq - 1 - backlog, -1)
+
+    def stream(self, after, heartbeat=15, max_duration=300):
+        """
+        Server-sent events for every entry after sequence number after
+
+        Comment lines keep idle connections open; the stream ends after
+        max_duration seconds so long-lived clients reconnect (with
+        Last-Event-ID) instead of pinning a worker thread forever.
+        """
+        deadline = time.monotonic() + max_duration
+        yield 'retry: 2000\n\n'
+        while True:
+            entries = self.ring.since(after)
+            for seq, (data, _) in entries:
+                yield f'id: {self.boot}-{seq}\nevent: prediction\ndata: {data}\n\n'
+            if entries:
+                after = entries[-1][0]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            if not self.wait(after, min(heartbeat, remaining)):
+                yield ': keepalive\n\n'
+
+    async def astream(self, after, heartbeat=15, max_duration=300):
+        """stream() as an async generator, for ASGI"""
+        changed = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), changed)
+        with self._changed:
+            self._async_waiters.add(waiter)
+        try:
+            deadline = time.monotonic() + max_duration
+            yield 'retry: 2000\n\n'
+            while True:
+                # Cleared before reading, so a publish after since() still wakes us
+                changed.clear()
+                entries = self.ring.since(after)
+                for seq, (data, _) in entries:
+                    yield f'id: {self.boot}-{seq}\nevent: prediction\ndata: {data}\n\n'
+                if entries:
+                    after = entries[-1][0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if self.ring.next_seq - 1 > after:
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+        finally:
+            with self._changed:
+                self._async_waiters.discard(waiter)
+
+    def subscribe(self, after, heartbeat=15, max_duration=300, max_subscribers=None, asynchronous=False):
+        """
+        Reserve a subscriber slot for stream() (astream() when asynchronous);
+        None when max_subscribers streams are already open. The slot is
+        freed when the returned iterator is closed (Django closes a
+        response's content when the client goes away), even if it was
+        never iterated.
+        """
+        with self._changed:
+            if max_subscribers is not None and self.subscribers >= max_subscribers:
+                return None
+            self.subscribers += 1
+        if asynchronous:
+            return AsyncSubscription(self, self.astream(after, heartbeat, max_duration))
+        return Subscription(self, self.stream(after, heartbeat, max_duration))
+
+    def _unsubscribe(self):
+        with self._changed:
+            self.subscribers -= 1
+
+
+class Subscription:
+    """One open stream holding a subscriber slot until closed"""
+
+    def __init__(self, feed, events):
+        self.feed = feed
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            self.feed._unsubscribe()
+
+
+class AsyncSubscription(Subscription):
+    """Subscription over astream(); StreamingHttpResponse serves it asynchronously"""
+
+    # Not sync-iterable, so Django takes the async path
+    __iter__ = None
+
+    def __aiter__(self):
+        return self.events
+
+    def close(self):
+        # Called from a thread after the response; the generator's own
+        # finally (run by aclose() or the loop's finalizer) drops its waiter
+        if not self.closed:
+            self.closed = True
+            self.feed._unsubscribe()
+
+
+def live_entry(params, result, engine='model'):
+    """The public part of a prediction (no product name) for the feed"""
+    return {
+        'material': params['material'],
+        'weight_kg': params['weight_kg'],
+        'transport_mode': params['transport_mode'],
+        'transport_distance_km': params['transport_distance_km'],
+        'manufacturing_intensity': params.get('manufacturing_intensity', 'MEDIUM'),
+        'co2_kg': result['co2_kg'],
+        'engine': engine,
+        'at': round(time.time(), 3),
+    }
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """Process-wide feed configured from PREDICTOR_LIVE, or None when disabled"""
+    global _feed
+    config = _config()
+    if not config.get('ENABLED', True):
+        return None
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = LiveFeed(config.get('SIZE', 256), config.get('SOCKET_DIR'))
+    return _feed
+
+
+def publish(params, result, engine='model'):
+    """Add a successful prediction to this worker's feed"""
+    feed = get_feed()
+    if feed is not None:
+        feed.publish(live_entry(params, result, engine))
+
+
+def _reset_after_fork():
+    # The parent's threads and socket don't exist in a forked worker
+    global _feed
+    _feed = None
+
+
+def _close_feed():
+    if _feed is not None:
+        _feed.close()
+
+
+def _expose_gauges():
+    """Process-local feed gauges for /api/metrics/"""
+    if _feed is None:
+        return []
+    pid = os.getpid()
+    return [
+        '# HELP predictor_live_subscribers Open /api/live/ streams on this process',
+        '# TYPE predictor_live_subscribers gauge',
+        f'predictor_live_subscribers{{pid="{pid}"}} {_feed.subscribers}',
+        '# HELP predictor_live_entries_total Entries appended to this process\'s live feed',
+        '# TYPE predictor_live_entries_total counter',
+        f'predictor_live_entries_total{{pid="{pid}"}} {_feed.ring.next_seq}',
+    ]
+
+
+register_collector(_expose_gauges)
+atexit.register(_close_feed)
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,226 @@
+"""
+HTTP load generator for the predictor API
+
+Drives /api/predict/, /api/materials/ and /api/model-info/ either closed
+loop (a fixed number of virtual users sending back-to-back requests) or
+open loop (a target arrival rate; latency is measured from the scheduled
+send time so a stalled server is not hidden by coordinated omission).
+
+Each virtual user sends its own X-API-Key (api_key(index)). Only keys listed
+in PREDICTOR_THROTTLE['API_KEYS'] get their own throttle bucket, so against
+an external server they share the client IP's bucket unless it lists them.
+LocalServer lists them, and serves from a throwaway migrated database so the
+run's PredictionLog rows never reach the configured one.
+"""
+import http.client
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+from .services import BATCH_INPUT_COLUMNS
+
+
+TRAINING_DATA = os.path.join('predictor', 'training', 'training_data.csv')
+
+ENDPOINTS = {
+    'predict': ('POST', '/api/predict/'),
+    'materials': ('GET', '/api/materials/'),
+    'model-info': ('GET', '/api/model-info/'),
+}
+
+DEFAULT_MIX = {'predict': 8, 'materials': 1, 'model-info': 1}
+
+
+def api_key(index):
+    return f'loadtest-{index}'
+
+
+def parse_mix(text):
+    """'predict=8,materials=1' -> {'predict': 8.0, 'materials': 1.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name.strip()}' (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def load_payloads(n=5000, seed=42):
+    """Realistic predict bodies sampled from the training data"""
+    df = pd.read_csv(TRAINING_DATA, usecols=list(BATCH_INPUT_COLUMNS))
+    df = df.sample(n=min(n, len(df)), random_state=seed)
+    return [
+        json.dumps(dict(row, product_name=f"Load test {row['material']}")).encode()
+        for row in df.to_dict(orient='records')
+    ]
+
+
+class LatencyRecorder:
+    """Per-interval latency samples and status counts"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def record(self, endpoint, latency, status):
+        index = int((time.perf_counter() - self.started) / self.interval)
+        with self._lock:
+            bucket = self._buckets.setdefault(index, {'latencies': [], 'errors': 0, 'statuses': {}})
+            bucket['latencies'].append(latency)
+            bucket['statuses'][status] = bucket['statuses'].get(status, 0) + 1
+            if not 200 <= status < 400:
+                bucket['errors'] += 1
+
+    def intervals(self):
+        with self._lock:
+            return [(index * self.interval, self._buckets[index]) for index in sorted(self._buckets)]
+
+
+def summarize(latencies, errors, duration):
+    """Throughput, error rate and latency percentiles (ms) for a set of samples"""
+    if not latencies:
+        return {'requests': 0, 'throughput': 0.0, 'error_rate': 0.0,
+                'p50': None, 'p95': None, 'p99': None, 'p999': None}
+    p50, p95, p99, p999 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99, 99.9])
+    return {
+        'requests': len(latencies),
+        'throughput': len(latencies) / duration,
+        'error_rate': errors / len(latencies),
+        'p50': p50, 'p95': p95, 'p99': p99, 'p999': p999,
+    }
+
+
+class LoadGenerator:
+    """Closed-loop (rate=None) or open-loop (rate req/s) HTTP load"""
+
+    def __init__(self, base_url, concurrency=16, rate=None, mix=None, payloads=None, seed=42):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.concurrency = concurrency
+        self.rate = rate
+        mix = mix or DEFAULT_MIX
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.payloads = payloads or load_payloads()
+        self.seed = seed
+
+    def run(self, duration, recorder):
+        stop = time.perf_counter() + duration
+        schedule = queue.Queue() if self.rate else None
+        workers = [
+            threading.Thread(target=self._worker, args=(i, stop, schedule, recorder), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        if schedule is not None:
+            self._schedule(stop, schedule)
+        for worker in workers:
+            worker.join()
+
+    def _schedule(self, stop, schedule):
+        """Emit send times at the target rate (exponential inter-arrivals)"""
+        rng = random.Random(self.seed)
+        next_send = time.perf_counter()
+        while next_send < stop:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            schedule.put(next_send)
+            next_send += rng.expovariate(self.rate)
+        for _ in range(self.concurrency):
+            schedule.put(None)
+
+    def _worker(self, index, stop, schedule, recorder):
+        rng = random.Random(self.seed + index)
+        # Its own throttle bucket only if the server lists the key (LocalServer does)
+        headers = {'Content-Type': 'application/json', 'X-API-Key': api_key(index)}
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        while True:
+            if schedule is None:
+                if time.perf_counter() >= stop:
+                    break
+                started = time.perf_counter()
+            else:
+                started = schedule.get()
+                if started is None:
+                    break
+
+            endpoint = rng.choices(self.endpoints, self.weights)[0]
+            method, path = ENDPOINTS[endpoint]
+            body = rng.choice(self.payloads) if method == 'POST' else None
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 599
+                connection.close()
+                connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            recorder.record(endpoint, time.perf_counter() - started, status)
+        connection.close()
+
+
+@contextmanager
+def throwaway_database():
+    """Point the default connection at a freshly migrated test database for the block"""
+    from django.db import connection
+    from django.test.utils import setup_databases, teardown_databases
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'loadtest.sqlite3')
+        databases = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+        try:
+            yield
+        finally:
+            teardown_databases(databases, verbosity=0)
+
+
+class LocalServer:
+    """Run the project's WSGI app on an ephemeral port in a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, concurrency=0):
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadedWSGIServer((host, port), QuietHandler, allow_reuse_address=True)
+        self.server.set_app(get_internal_wsgi_application())
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.api_keys = tuple(api_key(i) for i in range(concurrency))
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        from django.conf import settings
+        from django.test.utils import override_settings
+
+        self._stack.enter_context(throwaway_database())
+        throttle = getattr(settings, 'PREDICTOR_THROTTLE', {})
+        self._stack.enter_context(override_settings(PREDICTOR_THROTTLE={
+            **throttle, 'API_KEYS': (*throttle.get('API_KEYS', ()), *self.api_keys),
+        }))
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self._stack.close()
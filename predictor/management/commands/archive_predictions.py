@@ -0,0 +1,29 @@
+"""
+Move old PredictionLog rows into compressed daily archive files
+
+Usage (e.g. nightly from cron):
+    python manage.py archive_predictions
+    python manage.py archive_predictions --max-age-days 90 --batch-size 20000
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictor.retention import archive_directory, archive_predictions
+
+
+class Command(BaseCommand):
+    help = "Archive and delete PredictionLog rows older than PREDICTOR_RETENTION['MAX_AGE_DAYS']"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, help='Override the configured retention age')
+        parser.add_argument('--batch-size', type=int, help='Rows archived and deleted per batch')
+        parser.add_argument('--directory', help='Override the configured archive directory')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        archived = archive_predictions(options['max_age_days'], options['batch_size'], options['directory'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived:,} prediction(s) to {options['directory'] or archive_directory()} "
+            f"in {time.perf_counter() - started:.2f}s"
+        ))
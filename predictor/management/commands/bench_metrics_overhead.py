@@ -0,0 +1,47 @@
+"""
+Measure the per-request cost of the /api/predict/ instrumentation
+
+Usage:
+    python manage.py bench_metrics_overhead --iterations 200000
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictor.metrics import ADMISSION, ENGINE, STAGE_SECONDS, record_response
+
+
+def instrumented_request():
+    """Every metrics call a successful /api/predict/ request makes"""
+    t0 = time.perf_counter()
+    STAGE_SECONDS.observe('validate', time.perf_counter() - t0)
+    ADMISSION.inc('admit')
+    t1 = time.perf_counter()
+    t2 = time.perf_counter()
+    t3 = time.perf_counter()
+    t4 = time.perf_counter()
+    STAGE_SECONDS.observe('encode', t1 - t0)
+    STAGE_SECONDS.observe('breakdown', t2 - t1)
+    STAGE_SECONDS.observe('model', t3 - t2)
+    STAGE_SECONDS.observe('postprocess', t4 - t3)
+    ENGINE.inc('model')
+    t0 = time.perf_counter()
+    STAGE_SECONDS.observe('log_write', time.perf_counter() - t0)
+    STAGE_SECONDS.observe('total', time.perf_counter() - t0)
+    record_response('predict', 200)
+
+
+class Command(BaseCommand):
+    help = 'Measure instrumentation overhead per request in microseconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        n = options['iterations']
+        started = time.perf_counter()
+        for _ in range(n):
+            instrumented_request()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Instrumentation overhead: {elapsed / n * 1e6:.2f} us/request ({n} iterations)")
@@ -0,0 +1,116 @@
+"""
+Compare the single forest with category-routed shards on the same data
+
+Both models are trained on the saved training data with train_model's
+train/test split; the report gives held-out R²/RMSE/MAE overall and per
+material group, then the latency of a single-row service.predict() and of
+predict_batch() at --batch-rows, with the model predicted on each path.
+
+Usage:
+    python manage.py bench_sharding
+    python manage.py bench_sharding --grouping kind --batch-rows 10000 --output sharding.json
+"""
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from predictor.services import BATCH_INPUT_COLUMNS, CarbonFootprintService
+from predictor.sharding import GROUPINGS, material_groups
+from predictor.training import train_model
+
+
+TRAINING_DATA = os.path.join('predictor', 'training', 'training_data.csv')
+
+
+def accuracy(y, predicted):
+    return {
+        'r2': float(r2_score(y, predicted)),
+        'rmse': float(np.sqrt(mean_squared_error(y, predicted))),
+        'mae': float(mean_absolute_error(y, predicted)),
+    }
+
+
+def median_seconds(fn, calls):
+    fn()  # warm-up
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+class Command(BaseCommand):
+    help = 'Accuracy and latency of the single forest vs. category-routed shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grouping', choices=GROUPINGS, default='category')
+        parser.add_argument('--single-calls', type=int, default=200, help='Timed single-row predictions')
+        parser.add_argument('--batch-rows', type=int, default=1000)
+        parser.add_argument('--batch-calls', type=int, default=20, help='Timed batch predictions')
+        parser.add_argument('--output', help='Write the report as JSON')
+
+    def handle(self, *args, **options):
+        df = pd.read_csv(TRAINING_DATA)
+        # Same rows train_model holds out
+        _, test_index = train_test_split(df.index, test_size=0.2, random_state=42)
+        test = df.loc[test_index]
+        rng = np.random.default_rng(42)
+        batch = test.iloc[rng.integers(0, len(test), options['batch_rows'])]
+        batch_columns = {name: batch[name].to_numpy() for name in BATCH_INPUT_COLUMNS}
+        rows = test[list(BATCH_INPUT_COLUMNS)].to_dict('records')
+
+        report = {'grouping': options['grouping'], 'test_rows': len(test), 'models': {}}
+        for label, grouping in (('single', None), ('sharded', options['grouping'])):
+            with contextlib.redirect_stdout(io.StringIO()):
+                artifacts, _ = train_model.train_model(df.copy(), grouping)
+            service = CarbonFootprintService.use_artifacts(artifacts)
+            predicted = service.predict_batch({name: test[name].to_numpy() for name in BATCH_INPUT_COLUMNS})['co2_kg']
+            y = test['total_co2_kg'].to_numpy()
+            groups = np.array(material_groups(test['material'], options['grouping']))
+
+            picks = iter(rows[i % len(rows)] for i in range(options['single_calls'] + 1))
+            report['models'][label] = {
+                'trees': sum(len(m.estimators_) for m in getattr(artifacts['model'], 'models', [artifacts['model']])),
+                'accuracy': accuracy(y, predicted),
+                'by_group': {
+                    group: dict(accuracy(y[groups == group], predicted[groups == group]), n=int((groups == group).sum()))
+                    for group in sorted(set(groups))
+                },
+                'single_row_s': median_seconds(lambda: service.predict(**next(picks)), options['single_calls']),
+                'batch_s': median_seconds(lambda: service.predict_batch(batch_columns), options['batch_calls']),
+            }
+
+        self.print_report(report, options['batch_rows'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+
+    def print_report(self, report, batch_rows):
+        single, sharded = report['models']['single'], report['models']['sharded']
+        self.stdout.write(f"Held-out rows: {report['test_rows']}, shards by {report['grouping']}\n")
+        self.stdout.write(f"{'':<22}{'single':>12}{'sharded':>12}")
+        for name, key, fmt in (
+            ('Trees', 'trees', '{:>12d}'),
+            ('single-row p50 (ms)', 'single_row_s', '{:>12.3f}'),
+            (f'batch[{batch_rows}] p50 (ms)', 'batch_s', '{:>12.3f}'),
+        ):
+            scale = 1000 if key.endswith('_s') else 1
+            self.stdout.write(f'{name:<22}' + ''.join(
+                fmt.format(model[key] * scale) for model in (single, sharded)))
+        for metric in ('r2', 'rmse', 'mae'):
+            self.stdout.write(f'{metric.upper():<22}{single["accuracy"][metric]:>12.4f}{sharded["accuracy"][metric]:>12.4f}')
+
+        self.stdout.write(f"\n{'R² by group':<22}{'n':>6}{'single':>12}{'sharded':>12}")
+        for group, scores in single['by_group'].items():
+            self.stdout.write(f"{group:<22}{scores['n']:>6}{scores['r2']:>12.4f}{sharded['by_group'][group]['r2']:>12.4f}")
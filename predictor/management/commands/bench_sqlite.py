@@ -0,0 +1,115 @@
+"""
+Concurrent PredictionLog insert/read throughput on SQLite, stock vs tuned backend
+
+Each mode gets a fresh database file in a temporary directory. The stock
+mode uses Django's sqlite3 backend (rollback journal) and closes the
+connection after every operation, as a request does with CONN_MAX_AGE=0;
+the tuned mode uses predictor.sqlite_backend and keeps one connection per
+thread.
+
+Usage:
+    python manage.py bench_sqlite --writers 8 --readers 8 --duration 10
+"""
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from core.models import PredictionLog
+from predictor.loadtest import summarize
+
+
+MODES = {
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0},
+    'tuned': {'ENGINE': 'predictor.sqlite_backend', 'CONN_MAX_AGE': None},
+}
+
+MATERIALS = ['Cotton', 'Polyester', 'Steel', 'Aluminum', 'Plastic']
+MODES_OF_TRANSPORT = ['SEA', 'AIR', 'ROAD', 'RAIL']
+
+
+def register_database(alias, mode, path):
+    """Add a database alias at runtime and create the PredictionLog table in it"""
+    database = dict(MODES[mode], NAME=str(path))
+    configured = connections.configure_settings({'default': connections.settings['default'], alias: database})
+    connections.settings[alias] = configured[alias]
+    with connections[alias].schema_editor() as editor:
+        editor.create_model(PredictionLog)
+
+
+def write_one(alias, rng):
+    PredictionLog.objects.using(alias).create(
+        product_name='bench', material=rng.choice(MATERIALS), weight_kg=rng.uniform(0.1, 50),
+        transport_mode=rng.choice(MODES_OF_TRANSPORT), transport_distance_km=rng.uniform(10, 10000),
+        predicted_co2_kg=rng.uniform(0.1, 500), material_co2=1.0, manufacturing_co2=1.0,
+        transport_co2=1.0, trees_to_offset=0.1,
+    )
+
+
+def read_one(alias, rng):
+    list(PredictionLog.objects.using(alias).filter(material=rng.choice(MATERIALS)).order_by('-id')[:20])
+
+
+def run_mode(alias, mode, writers, readers, duration):
+    persistent = MODES[mode]['CONN_MAX_AGE'] != 0
+    results = {'write': ([], [0]), 'read': ([], [0])}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(kind, seed):
+        operation = write_one if kind == 'write' else read_one
+        rng = random.Random(seed)
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                operation(alias, rng)
+            except OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - t0)
+            if not persistent:
+                connections[alias].close()
+        connections[alias].close()
+        with lock:
+            results[kind][0].extend(latencies)
+            results[kind][1][0] += errors
+
+    threads = [threading.Thread(target=worker, args=('write', i)) for i in range(writers)]
+    threads += [threading.Thread(target=worker, args=('read', writers + i)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {kind: summarize(latencies, errors[0], duration) for kind, (latencies, errors) in results.items()}
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent insert/read throughput of the stock and tuned SQLite backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10.0)
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['stock', 'tuned'])
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in options['modes']:
+                alias = f'bench_{mode}'
+                register_database(alias, mode, Path(directory) / f'{mode}.sqlite3')
+                try:
+                    summary = run_mode(alias, mode, options['writers'], options['readers'], options['duration'])
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+                for kind in ('write', 'read'):
+                    s = summary[kind]
+                    p99 = f"{s['p99']:.1f} ms" if s['p99'] is not None else '-'
+                    self.stdout.write(
+                        f"{mode:<6} {kind:<5} {s['throughput']:>9.0f} ops/s  "
+                        f"errors {s['error_rate']:6.2%}  p50 {s['p50'] or 0:7.1f} ms  p99 {p99}"
+                    )
@@ -0,0 +1,110 @@
+"""
+Benchmark parse + predict + serialize time for each bulk wire format
+
+Usage:
+    python manage.py bench_wire_formats --rows 100000 --repeat 3
+"""
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+
+from predictor.columnar import (
+    ColumnarJSONRenderer, NpyParser, NpyRenderer, NpzParser, NpzRenderer,
+    MsgpackParser, MsgpackRenderer, columns_from_data, msgpack,
+)
+from predictor.services import BATCH_INPUT_COLUMNS, CarbonFootprintService
+
+
+TRAINING_DATA = os.path.join('predictor', 'training', 'training_data.csv')
+
+
+def sample_columns(rows, seed=42):
+    """Sample input rows from the training data as parallel columns"""
+    df = pd.read_csv(TRAINING_DATA, usecols=list(BATCH_INPUT_COLUMNS))
+    df = df.sample(n=rows, replace=True, random_state=seed)
+    return {name: df[name].to_numpy() for name in BATCH_INPUT_COLUMNS}
+
+
+def encode_request(fmt, columns):
+    """Build the request body a client would send (not timed)"""
+    if fmt == 'json-rows':
+        rows = [dict(zip(columns, values)) for values in zip(*[c.tolist() for c in columns.values()])]
+        return json.dumps(rows).encode()
+    if fmt == 'json-columns':
+        return json.dumps({'columns': {k: v.tolist() for k, v in columns.items()}}).encode()
+    if fmt == 'msgpack':
+        payload = {'columns': {k: ({'dtype': v.dtype.str, 'data': v.tobytes()} if v.dtype.kind == 'f' else v.tolist())
+                               for k, v in columns.items()}}
+        return msgpack.packb(payload, use_bin_type=True)
+    buf = io.BytesIO()
+    if fmt == 'npz':
+        np.savez(buf, **{k: v.astype(str) if v.dtype == object else v for k, v in columns.items()})
+    else:
+        out = np.empty(len(columns['weight_kg']),
+                       dtype=[(k, 'U16' if v.dtype == object else v.dtype) for k, v in columns.items()])
+        for k, v in columns.items():
+            out[k] = v
+        np.save(buf, out)
+    return buf.getvalue()
+
+
+def run_format(fmt, body, service):
+    """Time one request: parse, predict, serialize"""
+    t0 = time.perf_counter()
+    if fmt == 'json-rows':
+        rows = JSONParser().parse(io.BytesIO(body))
+        columns = {name: np.array([row[name] for row in rows]) for name in BATCH_INPUT_COLUMNS}
+    else:
+        parser = {'json-columns': JSONParser, 'msgpack': MsgpackParser,
+                  'npz': NpzParser, 'npy': NpyParser}[fmt]()
+        columns = columns_from_data(parser.parse(io.BytesIO(body)))
+    t1 = time.perf_counter()
+
+    result = service.predict_batch(columns)
+    t2 = time.perf_counter()
+
+    if fmt == 'json-rows':
+        names = list(result)
+        items = [dict(zip(names, values)) for values in zip(*[result[k].tolist() for k in names])]
+        out = json.dumps(items).encode()
+    else:
+        renderer = {'json-columns': ColumnarJSONRenderer, 'msgpack': MsgpackRenderer,
+                    'npz': NpzRenderer, 'npy': NpyRenderer}[fmt]()
+        out = renderer.render({'success': True, 'count': len(result['co2_kg']), 'columns': result})
+    t3 = time.perf_counter()
+
+    return t1 - t0, t2 - t1, t3 - t2, len(out)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk prediction wire formats (parse + predict + serialize)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        service = CarbonFootprintService()
+        columns = sample_columns(options['rows'])
+
+        formats = ['json-rows', 'json-columns', 'npz', 'npy']
+        if msgpack is not None:
+            formats.insert(2, 'msgpack')
+
+        self.stdout.write(f"{options['rows']} rows, best of {options['repeat']}\n")
+        self.stdout.write(f"{'format':<14}{'req bytes':>12}{'parse ms':>10}{'predict ms':>12}"
+                          f"{'serialize ms':>14}{'resp bytes':>12}{'total ms':>10}")
+        for fmt in formats:
+            body = encode_request(fmt, columns)
+            timings = [run_format(fmt, body, service) for _ in range(options['repeat'])]
+            parse, predict, serialize, size = min(timings, key=lambda t: t[0] + t[1] + t[2])
+            self.stdout.write(
+                f"{fmt:<14}{len(body):>12}{parse * 1000:>10.1f}{predict * 1000:>12.1f}"
+                f"{serialize * 1000:>14.1f}{size:>12}{(parse + predict + serialize) * 1000:>10.1f}"
+            )
@@ -0,0 +1,101 @@
+"""
+Predictor microbenchmarks with JSON baselines and regression gating
+
+Usage:
+    python manage.py benchmark run --save benchmarks/baseline.json
+    python manage.py benchmark run --filter predict_batch --save current.json
+    python manage.py benchmark compare benchmarks/baseline.json current.json --threshold 10
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from predictor.benchmarks import (
+    compare_results, environment, load_results, measure, registered_benchmarks, save_results,
+)
+from predictor.benchmarks.suite import build_context, cleanup_context
+
+
+class Command(BaseCommand):
+    help = 'Run predictor microbenchmarks or compare two result files'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        run = subparsers.add_parser('run', help='Run the benchmark suite')
+        run.add_argument('--save', help='Write results as JSON to this path')
+        run.add_argument('--filter', default='', help='Only run benchmarks whose name contains this text')
+        run.add_argument('--rounds', type=int, default=7)
+        run.add_argument('--min-round-time', type=float, default=0.05, help='Seconds per timing round')
+
+        compare = subparsers.add_parser('compare', help='Flag regressions between two result files')
+        compare.add_argument('baseline')
+        compare.add_argument('current')
+        compare.add_argument('--threshold', type=float, default=10.0,
+                             help='Allowed slowdown of the median, in percent')
+
+    def handle(self, *args, **options):
+        if options['action'] == 'run':
+            self.run(options)
+        else:
+            self.compare(options)
+
+    def run(self, options):
+        context = build_context()
+        self.stdout.write(f"Model: {context['model_source']}\n")
+        self.stdout.write(f"{'benchmark':<32}{'median':>12}{'min':>12}{'ops/s':>14}{'rows/s':>14}")
+
+        results = {}
+        try:
+            # Throttling would skew view timings once the bucket drains
+            with override_settings(PREDICTOR_THROTTLE={'ENABLED': False}):
+                for name, rows, setup in registered_benchmarks():
+                    if options['filter'] not in name:
+                        continue
+                    result = measure(setup(context), options['rounds'], options['min_round_time'])
+                    result['rows'] = rows
+                    result['ops_per_s'] = 1 / result['median_s']
+                    results[name] = result
+                    self.stdout.write(
+                        f"{name:<32}{_format_time(result['median_s']):>12}{_format_time(result['min_s']):>12}"
+                        f"{result['ops_per_s']:>14,.1f}{result['ops_per_s'] * rows:>14,.0f}"
+                    )
+        finally:
+            cleanup_context(context)
+
+        if options['save']:
+            save_results(options['save'], results, dict(environment(), model=context['model_source']))
+            self.stdout.write(f"\nSaved {len(results)} results to {options['save']}")
+
+    def compare(self, options):
+        baseline = load_results(options['baseline'])
+        current = load_results(options['current'])
+        rows = compare_results(baseline, current, options['threshold'] / 100)
+
+        if baseline['meta'].get('platform') != current['meta'].get('platform'):
+            self.stdout.write(self.style.WARNING('Results come from different platforms; ratios may mislead\n'))
+
+        self.stdout.write(f"{'benchmark':<32}{'baseline':>12}{'current':>12}{'ratio':>8}  status")
+        for name, before, after, ratio, status in rows:
+            line = (f"{name:<32}{_format_time(before):>12}{_format_time(after):>12}"
+                    f"{'' if ratio is None else f'{ratio:.2f}x':>8}  {status}")
+            if status == 'regression':
+                line = self.style.ERROR(line)
+            elif status == 'improvement':
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
+
+        regressions = [row[0] for row in rows if row[4] == 'regression']
+        if regressions:
+            raise CommandError(f"{len(regressions)} benchmark(s) regressed by more than "
+                               f"{options['threshold']:g}%: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS('\nNo regressions'))
+
+
+def _format_time(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.1f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds:.2f} s'
@@ -0,0 +1,60 @@
+"""
+Build the production static assets into STATIC_ROOT
+
+Videos from STATICFILES_DIRS are rewritten into PREDICTOR_STATIC['BUILD_DIR']
+with their index moved to the front (--transcode re-encodes them with
+ffmpeg at VIDEO_MAX_HEIGHT / VIDEO_CRF instead, when that is smaller), then
+collectstatic stores everything under hashed names with .gz/.br siblings.
+Requires PREDICTOR_STATIC['ENABLED'].
+
+Usage:
+    python manage.py build_assets
+    python manage.py build_assets --transcode
+"""
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.staticfiles import faststart, transcode
+
+
+class Command(BaseCommand):
+    help = 'Fingerprint, precompress and collect static assets (optionally transcoding videos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transcode', action='store_true', help='Re-encode videos with ffmpeg')
+
+    def handle(self, *args, **options):
+        if not isinstance(staticfiles_storage, ManifestFilesMixin):
+            raise CommandError("Static files storage isn't a manifest storage; set PREDICTOR_STATIC['ENABLED']")
+        config = settings.PREDICTOR_STATIC
+        build_dir = Path(config['BUILD_DIR'])
+        for source_dir in map(Path, settings.STATICFILES_DIRS):
+            if source_dir.resolve() == build_dir.resolve():
+                continue
+            for source in sorted(source_dir.rglob('*.mp4')):
+                target = build_dir / source.relative_to(source_dir)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    self.build_video(source, target, options['transcode'], config)
+                except (OSError, ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+                    raise CommandError(f"{source}: {e}")
+                self.stdout.write(f"{source.relative_to(source_dir)}: "
+                                  f"{source.stat().st_size / 1e6:.2f} MB -> {target.stat().st_size / 1e6:.2f} MB")
+        call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        self.stdout.write(self.style.SUCCESS(f"Static assets built in {settings.STATIC_ROOT}"))
+
+    def build_video(self, source, target, transcode_video, config):
+        data = faststart(source.read_bytes())
+        target.write_bytes(data)
+        if transcode_video:
+            lighter = target.with_suffix('.transcoded.mp4')
+            transcode(source, lighter, config.get('VIDEO_MAX_HEIGHT', 720), config.get('VIDEO_CRF', 30))
+            if lighter.stat().st_size < len(data):
+                lighter.replace(target)
+            else:
+                lighter.unlink()
@@ -0,0 +1,41 @@
+"""
+Embed the insights payload in a model artifact trained without one
+
+Artifacts from before insights were stored at training time otherwise get
+the payload built from the saved training data on the first /insights/
+request of every worker. Running this once after deploying such a model
+moves that work (and the training-data dependency) out of the request path.
+
+Usage:
+    python manage.py build_insights
+    python manage.py build_insights --model path/to/model.joblib --force
+"""
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.insights import TRAINING_DATA, insights_from_training_data
+from predictor.services import MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = 'Precompute the /insights/ payload and store it in the model artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=MODEL_PATH, help='Model artifact to update')
+        parser.add_argument('--training-data', default=TRAINING_DATA)
+        parser.add_argument('--force', action='store_true', help='Rebuild insights the artifact already has')
+
+    def handle(self, *args, **options):
+        try:
+            artifacts = joblib.load(options['model'])
+        except OSError as e:
+            raise CommandError(str(e))
+        if artifacts.get('insights') and not options['force']:
+            self.stdout.write(f"{options['model']} already has insights (use --force to rebuild)")
+            return
+        try:
+            artifacts['insights'] = insights_from_training_data(artifacts, options['training_data'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Could not build insights: {e}')
+        joblib.dump(artifacts, options['model'])
+        self.stdout.write(self.style.SUCCESS(f"Insights stored in {options['model']}; restart workers to serve them"))
@@ -0,0 +1,30 @@
+"""
+Fold new PredictionLog rows into the hourly and daily rollups
+
+Run periodically (e.g. every few minutes from cron):
+    python manage.py compact_rollups
+    python manage.py compact_rollups --rebuild   # drop and recompute everything
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictor.analytics import DEFAULT_BATCH_SIZE, compact_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Aggregate PredictionLog rows past the checkpoint into HourlyRollup and DailyRollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Log rows folded per transaction')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Delete all rollups and recompute them from the full log')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        compact = rebuild_rollups if options['rebuild'] else compact_rollups
+        compacted = compact(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {compacted:,} prediction(s) in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,48 @@
+"""
+Export PredictionLog history to a file (or stdout) without loading it into memory
+
+Usage:
+    python manage.py export_predictions --format csv --output predictions.csv
+    python manage.py export_predictions --format ndjson --start 2026-01-01 --end 2026-03-31 --gzip -o q1.ndjson.gz
+    python manage.py export_predictions --format parquet --material Cotton -o cotton.parquet
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.export import DEFAULT_CHUNK_SIZE, ENCODERS, MAX_CHUNK_SIZE, build_filters, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream PredictionLog rows as CSV, NDJSON or Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(ENCODERS), default='csv')
+        parser.add_argument('--output', '-o', help='Destination file (default: stdout)')
+        parser.add_argument('--start', help='Earliest created_at (YYYY-MM-DD or ISO datetime)')
+        parser.add_argument('--end', help='Latest created_at; a bare date includes the whole day')
+        parser.add_argument('--material', help='Only export this material')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'Rows per database page (at most {MAX_CHUNK_SIZE:,})')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output on the fly')
+        parser.add_argument('--include-archive', action='store_true',
+                            help='Also read rows moved to the archive by archive_predictions')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] > MAX_CHUNK_SIZE:
+            self.stderr.write(f"--chunk-size capped at {MAX_CHUNK_SIZE:,}")
+        try:
+            filters = build_filters(options['start'], options['end'], options['material'])
+            chunks = stream_export(options['format'], filters, options['chunk_size'], options['gzip'],
+                                   options['include_archive'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                written = sum(f.write(chunk) for chunk in chunks)
+            self.stderr.write(f"Wrote {written:,} bytes to {options['output']}")
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,31 @@
+"""
+Bulk upsert emission factors from CSV
+
+Usage:
+    python manage.py import_factors materials factors.csv
+    python manage.py import_factors transport transport.csv
+
+Material CSVs have a name column plus any of category,
+emission_factor_kg_co2_per_kg, manufacturing_multiplier,
+manufacturing_intensity and biodegradable; transport CSVs have
+mode,kg_co2_per_kg_per_1000km; intensity CSVs have level,base_kg_co2_per_kg.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.factors import IMPORT_KINDS, import_factors
+
+
+class Command(BaseCommand):
+    help = 'Insert or update emission factors from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORT_KINDS))
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as f:
+                count = import_factors(options['kind'], f)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Imported {count} {options['kind']} row(s)"))
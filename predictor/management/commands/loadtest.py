@@ -0,0 +1,74 @@
+"""
+Load test the HTTP API against an in-process server (or an external URL)
+
+Usage:
+    python manage.py loadtest --concurrency 32 --duration 30
+    python manage.py loadtest --rate 200 --duration 60 --mix predict=9,materials=1
+    python manage.py loadtest --url http://127.0.0.1:8000 --output results.json
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predictor.loadtest import LatencyRecorder, LoadGenerator, LocalServer, parse_mix, summarize
+
+
+class Command(BaseCommand):
+    help = 'Drive the predictor API at a target concurrency or arrival rate and report latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Target an already running server instead of an in-process one')
+        parser.add_argument('--concurrency', type=int, default=16, help='Virtual users / worker threads')
+        parser.add_argument('--rate', type=float, help='Open-loop arrival rate in req/s (default: closed loop)')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+        parser.add_argument('--interval', type=float, default=1.0, help='Reporting interval in seconds')
+        parser.add_argument('--mix', default='predict=8,materials=1,model-info=1',
+                            help='Endpoint weights, e.g. predict=8,materials=1,model-info=1')
+        parser.add_argument('--output', help='Write the per-interval and total report as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['url']:
+            self.run_load(options['url'], mix, options)
+        else:
+            with LocalServer(concurrency=options['concurrency']) as server:
+                self.stdout.write(f'In-process server at {server.url}')
+                self.run_load(server.url, mix, options)
+
+    def run_load(self, url, mix, options):
+        mode = f"open loop at {options['rate']:g} req/s" if options['rate'] else 'closed loop'
+        self.stdout.write(f"{mode}, {options['concurrency']} workers, {options['duration']:g}s, mix {mix}\n")
+
+        recorder = LatencyRecorder(options['interval'])
+        generator = LoadGenerator(url, options['concurrency'], options['rate'], mix)
+        generator.run(options['duration'], recorder)
+
+        self.stdout.write(f"{'t(s)':>6}{'req/s':>10}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'p999':>9}  (ms)")
+        report = {'intervals': [], 'total': None}
+        all_latencies, all_errors = [], 0
+        for start, bucket in recorder.intervals():
+            stats = summarize(bucket['latencies'], bucket['errors'], options['interval'])
+            stats.update(t=start, statuses=bucket['statuses'])
+            report['intervals'].append(stats)
+            all_latencies.extend(bucket['latencies'])
+            all_errors += bucket['errors']
+            self.stdout.write(self._row(f"{start:>6.0f}", stats))
+
+        total = summarize(all_latencies, all_errors, options['duration'])
+        report['total'] = total
+        self.stdout.write(self._row(f"{'total':>6}", total))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, default=float)
+            self.stdout.write(f"\nReport written to {options['output']}")
+
+    def _row(self, label, stats):
+        if not stats['requests']:
+            return f"{label}{0:>10.1f}"
+        return (f"{label}{stats['throughput']:>10.1f}{stats['error_rate'] * 100:>8.2f}"
+                f"{stats['p50']:>9.1f}{stats['p95']:>9.1f}{stats['p99']:>9.1f}{stats['p999']:>9.1f}")
@@ -0,0 +1,70 @@
+"""
+Load test single-row predictions with and without micro-batching
+
+Usage:
+    python manage.py loadtest_microbatch --threads 32 --seconds 5 --window-ms 2 --max-batch-size 64
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from predictor.management.commands.bench_wire_formats import sample_columns
+from predictor.services import BATCH_INPUT_COLUMNS, CarbonFootprintService
+
+
+def run_load(service, rows, threads, seconds):
+    """Hammer service.predict from many threads; return (requests, latencies)"""
+    stop = time.perf_counter() + seconds
+    latencies = [[] for _ in range(threads)]
+
+    def worker(index):
+        i = index
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            service.predict(*rows[i % len(rows)])
+            latencies[index].append(time.perf_counter() - started)
+            i += threads
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    merged = sorted(l for per_thread in latencies for l in per_thread)
+    return len(merged), merged
+
+
+class Command(BaseCommand):
+    help = 'Compare single-prediction throughput with micro-batching off and on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--window-ms', type=float, default=2.0)
+        parser.add_argument('--max-batch-size', type=int, default=64)
+
+    def handle(self, *args, **options):
+        service = CarbonFootprintService()
+        columns = sample_columns(1000)
+        rows = list(zip(*[columns[name].tolist() for name in BATCH_INPUT_COLUMNS]))
+
+        results = {}
+        for mode in ('direct', 'micro-batched'):
+            if mode == 'micro-batched':
+                service.configure_batching(options['window_ms'], options['max_batch_size'])
+            count, latencies = run_load(service, rows, options['threads'], options['seconds'])
+            results[mode] = count / options['seconds']
+            self.stdout.write(
+                f"{mode:<14} {results[mode]:>9.1f} req/s   "
+                f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms   "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms"
+            )
+
+        self.stdout.write(f"\nThroughput gain: {results['micro-batched'] / results['direct']:.1f}x")
+
+        stats = service.get_batching_stats()
+        self.stdout.write(f"Mean batch size: {stats['mean_batch_size']}")
+        self.stdout.write(f"Batch sizes: {stats['batch_sizes']}")
+        self.stdout.write(f"Queue delay: {stats['queue_delay_ms']}")
@@ -0,0 +1,248 @@
+"""
+Low-overhead request metrics with Prometheus text exposition
+
+Every counter and histogram bucket is a float slot in one flat list that
+the owning process updates in place. With
+PREDICTOR_METRICS['MULTIPROCESS_DIR'] set, a background thread copies the
+list into an mmap'd per-process file every FLUSH_INTERVAL_S seconds and
+/api/metrics/ sums the files of all workers. Files are named by pid and
+start time, so a worker that reuses a dead worker's pid never truncates
+its file; each new worker folds the files of dead workers into
+predictor_dead.bin, which keeps the totals monotonic. Updates take no lock: a slot
+increment is a couple of bytecodes under the GIL, so an increment can
+(very rarely) be lost under thread contention, which is an acceptable
+trade for monitoring data.
+"""
+import atexit
+import fcntl
+import glob
+import mmap
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+from django.conf import settings
+
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_metrics = []
+_size = 0
+_values = None
+_collectors = []
+
+
+class Counter:
+    """Monotonic counter with one label"""
+
+    def __init__(self, name, help_text, label, label_values):
+        global _size
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.offsets = {value: _size + i for i, value in enumerate(label_values)}
+        _size += len(label_values)
+        _metrics.append(self)
+
+    def inc(self, label_value, amount=1):
+        _values[self.offsets[label_value]] += amount
+
+    def expose(self, values):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_value, offset in self.offsets.items():
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {_format(values[offset])}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with one label"""
+
+    def __init__(self, name, help_text, label, label_values, buckets=BUCKETS):
+        global _size
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.buckets = buckets
+        # Per label value: len(buckets) + 1 bucket slots, then sum; the
+        # count is the bucket total, derived at exposition time
+        width = len(buckets) + 2
+        self.offsets = {value: _size + i * width for i, value in enumerate(label_values)}
+        self.sum_slot = len(buckets) + 1
+        _size += len(label_values) * width
+        _metrics.append(self)
+
+    def observe(self, label_value, seconds):
+        base = self.offsets[label_value]
+        values = _values
+        values[base + bisect_left(self.buckets, seconds)] += 1
+        values[base + self.sum_slot] += seconds
+
+    def expose(self, values):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        n = len(self.buckets)
+        for label_value, base in self.offsets.items():
+            cumulative = 0
+            for i, bound in enumerate(self.buckets + ('+Inf',)):
+                cumulative += values[base + i]
+                lines.append(f'{self.name}_bucket{{{self.label}="{label_value}",le="{bound}"}} {_format(cumulative)}')
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {_format(values[base + n + 1])}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {_format(cumulative)}')
+        return lines
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# ====== METRIC DEFINITIONS (slot layout must match across processes) ======
+
+ENDPOINTS = ('predict', 'predict_batch', 'async_predict')
+
+STAGE_SECONDS = Histogram(
+    'predictor_stage_seconds', 'Time spent in each prediction stage', 'stage',
+    ('validate', 'encode', 'model', 'breakdown', 'postprocess', 'log_write', 'total'),
+)
+REQUESTS = Counter('predictor_requests_total', 'Prediction requests handled', 'endpoint', ENDPOINTS)
+ERRORS_4XX = Counter('predictor_client_errors_total', 'Prediction requests answered with 4xx', 'endpoint', ENDPOINTS)
+ERRORS_5XX = Counter('predictor_server_errors_total', 'Prediction requests answered with 5xx', 'endpoint', ENDPOINTS)
+ENGINE = Counter('predictor_engine_total', 'Predictions served per engine', 'engine', ('model', 'analytic'))
+ADMISSION = Counter('predictor_admission_total', 'Admission control decisions', 'decision', ('admit', 'degrade', 'shed'))
+BATCH_ROWS = Counter('predictor_batch_rows_total', 'Rows predicted through the batch endpoint', 'endpoint', ('predict_batch',))
+DRIFT_FEATURES = ('weight_kg', 'transport_distance_km')
+DRIFT_INPUTS = Counter('predictor_drift_inputs_total', 'Numeric inputs checked against the training range',
+                       'feature', DRIFT_FEATURES)
+DRIFT_OUT_OF_RANGE = Counter('predictor_drift_out_of_range_total', 'Numeric inputs outside the training range',
+                             'feature', DRIFT_FEATURES)
+
+
+def record_response(endpoint, status_code):
+    """Count a finished request and its error class"""
+    REQUESTS.inc(endpoint)
+    if status_code >= 500:
+        ERRORS_5XX.inc(endpoint)
+    elif status_code >= 400:
+        ERRORS_4XX.inc(endpoint)
+
+
+# ====== STORAGE ======
+
+def _config():
+    return getattr(settings, 'PREDICTOR_METRICS', {})
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _fold_dead_files(directory):
+    """Add the files of exited workers into predictor_dead.bin and remove them"""
+    aggregate = os.path.join(directory, 'predictor_dead.bin')
+    with open(os.path.join(directory, 'predictor_dead.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = []
+        for path in glob.glob(os.path.join(directory, 'predictor_*_*.bin')):
+            pid = int(os.path.basename(path).split('_')[1])
+            # A file with our pid is a previous process's: we haven't created ours yet
+            if pid == os.getpid() or not _alive(pid):
+                dead.append(path)
+        if not dead:
+            return
+        total = np.zeros(_size)
+        if os.path.exists(aggregate):
+            values = np.fromfile(aggregate, dtype=np.float64)
+            if len(values) == _size:
+                total += values
+        for path in dead:
+            # Files from another metric layout are never summed, so they are just dropped
+            values = np.fromfile(path, dtype=np.float64)
+            if len(values) == _size:
+                total += values
+        total.tofile(aggregate + '.tmp')
+        os.replace(aggregate + '.tmp', aggregate)
+        for path in dead:
+            os.remove(path)
+
+
+class _FileFlusher:
+    """Copies this process's slots into its mmap'd file in the background"""
+
+    def __init__(self, directory, interval):
+        os.makedirs(directory, exist_ok=True)
+        _fold_dead_files(directory)
+        path = os.path.join(directory, f'predictor_{os.getpid()}_{time.time_ns()}.bin')
+        with open(path, 'wb+') as f:
+            f.truncate(_size * 8)
+            self.buffer = mmap.mmap(f.fileno(), _size * 8)
+        self.view = memoryview(self.buffer).cast('d')
+        self.interval = interval
+        threading.Thread(target=self._run, name='predictor-metrics-flush', daemon=True).start()
+
+    def flush(self):
+        self.view[:] = array('d', _values)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+_flusher = None
+
+
+def _open_store():
+    """Allocate this process's slots (and its file when multiprocess)"""
+    global _values, _flusher
+    _values = [0.0] * _size
+    directory = _config().get('MULTIPROCESS_DIR')
+    _flusher = _FileFlusher(directory, _config().get('FLUSH_INTERVAL_S', 1.0)) if directory else None
+
+
+def _flush_at_exit():
+    if _flusher is not None:
+        _flusher.flush()
+
+
+def register_collector(collector):
+    """Add a callable returning extra exposition lines (process-local gauges)"""
+    _collectors.append(collector)
+
+
+def snapshot():
+    """Slot values summed over every worker process"""
+    if _flusher is None:
+        return list(_values)
+    _flusher.flush()
+    total = np.zeros(_size)
+    for path in glob.glob(os.path.join(_config()['MULTIPROCESS_DIR'], 'predictor_*.bin')):
+        values = np.fromfile(path, dtype=np.float64)
+        if len(values) == _size:
+            total += values
+    return total
+
+
+def render_prometheus():
+    """Prometheus text exposition format (version 0.0.4)"""
+    values = snapshot()
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.expose(values))
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+_open_store()
+atexit.register(_flush_at_exit)
+# A forked worker must not share its parent's slots
+os.register_at_fork(after_in_child=_open_store)
@@ -0,0 +1,223 @@
+"""
+Sampling profiler for slow and randomly sampled requests
+
+A single background thread per process samples the stacks of watched
+request threads via sys._current_frames(). A request is sampled from its
+first tick when it was picked by SAMPLE_RATE, or from the moment it
+crosses SLOW_THRESHOLD_MS otherwise, so fast unsampled requests pay only
+for a set insert and delete. Under ASGI many requests share the event
+loop thread, so a sample counts for an async request only while its own
+coroutine is on that thread's stack. Profiles are stored as collapsed
+stacks ("frame;frame;frame count" lines, ready for flamegraph.pl or
+speedscope) in a bounded on-disk ring.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_PROFILING', {})
+
+
+def profile_directory():
+    return str(_config().get('DIRECTORY', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+class _Watch:
+    __slots__ = ('thread_id', 'frame', 'started', 'sampled', 'stacks')
+
+    def __init__(self, started, sampled, frame=None):
+        self.thread_id = threading.get_ident()
+        # Async requests: the request's coroutine frame, which must be on the stack
+        self.frame = frame
+        self.started = started
+        self.sampled = sampled
+        self.stacks = Counter()
+
+
+def _on_stack(target, frame):
+    while frame is not None:
+        if frame is target:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def fold_stack(frame):
+    """Collapse a frame chain into a root-first 'a;b;c' string"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Background thread sampling the stacks of watched threads"""
+
+    def __init__(self, interval_ms=5, slow_threshold_ms=500):
+        self.interval = interval_ms / 1000
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.watches = set()
+        threading.Thread(target=self._run, name='predictor-profiler', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.watches:
+                continue
+            now = time.perf_counter()
+            frames = None
+            for watch in list(self.watches):
+                if watch.sampled or now - watch.started >= self.slow_threshold:
+                    if frames is None:
+                        frames = sys._current_frames()
+                    frame = frames.get(watch.thread_id)
+                    if frame is not None and (watch.frame is None or _on_stack(watch.frame, frame)):
+                        watch.stacks[fold_stack(frame)] += 1
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler(interval_ms=5, slow_threshold_ms=500):
+    """The process-wide sampler, retuned to the given settings"""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler(interval_ms, slow_threshold_ms)
+        else:
+            _sampler.interval = interval_ms / 1000
+            _sampler.slow_threshold = slow_threshold_ms / 1000
+    return _sampler
+
+
+def _reset_after_fork():
+    # The sampling thread doesn't survive a fork; a worker starts its own
+    global _sampler
+    _sampler = None
+
+
+class ProfileStore:
+    """Bounded ring of profiles on disk: <id>.folded plus <id>.json metadata"""
+
+    def __init__(self, directory, max_profiles=100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def save(self, metadata, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{time.time_ns()}-{os.getpid()}"
+        with open(os.path.join(self.directory, f'{profile_id}.folded'), 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w') as f:
+            json.dump(dict(metadata, id=profile_id, samples=sum(stacks.values())), f)
+        self._trim()
+        return profile_id
+
+    def _trim(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+        for profile_id in ids[:-self.max_profiles]:
+            for ext in ('.json', '.folded'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Profile metadata, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return profiles
+
+    def path(self, profile_id):
+        """Path of a profile's collapsed stacks, or None for unknown ids"""
+        if not profile_id.replace('-', '').isdigit():
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.folded')
+        return path if os.path.exists(path) else None
+
+
+def get_profile_store():
+    return ProfileStore(profile_directory(), _config().get('MAX_PROFILES', 100))
+
+
+class SlowRequestProfilerMiddleware:
+    """Profile SAMPLE_RATE of requests under PATH_PREFIXES plus every request over SLOW_THRESHOLD_MS"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = _config()
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config.get('SAMPLE_RATE', 0.01)
+        self.path_prefixes = tuple(config.get('PATH_PREFIXES', ('/api/',)))
+        self.sampler = get_sampler(config.get('INTERVAL_MS', 5), config.get('SLOW_THRESHOLD_MS', 500))
+        self.store = get_profile_store()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith(self.path_prefixes):
+            return self.get_response(request)
+
+        watch = _Watch(time.perf_counter(), random.random() < self.sample_rate)
+        self.sampler.watches.add(watch)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.sampler.watches.discard(watch)
+        self._save(request, response, watch)
+        return response
+
+    async def __acall__(self, request):
+        if not request.path.startswith(self.path_prefixes):
+            return await self.get_response(request)
+
+        watch = _Watch(time.perf_counter(), random.random() < self.sample_rate, sys._getframe())
+        self.sampler.watches.add(watch)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.sampler.watches.discard(watch)
+        if watch.stacks:
+            await sync_to_async(self._save, thread_sensitive=False)(request, response, watch)
+        return response
+
+    def _save(self, request, response, watch):
+        if watch.stacks:
+            duration_ms = (time.perf_counter() - watch.started) * 1000
+            self.store.save({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 1),
+                'reason': 'sampled' if watch.sampled else 'slow',
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }, watch.stacks)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
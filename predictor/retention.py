@@ -0,0 +1,174 @@
+"""
+Retention and archival for PredictionLog
+
+archive_predictions() moves rows older than the retention age into gzipped
+NDJSON files partitioned by day
+(ARCHIVE_DIR/YYYY/MM/DD/predictions-<first id>-<last id>.ndjson.gz), then
+deletes them from the table. Each batch's file for a day is written to a
+temporary name, fsynced and renamed before the matching ids are deleted: a
+crash in between leaves the rows in the table. The rerun, whatever its
+batch size, skips rows already in a file of their day (only files whose id
+range overlaps the batch are opened) instead of archiving them twice.
+Rollups are compacted first so analytics keep covering archived rows.
+
+iter_archive() reads the archived rows back for a date range/material, and
+export can include them in front of the live rows.
+"""
+import datetime
+import gzip
+import json
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import PredictionLog
+from .analytics import compact_rollups
+from .export import EXPORT_FIELDS, NDJSONEncoder
+
+# Primary keys per DELETE statement (stays under SQLite's bound-parameter limit)
+DELETE_BATCH_SIZE = 500
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_RETENTION', {})
+
+
+def archive_directory():
+    return str(_config().get('ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive')))
+
+
+def partition_directory(directory, day):
+    return os.path.join(directory, f'{day:%Y}', f'{day:%m}', f'{day:%d}')
+
+
+def _write_atomic(path, data):
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def archive_predictions(max_age_days=None, batch_size=None, directory=None, now=None):
+    """
+    Move rows with created_at older than max_age_days into the archive
+
+    Returns:
+        number of rows archived
+    """
+    config = _config()
+    max_age_days = config.get('MAX_AGE_DAYS', 365) if max_age_days is None else max_age_days
+    batch_size = batch_size or config.get('BATCH_SIZE', 10000)
+    directory = directory or archive_directory()
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=max_age_days)
+
+    compact_rollups()
+    encoder = NDJSONEncoder()
+    archived = 0
+    while True:
+        # Walks predlog_created_idx and stops at the cutoff
+        chunk = list(PredictionLog.objects.filter(created_at__lt=cutoff)
+                     .order_by('created_at', 'id').values_list(*EXPORT_FIELDS)[:batch_size])
+        if not chunk:
+            return archived
+
+        by_day = {}
+        for row in chunk:
+            by_day.setdefault(timezone.localtime(row[1]).date(), []).append(row)
+        for day, rows in by_day.items():
+            partition = partition_directory(directory, day)
+            os.makedirs(partition, exist_ok=True)
+            done = _archived_ids(partition, [row[0] for row in rows])
+            rows = [row for row in rows if row[0] not in done]
+            if rows:
+                first, last = min(row[0] for row in rows), max(row[0] for row in rows)
+                _write_atomic(os.path.join(partition, f'predictions-{first}-{last}.ndjson.gz'),
+                              gzip.compress(encoder.encode(rows)))
+
+        ids = [row[0] for row in chunk]
+        with transaction.atomic():
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                PredictionLog.objects.filter(pk__in=ids[i:i + DELETE_BATCH_SIZE]).delete()
+        archived += len(chunk)
+
+
+def archived_days(directory=None):
+    """Sorted dates that have an archive partition"""
+    directory = directory or archive_directory()
+    days = []
+    for root, _, files in os.walk(directory):
+        if any(name.endswith('.ndjson.gz') for name in files):
+            year, month, day = os.path.relpath(root, directory).split(os.sep)[-3:]
+            days.append(datetime.date(int(year), int(month), int(day)))
+    return sorted(days)
+
+
+def _id_range(name):
+    """'predictions-12-40.ndjson.gz' -> (12, 40)"""
+    first, last = name[len('predictions-'):-len('.ndjson.gz')].split('-')
+    return int(first), int(last)
+
+
+def _partition_files(partition):
+    """(path, (first id, last id)) of one partition's files in id order"""
+    names = [name for name in os.listdir(partition) if name.endswith('.ndjson.gz')]
+    names.sort(key=_id_range)
+    return [(os.path.join(partition, name), _id_range(name)) for name in names]
+
+
+def _archived_ids(partition, ids):
+    """The subset of ids already written to one of the partition's files"""
+    low, high = min(ids), max(ids)
+    wanted, found = set(ids), set()
+    for path, (first, last) in _partition_files(partition):
+        if last < low or first > high:
+            continue
+        with gzip.open(path, 'rt') as f:
+            found.update(record['id'] for record in map(json.loads, f) if record['id'] in wanted)
+    return found
+
+
+def iter_archive(filters=None, directory=None):
+    """
+    Yield archived rows as EXPORT_FIELDS tuples, oldest day first
+
+    filters takes the export build_filters() keys (created_at__gte,
+    created_at__lt, material); only partitions inside the range are opened.
+    """
+    filters = filters or {}
+    directory = directory or archive_directory()
+    start, end = filters.get('created_at__gte'), filters.get('created_at__lt')
+    material = filters.get('material')
+    for day in archived_days(directory):
+        if start is not None and day < timezone.localtime(start).date():
+            continue
+        if end is not None and day > timezone.localtime(end).date():
+            continue
+        for path, _ in _partition_files(partition_directory(directory, day)):
+            with gzip.open(path, 'rt') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if material is not None and record['material'] != material:
+                        continue
+                    created_at = datetime.datetime.fromisoformat(record['created_at'])
+                    if start is not None and created_at < start:
+                        continue
+                    if end is not None and created_at >= end:
+                        continue
+                    record['created_at'] = created_at
+                    yield tuple(record[field] for field in EXPORT_FIELDS)
+
+
+def iter_archive_chunks(filters=None, chunk_size=10000, directory=None):
+    """iter_archive() grouped into lists, matching export.iter_chunks()"""
+    chunk = []
+    for row in iter_archive(filters, directory):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
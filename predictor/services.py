@@ -2,9 +2,39 @@
 Carbon Footprint Prediction Service
 Loads ML model and provides prediction interface
 """
+import hashlib
 import joblib
+import json
+import logging
 import os
+import threading
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+from time import perf_counter
 import numpy as np
+from django.conf import settings
+
+from . import batching
+from . import drift
+from .factors import registry as factor_registry
+from .insights import insights_from_training_data
+from .metrics import ENGINE, STAGE_SECONDS
+from .sharding import ShardedRegressor
+
+
+MODEL_PATH = os.path.join('predictor', 'ml_models', 'carbon_model.joblib')
+
+logger = logging.getLogger(__name__)
+
+
+# Column layout accepted by predict_batch (manufacturing_intensity optional)
+BATCH_INPUT_COLUMNS = ('material', 'weight_kg', 'transport_mode', 'transport_distance_km', 'manufacturing_intensity')
+
+ENCODER_KEYS = {
+    'material': 'material_encoder',
+    'transport_mode': 'transport_encoder',
+    'manufacturing_intensity': 'intensity_encoder',
+}
 
 
 class CarbonFootprintService:
@@ -12,6 +42,16 @@ class CarbonFootprintService:
     
     _model_artifacts = None
     _instance = None
+    _batcher = None
+    _factor_cache = None
+    _insights_cache = None
+    _factor_table_cache = None
+    _drift_cache = None
+    _model_version = None
+    _model_path = None
+    _batcher_lock = threading.Lock()
+    _drift_lock = threading.Lock()
+    _insights_lock = threading.Lock()
     
     def __new__(cls):
         """Singleton pattern to load model once"""
@@ -20,17 +60,35 @@ class CarbonFootprintService:
             cls._instance._load_model()
         return cls._instance
     
-    def _load_model(self):
+    def _load_model(self, model_path=MODEL_PATH, verbose=True):
         """Load the trained model and encoders"""
-        model_path = os.path.join('predictor', 'ml_models', 'carbon_model.joblib')
         if os.path.exists(model_path):
             self._model_artifacts = joblib.load(model_path)
-            print(f"Carbon model loaded successfully")
-            print(f"   Model R²: {self._model_artifacts['metrics']['r2_score']:.4f}")
+            self._model_path = model_path
+            self._model_version = None  # hashed on first use, see model_version()
+            if verbose:
+                print(f"Carbon model loaded successfully")
+                print(f"   Model R²: {self._model_artifacts['metrics']['r2_score']:.4f}")
         else:
             raise FileNotFoundError(f"Model not found at {model_path}. Please run training first.")
     
-    def predict(self, material, weight_kg, transport_mode, transport_distance_km, manufacturing_intensity='MEDIUM'):
+    @classmethod
+    def use_artifacts(cls, artifacts):
+        """Install in-memory model artifacts as the singleton (tests, benchmarks)"""
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        cls._instance._model_artifacts = artifacts
+        cls._instance._model_path = None
+        cls._instance._model_version = uuid.uuid4().hex[:16]
+        if cls._instance._batcher is not None:
+            # Its predict_fn is the old model's
+            cls._instance._batcher.stop()
+        cls._instance._batcher = None
+        cls._instance._drift_cache = None
+        return cls._instance
+    
+    def predict(self, material, weight_kg, transport_mode, transport_distance_km, manufacturing_intensity='MEDIUM',
+                engine='model'):
         """
         Predict carbon footprint for a product
         
@@ -40,6 +98,8 @@ class CarbonFootprintService:
             transport_mode: str ('AIR', 'SEA', 'ROAD', 'RAIL')
             transport_distance_km: float
             manufacturing_intensity: str ('LOW', 'MEDIUM', 'HIGH')
+            engine: 'model' (Random Forest) or 'analytic' (emission-factor
+                formula only; cheap fallback used under overload)
         
         Returns:
             dict with prediction results
@@ -49,36 +109,54 @@ class CarbonFootprintService:
         
         try:
             # Extract components
-            model = self._model_artifacts['model']
             material_encoder = self._model_artifacts['material_encoder']
             transport_encoder = self._model_artifacts['transport_encoder']
             intensity_encoder = self._model_artifacts['intensity_encoder']
             
             # Encode inputs
+            t0 = perf_counter()
             material_encoded = material_encoder.transform([material])[0]
             transport_encoded = transport_encoder.transform([transport_mode])[0]
             intensity_encoded = intensity_encoder.transform([manufacturing_intensity])[0]
-            
-            # Create feature vector
-            X = np.array([[material_encoded, weight_kg, transport_encoded, transport_distance_km, intensity_encoded]])
-            
-            # Predict
-            predicted_co2 = model.predict(X)[0]
+            monitor = self._drift_monitor()
+            input_drift = monitor and monitor.check(
+                material_encoded, weight_kg, transport_encoded, transport_distance_km, intensity_encoded
+            )
+            t1 = perf_counter()
             
             # Get detailed breakdown (approximate based on feature importance)
             breakdown = self._calculate_breakdown(
-                material, weight_kg, transport_mode, transport_distance_km, manufacturing_intensity
+                material_encoded, weight_kg, transport_encoded, transport_distance_km, intensity_encoded
             )
+            t2 = perf_counter()
+            
+            if engine == 'analytic':
+                predicted_co2 = breakdown['material_co2'] + breakdown['manufacturing_co2'] + breakdown['transport_co2']
+            else:
+                # Create feature vector
+                row = (material_encoded, weight_kg, transport_encoded, transport_distance_km, intensity_encoded)
+                
+                # Predict
+                predicted_co2 = self._predict_row(row)
+            t3 = perf_counter()
             
             # Calculate compensation
             compensation = self._calculate_compensation(predicted_co2)
             
             # Real-world equivalency
             equivalency = self._get_equivalency(predicted_co2)
+            t4 = perf_counter()
             
-            return {
+            STAGE_SECONDS.observe('encode', t1 - t0)
+            STAGE_SECONDS.observe('breakdown', t2 - t1)
+            STAGE_SECONDS.observe('model', t3 - t2)
+            STAGE_SECONDS.observe('postprocess', t4 - t3)
+            ENGINE.inc(engine)
+            
+            result = {
                 'success': True,
                 'co2_kg': round(predicted_co2, 2),
+                'engine': engine,
                 'breakdown': breakdown,
                 'compensation': compensation,
                 'equivalency': equivalency,
@@ -87,46 +165,213 @@ class CarbonFootprintService:
                     'upper': round(predicted_co2 * 1.08, 2)
                 }
             }
+            if input_drift:
+                result['drift'] = input_drift
+            return result
         
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
+
+    def _predict_row(self, row):
+        """
+        Predict one feature row, through the micro-batcher when enabled;
+        a sharded model answers from the row's material shard directly
+        """
+        batcher = self._get_batcher()
+        if batcher is None:
+            return self._predict_direct(row)
+        timeout = getattr(settings, 'PREDICTOR_MICROBATCH', {}).get('RESULT_TIMEOUT_MS', 1000) / 1000
+        try:
+            return batcher.submit(row).result(timeout=timeout)
+        except (FutureTimeout, batching.BatcherStopped):
+            # A stalled batcher, or one swapped out meanwhile, must not hang the request
+            return self._predict_direct(row)
     
-    def _calculate_breakdown(self, material, weight_kg, transport_mode, distance_km, intensity):
-        """Calculate approximate breakdown of emissions"""
-        # Emission factors (comprehensive - materials + food)
-        MATERIAL_FACTORS = {
-            # Manufacturing Materials
-            'Cotton': 5.5, 'Polyester': 6.2, 'Wool': 10.4, 'Leather': 17.0,
-            'Steel': 2.8, 'Aluminum': 8.2, 'Plastic': 3.5, 'Glass': 0.9,
-            'Paper': 1.3, 'Wood': 0.5,
-            # Animal Products
-            'Beef': 27.0, 'Lamb': 24.0, 'Pork': 12.1, 'Chicken': 6.9, 'Turkey': 10.9,
-            # Seafood
-            'Fish_Farmed': 5.1, 'Fish_Wild': 2.9, 'Shrimp': 18.0,
-            # Dairy & Eggs
-            'Milk': 1.9, 'Cheese': 13.5, 'Eggs': 4.8, 'Butter': 12.0,
-            # Plant Proteins
-            'Tofu': 2.0, 'Lentils': 0.9, 'Beans': 1.0, 'Nuts': 2.3,
-            # Grains
-            'Rice': 4.0, 'Wheat': 1.4, 'Oats': 1.6, 'Corn': 1.1,
-            # Produce
-            'Tomatoes': 2.1, 'Potatoes': 0.5, 'Lettuce': 0.9, 'Apples': 0.4, 'Bananas': 0.7
-        }
-        
-        TRANSPORT_FACTORS = {
-            'AIR': 0.95, 'SEA': 0.015, 'ROAD': 0.12, 'RAIL': 0.025
-        }
-        
-        MANUFACTURING_BASE = {
-            'LOW': 0.5, 'MEDIUM': 1.5, 'HIGH': 3.5
+    def _predict_direct(self, row):
+        """Predict one row without the batcher"""
+        model = self._model_artifacts['model']
+        if isinstance(model, ShardedRegressor):
+            model = model.route(row[0])
+        return model.predict(np.array([row]))[0]
+    
+    def _get_batcher(self):
+        """Create the micro-batcher on first use if PREDICTOR_MICROBATCH enables it"""
+        if self._batcher is None or not self._batcher.alive:
+            config = getattr(settings, 'PREDICTOR_MICROBATCH', {})
+            if not config.get('ENABLED', False):
+                return None
+            self.configure_batching(config.get('WINDOW_MS', 2.0), config.get('MAX_BATCH_SIZE', 64))
+        return self._batcher
+    
+    def configure_batching(self, window_ms=2.0, max_batch_size=64):
+        """Start (or retune) micro-batching of single-row predictions"""
+        with self._batcher_lock:
+            if self._batcher is None or not self._batcher.alive:
+                self._batcher = batching.activate(
+                    batching.MicroBatcher(self._model_artifacts['model'].predict, window_ms, max_batch_size))
+            else:
+                self._batcher.window = window_ms / 1000
+                self._batcher.max_batch_size = max_batch_size
+        return self._batcher
+    
+    def get_batching_stats(self):
+        """Return micro-batching metrics, or None when batching is off"""
+        if self._batcher is None:
+            return None
+        return dict(self._batcher.stats.snapshot(),
+                    window_ms=self._batcher.window * 1000,
+                    max_batch_size=self._batcher.max_batch_size)
+    
+    def predict_batch(self, columns):
+        """
+        Vectorized prediction over parallel input columns
+
+        Args:
+            columns: mapping of column name -> 1-D array. 'material',
+                'transport_mode' and 'manufacturing_intensity' accept either
+                labels or integer encoder codes; 'manufacturing_intensity'
+                is optional and defaults to 'MEDIUM'.
+
+        Returns:
+            dict of 1-D NumPy arrays, one entry per row
+
+        Raises:
+            ValueError if a column is missing, ragged or out of range
+        """
+        if self._model_artifacts is None:
+            raise RuntimeError("Model not loaded")
+
+        missing = [name for name in BATCH_INPUT_COLUMNS[:4] if name not in columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        for name in BATCH_INPUT_COLUMNS:
+            if name in columns and columns[name] is not None and np.ndim(columns[name]) != 1:
+                raise ValueError(f"Column '{name}' must be a 1-D array")
+
+        weight_kg = np.asarray(columns['weight_kg'], dtype=np.float64)
+        distance_km = np.asarray(columns['transport_distance_km'], dtype=np.float64)
+        n = len(weight_kg)
+
+        intensity = columns.get('manufacturing_intensity')
+        if intensity is None:
+            intensity = np.full(n, 'MEDIUM')
+
+        material_codes = self._encode_column('material', columns['material'])
+        transport_codes = self._encode_column('transport_mode', columns['transport_mode'])
+        intensity_codes = self._encode_column('manufacturing_intensity', intensity)
+
+        for name, values in (('material', material_codes), ('transport_distance_km', distance_km),
+                             ('transport_mode', transport_codes), ('manufacturing_intensity', intensity_codes)):
+            if len(values) != n:
+                raise ValueError(f"Column '{name}' has {len(values)} rows, expected {n}")
+
+        # NaN fails every comparison, so non-finite values are rejected explicitly
+        bad = np.flatnonzero(~np.isfinite(weight_kg) | (weight_kg <= 0) | (weight_kg > 1000))
+        if len(bad):
+            raise ValueError(f"Weight must be between 0 and 1000 kg (rows {bad[:10].tolist()})")
+        bad = np.flatnonzero(~np.isfinite(distance_km) | (distance_km < 0) | (distance_km > 50000))
+        if len(bad):
+            raise ValueError(f"Distance must be between 0 and 50000 km (rows {bad[:10].tolist()})")
+
+        # Model input matrix, same column order as training
+        X = np.empty((n, 5), dtype=np.float64)
+        X[:, 0] = material_codes
+        X[:, 1] = weight_kg
+        X[:, 2] = transport_codes
+        X[:, 3] = distance_km
+        X[:, 4] = intensity_codes
+
+        # A sharded model groups the rows and runs each shard once
+        predicted_co2 = self._model_artifacts['model'].predict(X) if n else np.empty(0)
+        monitor = self._drift_monitor()
+        drift_flagged = (monitor.observe_batch(material_codes, weight_kg, transport_codes, distance_km, intensity_codes)
+                         if monitor else None)
+
+        # Breakdown factors as lookup tables indexed by encoder code
+        material_table, multiplier_table, transport_table, intensity_table = self._factor_arrays()
+
+        material_co2 = weight_kg * material_table[material_codes]
+        manufacturing_co2 = weight_kg * intensity_table[intensity_codes] * multiplier_table[material_codes]
+        transport_co2 = weight_kg * (distance_km / 1000) * transport_table[transport_codes]
+
+        return {
+            'co2_kg': np.round(predicted_co2, 2),
+            'lower': np.round(predicted_co2 * 0.92, 2),
+            'upper': np.round(predicted_co2 * 1.08, 2),
+            'material_co2': np.round(material_co2, 2),
+            'manufacturing_co2': np.round(manufacturing_co2, 2),
+            'transport_co2': np.round(transport_co2, 2),
+            'trees_per_year': np.maximum(np.round(predicted_co2 / 20, 2), 0.01),
+            **({'drift_flagged': drift_flagged} if drift_flagged is not None else {}),
         }
-        
-        material_co2 = weight_kg * MATERIAL_FACTORS.get(material, 3.0)
-        manufacturing_co2 = weight_kg * MANUFACTURING_BASE.get(intensity, 1.5) * 1.4
-        transport_co2 = weight_kg * (distance_km / 1000) * TRANSPORT_FACTORS.get(transport_mode, 0.1)
+
+    def _encode_column(self, name, values):
+        """Map labels (or pass through integer codes) to encoder codes"""
+        encoder = self._model_artifacts[ENCODER_KEYS[name]]
+        values = np.asarray(values)
+        n_classes = len(encoder.classes_)
+
+        if values.dtype.kind in 'iu':
+            codes = values.astype(np.intp)
+            if len(codes) and (codes.min() < 0 or codes.max() >= n_classes):
+                raise ValueError(f"Column '{name}' has codes outside 0..{n_classes - 1}")
+            return codes
+
+        # classes_ is sorted, so a binary search replaces per-row dict lookups
+        classes = encoder.classes_.astype(str)
+        values = values.astype(str)
+        codes = np.minimum(np.searchsorted(classes, values), n_classes - 1)
+        unknown = classes[codes] != values
+        if unknown.any():
+            raise ValueError(f"Unknown {name}: {', '.join(sorted(set(values[unknown][:10])))}")
+        return codes
+
+    def _factor_arrays(self):
+        """Registry factor arrays aligned to this model's encoder codes (rebuilt when either changes)"""
+        tables, artifacts = factor_registry.get(), self._model_artifacts
+        cached = self._factor_cache
+        if cached is None or cached[0] is not tables or cached[1] is not artifacts:
+            cached = self._factor_cache = (tables, artifacts, tables.aligned(
+                artifacts['material_encoder'].classes_,
+                artifacts['transport_encoder'].classes_,
+                artifacts['intensity_encoder'].classes_,
+            ))
+        return cached[2]
+
+    def _drift_monitor(self):
+        """Input drift monitor for the loaded model, or None when PREDICTOR_DRIFT is off"""
+        if not drift.enabled():
+            return None
+        artifacts = self._model_artifacts
+        cached = self._drift_cache
+        if cached is None or cached[0] is not artifacts:
+            # One build per model: concurrent first predictions wait for it
+            with self._drift_lock:
+                cached = self._drift_cache
+                if cached is None or cached[0] is not artifacts:
+                    cached = self._drift_cache = (artifacts, self._build_drift_monitor(artifacts))
+        return cached[1]
+
+    def _build_drift_monitor(self, artifacts):
+        """Monitor for artifacts, or None (logged) when no reference can be built; never fails a prediction"""
+        try:
+            reference = artifacts.get('drift') or drift.reference_from_training_data(artifacts)
+            return drift.activate(drift.DriftMonitor(reference, artifacts['transport_encoder'].classes_))
+        except Exception:
+            logger.exception("Input drift monitoring disabled for this model: no usable training reference")
+            return None
+
+    def _calculate_breakdown(self, material_code, weight_kg, transport_code, distance_km, intensity_code):
+        """Calculate approximate breakdown of emissions from encoder codes"""
+        material_table, multiplier_table, transport_table, intensity_table = self._factor_arrays()
+        # Plain floats: NumPy scalar arithmetic and rounding cost more than the lookups
+        weight_kg, distance_km = float(weight_kg), float(distance_km)
+        material_co2 = weight_kg * material_table.item(material_code)
+        manufacturing_co2 = weight_kg * intensity_table.item(intensity_code) * multiplier_table.item(material_code)
+        transport_co2 = weight_kg * (distance_km / 1000) * transport_table.item(transport_code)
         
         total = material_co2 + manufacturing_co2 + transport_co2
         
@@ -179,6 +424,64 @@ class CarbonFootprintService:
             return list(self._model_artifacts['material_encoder'].classes_)
         return []
     
+    def get_insights(self):
+        """
+        Precomputed insights payload as (JSON bytes, ETag), serialized once
+        per loaded model. Older artifacts get it built once from the training
+        data (or ahead of time with manage.py build_insights); when that fails
+        the insights stay unavailable for the model.
+        
+        Raises:
+            RuntimeError when no model is loaded or the insights are unavailable
+        """
+        artifacts = self._model_artifacts
+        if artifacts is None:
+            raise RuntimeError("Model not loaded")
+        cached = self._insights_cache
+        if cached is None or cached[0] is not artifacts:
+            with self._insights_lock:
+                cached = self._insights_cache
+                if cached is None or cached[0] is not artifacts:
+                    cached = self._insights_cache = (artifacts, *self._build_insights(artifacts))
+        if cached[1] is None:
+            raise RuntimeError("Model insights unavailable")
+        return cached[1], cached[2]
+    
+    def _build_insights(self, artifacts):
+        """(JSON bytes, ETag) for artifacts, or (None, None) (logged) when they can't be built"""
+        try:
+            insights = artifacts.get('insights') or insights_from_training_data(artifacts)
+        except Exception:
+            logger.exception("Model insights unavailable: artifact has none and the training data can't be read")
+            return None, None
+        body = json.dumps(insights, separators=(',', ':')).encode()
+        return body, hashlib.sha1(body).hexdigest()[:16]
+    
+    def get_factor_table(self):
+        """
+        Emission factors for the model's labels as (JSON bytes, ETag), for the
+        browser-side estimator; rebuilt when the model or the factors change
+        """
+        artifacts = self._model_artifacts
+        if artifacts is None:
+            raise RuntimeError("Model not loaded")
+        tables = factor_registry.get()
+        cached = self._factor_table_cache
+        if cached is None or cached[0] is not tables or cached[1] is not artifacts:
+            material_table, multiplier_table, transport_table, intensity_table = self._factor_arrays()
+            table = {
+                'materials': [str(c) for c in artifacts['material_encoder'].classes_],
+                'material_factor': material_table.tolist(),
+                'manufacturing_multiplier': multiplier_table.tolist(),
+                'transport_modes': [str(c) for c in artifacts['transport_encoder'].classes_],
+                'transport_factor': transport_table.tolist(),
+                'intensities': [str(c) for c in artifacts['intensity_encoder'].classes_],
+                'intensity_base': intensity_table.tolist(),
+            }
+            body = json.dumps(table, separators=(',', ':')).encode()
+            cached = self._factor_table_cache = (tables, artifacts, body, hashlib.sha1(body).hexdigest()[:16])
+        return cached[2], cached[3]
+    
     def get_model_info(self):
         """Return model metadata"""
         if self._model_artifacts:
@@ -186,6 +489,33 @@ class CarbonFootprintService:
                 'r2_score': self._model_artifacts['metrics']['r2_score'],
                 'rmse': self._model_artifacts['metrics']['rmse'],
                 'mae': self._model_artifacts['metrics']['mae'],
-                'feature_names': self._model_artifacts['feature_names']
+                'feature_names': self._model_artifacts['feature_names'],
+                'version': model_version()
             }
         return None
+
+
+def model_version():
+    """
+    Version hash of the loaded model artifact, or None; never loads the
+    model (the artifact file is hashed once, on first call)
+    """
+    instance = CarbonFootprintService._instance
+    if instance is None:
+        return None
+    if instance._model_version is None and instance._model_path:
+        with open(instance._model_path, 'rb') as f:
+            instance._model_version = hashlib.file_digest(f, 'sha1').hexdigest()[:16]
+    return instance._model_version
+
+
+def _reset_after_fork():
+    # The batcher's and the drift scorer's threads don't survive a fork; the
+    # child starts its own (drift clears its active monitor in its own hook)
+    instance = CarbonFootprintService._instance
+    if instance is not None:
+        instance._batcher = None
+        instance._drift_cache = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
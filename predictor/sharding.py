@@ -0,0 +1,115 @@
+"""
+Category-routed model shards
+
+A sharded artifact's 'model' is a ShardedRegressor: one smaller forest per
+material group, each trained only on its group's rows (foods and
+manufactured goods respond very differently to weight and processing).
+Rows are routed by their material code, the first feature, so the
+regressor is a drop-in for the single forest everywhere the artifact is
+used: predict() on a batch groups the rows per shard and runs each shard
+once, and CarbonFootprintService sends a single row straight to its
+material's shard with route().
+"""
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+
+# Shallower and smaller than the single forest (150 trees, depth 20)
+SHARD_PARAMS = {
+    'n_estimators': 40,
+    'max_depth': 12,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+    'random_state': 42,
+    'n_jobs': -1,
+}
+
+GROUPINGS = ('category', 'kind')
+
+
+def material_groups(materials, grouping='category'):
+    """
+    Shard name for each material
+
+    grouping='category' gives every factor category (Grain, Seafood,
+    Material, ...) its own shard; 'kind' splits manufactured materials
+    from food only.
+    """
+    from core.models import MaterialFactor  # needs Django set up
+
+    if grouping not in GROUPINGS:
+        raise ValueError(f"Unknown grouping '{grouping}' (expected one of {', '.join(GROUPINGS)})")
+    categories = dict(MaterialFactor.objects.values_list('name', 'category'))
+    if grouping == 'kind':
+        return ['manufactured' if categories.get(m) == 'Material' else 'food' for m in materials]
+    return [categories.get(m, 'Other') for m in materials]
+
+
+class ShardedRegressor:
+    """One regressor per material group, routed by the material code in column 0"""
+
+    def __init__(self, names, shard_of_material, models, n_samples):
+        self.names = list(names)
+        self.shard_of_material = np.asarray(shard_of_material, dtype=np.intp)
+        self.models = list(models)
+        self.n_samples = list(n_samples)
+        self.n_features_in_ = models[0].n_features_in_
+
+    @classmethod
+    def fit(cls, X, y, groups, params=SHARD_PARAMS):
+        """
+        Train one forest per group
+
+        Args:
+            X, y: training matrix (material codes in column 0) and targets
+            groups: shard name per material code
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        names = sorted(set(groups))
+        shard_of_material = [names.index(g) for g in groups]
+        row_shards = np.asarray(shard_of_material)[X[:, 0].astype(np.intp)]
+        models, n_samples = [], []
+        for i in range(len(names)):
+            rows = row_shards == i
+            model = RandomForestRegressor(**params)
+            model.fit(X[rows], y[rows])
+            models.append(model)
+            n_samples.append(int(rows.sum()))
+        return cls(names, shard_of_material, models, n_samples)
+
+    def route(self, material_code):
+        """The shard model for one material code"""
+        return self.models[self.shard_of_material[int(material_code)]]
+
+    def shard_rows(self, X):
+        """Shard index of every row"""
+        return self.shard_of_material[np.asarray(X)[:, 0].astype(np.intp)]
+
+    def predict(self, X):
+        """Predict a batch, one call per shard present in it"""
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty(len(X), dtype=np.float64)
+        if not len(X):
+            return out
+        shards = self.shard_rows(X)
+        present = np.unique(shards)
+        if len(present) == 1:
+            out[:] = self.models[present[0]].predict(X)
+            return out
+        # Rows sorted by shard: each shard's slice is contiguous
+        order = np.argsort(shards, kind='stable')
+        bounds = np.searchsorted(shards[order], present, side='right')
+        start = 0
+        for shard, end in zip(present, bounds):
+            rows = order[start:end]
+            out[rows] = self.models[shard].predict(X[rows])
+            start = end
+        return out
+
+    @property
+    def feature_importances_(self):
+        """Importances of the shards weighted by their training rows"""
+        weights = np.asarray(self.n_samples, dtype=np.float64)
+        importances = np.array([m.feature_importances_ for m in self.models])
+        return weights @ importances / weights.sum()
@@ -0,0 +1,125 @@
+"""
+Mergeable quantile sketch (merging t-digest) for emission distributions
+
+A digest keeps weighted centroids sorted by mean. Compression merges
+neighbouring centroids as long as a merged centroid spans at most one unit
+of the arcsine scale function
+
+    k(q) = delta / (2 pi) * asin(2q - 1)
+
+so centroids are small near the tails and larger around the median, and
+at most about delta/2 survive (~600 bytes serialized at delta=100).
+Digests merge by pooling centroids and recompressing, so hourly digests
+can be combined into any time range without touching raw rows.
+
+Accuracy: a centroid spanning [q, q + dq] has dq <= 2 pi sqrt(q(1-q)) / delta,
+and interpolating between centroid centres keeps the rank error of a
+quantile estimate within about half of that:
+
+    |rank(estimate) / n - q| <= pi * sqrt(q(1-q)) / delta
+
+i.e. at delta=100 roughly 1.6% at p50, 0.9% at p90 and 0.3% at p99 (the
+minimum and maximum are exact). This is the usual t-digest bound rather
+than a worst-case guarantee; tests check it against exact quantiles,
+including after merging many small digests.
+"""
+import struct
+
+import numpy as np
+
+
+DEFAULT_COMPRESSION = 100
+
+_HEADER = struct.Struct('<BHddI')  # version, compression, min, max, centroid count
+_VERSION = 1
+
+
+class TDigest:
+    """Merging t-digest over float values"""
+
+    __slots__ = ('compression', 'means', 'weights', 'min', 'max')
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, means=None, weights=None, min=np.inf, max=-np.inf):
+        self.compression = compression
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=np.float64)
+        self.weights = np.empty(0) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.min = min
+        self.max = max
+
+    @classmethod
+    def from_values(cls, values, compression=DEFAULT_COMPRESSION):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        digest = cls(compression)
+        if values.size:
+            digest._absorb(values, np.ones_like(values), values.min(), values.max())
+        return digest
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def merge(self, other):
+        """Fold another digest into this one (in place) and return self"""
+        if other.weights.size:
+            self._absorb(other.means, other.weights, other.min, other.max)
+        return self
+
+    def _absorb(self, means, weights, low, high):
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+        self.means, self.weights = self._compress(
+            np.concatenate([self.means, means]), np.concatenate([self.weights, weights])
+        )
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        q_left = (np.cumsum(weights) - weights) / total
+        # Centroids whose left edge falls in the same unit interval of k merge into one
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        group = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], group[1:] != group[:-1])))
+        merged_weights = np.add.reduceat(weights, starts)
+        merged_means = np.add.reduceat(means * weights, starts) / merged_weights
+        return merged_means, merged_weights
+
+    def quantile(self, q):
+        """Estimate one or more quantiles (q in [0, 1]); NaN for an empty digest"""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.weights.size:
+            return np.full(q.shape, np.nan)[()]
+        total = self.weights.sum()
+        centres = (np.cumsum(self.weights) - self.weights / 2) / total
+        xp = np.concatenate(([0.0], centres, [1.0]))
+        fp = np.concatenate(([self.min], self.means, [self.max]))
+        return np.interp(q, xp, fp)[()]
+
+    def to_bytes(self):
+        header = _HEADER.pack(_VERSION, self.compression, self.min, self.max, self.means.size)
+        return header + self.means.tobytes() + self.weights.astype(np.float32).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, compression, low, high, n = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError(f'Unsupported digest version {version}')
+        offset = _HEADER.size
+        means = np.frombuffer(data, dtype=np.float64, count=n, offset=offset)
+        weights = np.frombuffer(data, dtype=np.float32, count=n, offset=offset + 8 * n).astype(np.float64)
+        return cls(compression, means, weights, low, high)
+
+
+def merge_digests(digests, compression=DEFAULT_COMPRESSION):
+    """Merge many digests with a single recompression"""
+    digests = [d for d in digests if d.weights.size]
+    merged = TDigest(compression)
+    if digests:
+        merged._absorb(
+            np.concatenate([d.means for d in digests]),
+            np.concatenate([d.weights for d in digests]),
+            min(d.min for d in digests),
+            max(d.max for d in digests),
+        )
+    return merged
@@ -0,0 +1,85 @@
+"""
+SQLite backend tuned for concurrent prediction logging (opt-in, see PREDICTOR_SQLITE)
+
+Every new connection switches the database to WAL (readers no longer block
+the writer or each other), relaxes fsync to synchronous=NORMAL (still
+durable across application crashes, may lose the last commits on power
+loss), waits BUSY_TIMEOUT_MS for the write lock and enlarges the page
+cache and memory-mapped I/O window. atomic() blocks start with
+BEGIN IMMEDIATE, so a transaction takes the write lock up front instead of
+failing when it upgrades from a read, and statements that still hit
+SQLITE_BUSY outside a transaction are retried with exponential backoff.
+"""
+import random
+import sqlite3
+import time
+
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_SQLITE', {})
+
+
+def is_busy(error):
+    """True for SQLITE_BUSY/SQLITE_LOCKED ("database is locked")"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    retries = 0
+    backoff = 0.0
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except sqlite3.OperationalError as e:
+                # Inside an explicit transaction the whole transaction has to be retried
+                if attempt >= self.retries or not is_busy(e) or self.connection.in_transaction:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                attempt += 1
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(super().executemany, query, list(param_list))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # sqlite3's own busy handler, in seconds; PRAGMA busy_timeout below sets the same
+        params['timeout'] = _config().get('BUSY_TIMEOUT_MS', 5000) / 1000
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        config = _config()
+        if not self.is_in_memory_db():
+            conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f"PRAGMA synchronous = {config.get('SYNCHRONOUS', 'NORMAL')}")
+        conn.execute(f"PRAGMA busy_timeout = {int(config.get('BUSY_TIMEOUT_MS', 5000))}")
+        # Negative cache_size is in KiB rather than pages
+        conn.execute(f"PRAGMA cache_size = -{int(config.get('CACHE_SIZE_KB', 65536))}")
+        conn.execute(f"PRAGMA mmap_size = {int(config.get('MMAP_SIZE', 256 * 1024 * 1024))}")
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        config = _config()
+        cursor.retries = config.get('BUSY_RETRIES', 5)
+        cursor.backoff = config.get('BUSY_BACKOFF_MS', 10) / 1000
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
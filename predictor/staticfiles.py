@@ -0,0 +1,340 @@
+"""
+Production static assets
+
+build_assets runs collectstatic through CompressedManifestStaticFilesStorage,
+which stores every file under a content-hashed name (listed in
+staticfiles.json) and writes .gz siblings of text assets (.br too when the
+brotli package is installed). Videos are first rewritten into
+PREDICTOR_STATIC['BUILD_DIR'] with their index ahead of the media data
+(and, optionally, transcoded to a lighter variant), which shadows the
+originals in STATICFILES_DIRS.
+
+StaticAssetMiddleware serves STATIC_ROOT ahead of the URLconf from an index
+built at startup: hashed names are cached for a year as immutable, the
+precompressed sibling is picked from Accept-Encoding, and single byte
+ranges are answered with 206 so video playback starts (and seeks) without
+downloading the whole file.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import struct
+import subprocess
+from urllib.parse import urlparse
+
+import numpy as np
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin, ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.html', '.txt', '.map', '.xml')
+
+# Content-Encoding -> sibling file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_STATIC', {})
+
+
+def compress_file(path, min_size=512):
+    """
+    Write .gz (and .br) siblings of a text asset, keeping only those that
+    save at least 5%
+
+    Returns:
+        list of written paths
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return []
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    written = []
+    for suffix, blob in variants:
+        if len(blob) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(blob)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses text assets"""
+
+    def stored_name(self, name):
+        # A template pointing at a missing asset gets a 404 for it, not a 500 for the page
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        min_size = _config().get('COMPRESS_MIN_BYTES', 512)
+        for name in {*paths, *self.hashed_files.values()}:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                compress_file(self.path(name), min_size)
+
+
+def static_version(*names):
+    """
+    Version of the static files: the staticfiles.json hash under a manifest
+    storage (changes with any collected file), otherwise a hash of the
+    given files' sizes and modification times
+    """
+    if isinstance(staticfiles_storage, ManifestFilesMixin):
+        return staticfiles_storage.manifest_hash[:12]
+    digest = hashlib.sha1()
+    for name in names:
+        path = finders.find(name)
+        if path:
+            stat = os.stat(path)
+            digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:12]
+
+
+# MP4 boxes that only contain other boxes on the way down to the chunk offset tables
+MP4_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+def _mp4_boxes(data, start=0, end=None):
+    """Yield (type, offset, header size, box size) for the boxes in data[start:end]"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"Malformed MP4 box at byte {offset}")
+        yield kind, offset, header, size
+        offset += size
+
+
+def _shift_chunk_offsets(moov, shift, start, end):
+    for kind, offset, header, size in _mp4_boxes(moov, start, end):
+        if kind in MP4_CONTAINERS:
+            _shift_chunk_offsets(moov, shift, offset + header, offset + size)
+        elif kind in (b'stco', b'co64'):
+            dtype = '>u4' if kind == b'stco' else '>u8'
+            # version/flags, entry count, then the offsets
+            count = struct.unpack_from('>I', moov, offset + header + 4)[0]
+            base = offset + header + 8
+            offsets = np.frombuffer(moov, dtype, count, base).astype(np.uint64) + np.uint64(shift)
+            if kind == b'stco' and count and offsets.max() > 0xFFFFFFFF:
+                raise ValueError("Chunk offsets overflow 32 bits after moving the index")
+            moov[base:base + count * np.dtype(dtype).itemsize] = offsets.astype(dtype).tobytes()
+
+
+def faststart(data):
+    """
+    Move an MP4's moov box (the index) ahead of its media data so playback
+    can start from the first bytes; data is returned unchanged if it already is
+    """
+    boxes = list(_mp4_boxes(data))
+    kinds = [kind for kind, _, _, _ in boxes]
+    if b'moov' not in kinds or b'mdat' not in kinds or kinds.index(b'moov') < kinds.index(b'mdat'):
+        return data
+    _, mdat_offset, _, _ = boxes[kinds.index(b'mdat')]
+    _, moov_offset, header, moov_size = boxes[kinds.index(b'moov')]
+    moov = bytearray(data[moov_offset:moov_offset + moov_size])
+    # Media data moves down by the size of the index now in front of it
+    _shift_chunk_offsets(moov, moov_size, header, moov_size)
+    return b''.join((data[:mdat_offset], moov, data[mdat_offset:moov_offset], data[moov_offset + moov_size:]))
+
+
+def transcode(source, target, max_height=720, crf=30):
+    """Re-encode a (muted, background) video with ffmpeg at most max_height pixels tall"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is not on PATH")
+    subprocess.run([
+        ffmpeg, '-y', '-loglevel', 'error', '-i', str(source),
+        '-vf', f'scale=-2:min(ih\\,{max_height})', '-c:v', 'libx264', '-preset', 'slow', '-crf', str(crf),
+        '-an', '-movflags', '+faststart', str(target),
+    ], check=True)
+
+
+def parse_range(header, size):
+    """
+    First-to-last byte (inclusive) of a single 'bytes=' range
+
+    Returns None for a malformed or multi-range header (serve the whole
+    file); raises ValueError when the range is unsatisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return None
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+    except ValueError:
+        return None
+    if start >= size or start < 0:
+        raise ValueError(f"Range starts beyond {size} bytes")
+    return start, end
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q=') and q[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _read_range(f, start, length):
+    with f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class Asset:
+    """One file under STATIC_ROOT with its precompressed siblings"""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.immutable = immutable
+        self.encodings = [
+            (coding, path + suffix, os.path.getsize(path + suffix), f'{self.etag[:-1]}-{coding}"')
+            for coding, suffix in ENCODINGS if os.path.exists(path + suffix)
+        ]
+
+    def _representation(self, request):
+        if self.encodings and 'Range' not in request.headers:
+            accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+            for coding, path, size, etag in self.encodings:
+                if coding in accepted:
+                    return coding, path, size, etag
+        return None, self.path, self.size, self.etag
+
+    def serve(self, request):
+        coding, path, size, etag = self._representation(request)
+        response = get_conditional_response(request, etag=etag, last_modified=int(self.mtime))
+        if response is None:
+            byte_range = None
+            if coding is None and 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+                try:
+                    byte_range = parse_range(request.headers['Range'], size)
+                except ValueError:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{size}'
+                    return response
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=self.content_type)
+                response['Content-Length'] = str(size)
+            elif byte_range is None:
+                response = FileResponse(open(path, 'rb'), content_type=self.content_type)
+            else:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    _read_range(open(path, 'rb'), start, end - start + 1), status=206,
+                    content_type=self.content_type,
+                )
+                response['Content-Length'] = str(end - start + 1)
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Last-Modified'] = http_date(self.mtime)
+            if coding:
+                response['Content-Encoding'] = coding
+            if coding is None:
+                response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        if self.immutable:
+            response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = f"public, max-age={_config().get('MAX_AGE', 60)}"
+        if self.encodings:
+            response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def index_assets(root):
+    """URL path (relative to STATIC_URL) -> Asset for every file under root"""
+    root = str(root)
+    try:
+        with open(os.path.join(root, 'staticfiles.json')) as f:
+            hashed = set(json.load(f).get('paths', {}).values())
+    except (OSError, ValueError):
+        hashed = set()
+    assets = {}
+    for directory, _, files in os.walk(root):
+        names = set(files)
+        for name in files:
+            if name.endswith(tuple(suffix for _, suffix in ENCODINGS)) and os.path.splitext(name)[0] in names:
+                continue
+            path = os.path.join(directory, name)
+            url = os.path.relpath(path, root).replace(os.sep, '/')
+            if url != 'staticfiles.json':
+                assets[url] = Asset(path, url in hashed)
+    return assets
+
+
+class StaticAssetMiddleware:
+    """
+    Serve STATIC_ROOT when PREDICTOR_STATIC['ENABLED']; files are indexed
+    once at startup (restart workers after build_assets)
+    """
+
+    def __init__(self, get_response):
+        if not _config().get('ENABLED') or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.assets = index_assets(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            asset = self.assets.get(request.path_info[len(self.prefix):])
+            if asset is not None:
+                return asset.serve(request)
+        return self.get_response(request)
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import datetime
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.db.models import F
+from django.test import AsyncClient, Client, RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import DailyRollup, FactorVersion, HourlyRollup, MaterialFactor, PredictionLog, TransportFactor
+from .admission import ADMIT, DEGRADE, SHED, AdmissionController
+from .analytics import compact_rollups, query_rollups
+from .async_views import acquire_slot
+from .batching import BatcherStopped, MicroBatcher
+from .drift import DriftMonitor
+from .export import MAX_CHUNK_SIZE, build_filters, stream_export
+from .factors import bump_version, import_factors, registry as factor_registry
+from .live import LiveFeed, RingBuffer
+from .loadtest import LatencyRecorder, parse_mix, summarize
+from .metrics import _open_store, render_prometheus, snapshot
+from .profiling import ProfileStore, get_sampler
+from .retention import archive_predictions, iter_archive
+from .sqlite_backend.base import DatabaseWrapper as TunedDatabaseWrapper
+from .staticfiles import StaticAssetMiddleware, faststart, parse_range
+from .sharding import ShardedRegressor
+from .sketches import TDigest, merge_digests
+from .throttling import TokenBucketRegistry, TokenBucketThrottle
+from .services import CarbonFootprintService
+from .training import train_model
+
+
+def get_test_service():
+    """Return the service singleton, training a small model if no artifact is loaded"""
+    service = CarbonFootprintService._instance
+    if service is None or service._model_artifacts is None:
+        artifacts, _ = train_model.train_model(train_model.generate_synthetic_dataset(num_samples=400))
+        service = CarbonFootprintService.use_artifacts(artifacts)
+    return service
+
+
+class BatchPredictTests(TestCase):
+    columns = {
+        'material': ['Cotton', 'Beef', 'Steel'],
+        'weight_kg': [0.5, 2.0, 10.0],
+        'transport_mode': ['AIR', 'SEA', 'ROAD'],
+        'transport_distance_km': [8000.0, 12000.0, 500.0],
+        'manufacturing_intensity': ['MEDIUM', 'HIGH', 'LOW'],
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def test_batch_matches_single_predictions(self):
+        result = self.service.predict_batch({k: np.asarray(v) for k, v in self.columns.items()})
+        for i in range(3):
+            single = self.service.predict(*[self.columns[k][i] for k in self.columns])
+            self.assertAlmostEqual(result['co2_kg'][i], single['co2_kg'], places=2)
+            self.assertAlmostEqual(result['material_co2'][i], single['breakdown']['material_co2'], places=2)
+
+    def test_integer_codes_and_unknown_labels(self):
+        classes = list(self.service.get_available_materials())
+        columns = dict(self.columns, material=np.array([classes.index(m) for m in self.columns['material']]))
+        self.assertEqual(len(self.service.predict_batch(columns)['co2_kg']), 3)
+
+        with self.assertRaises(ValueError):
+            self.service.predict_batch(dict(self.columns, material=['Cotton', 'Unobtainium', 'Steel']))
+
+    def test_json_columns_round_trip(self):
+        response = APIClient().post('/api/predict/batch/', {'columns': self.columns}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(len(response.json()['columns']['co2_kg']), 3)
+
+    def test_npz_request_gets_npz_response(self):
+        buf = io.BytesIO()
+        np.savez(buf, **{k: np.asarray(v) for k, v in self.columns.items()})
+        response = APIClient().post('/api/predict/batch/', buf.getvalue(), content_type='application/x-npz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-npz')
+        archive = np.load(io.BytesIO(response.content))
+        self.assertEqual(archive['co2_kg'].shape, (3,))
+
+    def test_non_finite_and_misshapen_columns_are_rejected(self):
+        response = APIClient().post('/api/predict/batch/', {
+            'columns': dict(self.columns, weight_kg=[0.5, None, 10.0])
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValueError):
+            self.service.predict_batch(dict(self.columns, transport_distance_km=[8000.0, np.nan, 500.0]))
+        with self.assertRaises(ValueError):
+            self.service.predict_batch(dict(self.columns, weight_kg=[[0.5, 2.0, 10.0]]))
+
+    def test_invalid_batch_is_rendered_as_json(self):
+        buf = io.BytesIO()
+        np.savez(buf, **dict({k: np.asarray(v) for k, v in self.columns.items()}, weight_kg=np.array([1.0, -1.0, 2.0])))
+        response = APIClient().post('/api/predict/batch/', buf.getvalue(), content_type='application/x-npz')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class MicroBatcherTests(TestCase):
+    def test_concurrent_rows_share_one_predict_call(self):
+        calls = []
+
+        def predict_fn(X):
+            calls.append(len(X))
+            return X.sum(axis=1)
+
+        batcher = MicroBatcher(predict_fn, window_ms=50, max_batch_size=8)
+        futures = [batcher.submit((i, 1.0)) for i in range(8)]
+
+        self.assertEqual([f.result(timeout=5) for f in futures], [i + 1.0 for i in range(8)])
+        self.assertEqual(calls, [8])
+        self.assertEqual(batcher.stats.snapshot()['batch_sizes'], {8: 1})
+
+    def test_errors_propagate_to_every_caller(self):
+        def predict_fn(X):
+            raise ValueError('boom')
+
+        batcher = MicroBatcher(predict_fn, window_ms=1, max_batch_size=4)
+        with self.assertRaises(ValueError):
+            batcher.submit((1.0,)).result(timeout=5)
+
+    def test_service_survives_a_stalled_dead_or_swapped_batcher(self):
+        service = get_test_service()
+        row = service._model_artifacts['material_encoder'].transform(['Cotton']).tolist() + [1.0, 0, 100.0, 1]
+        expected = service._predict_direct(row)
+        release = threading.Event()
+        stalled = MicroBatcher(lambda X: release.wait() and X[:, 0], window_ms=1)
+        with mock.patch.object(service, '_batcher', stalled), \
+                override_settings(PREDICTOR_MICROBATCH={'ENABLED': True, 'RESULT_TIMEOUT_MS': 10}):
+            self.assertEqual(service._predict_row(row), expected)
+            # A forked child sees the batcher but not its thread
+            with mock.patch.object(stalled._thread, 'is_alive', return_value=False):
+                rebuilt = service._get_batcher()
+            self.assertIsNot(rebuilt, stalled)
+            self.assertEqual(service._predict_row(row), expected)
+            CarbonFootprintService.use_artifacts(service._model_artifacts)
+        release.set()
+        self.assertTrue(rebuilt.stopped)
+        self.assertIsNone(service._batcher)
+        with self.assertRaises(BatcherStopped):
+            rebuilt.submit(row).result(timeout=5)
+        rebuilt._thread.join(5)
+        self.assertFalse(rebuilt._thread.is_alive())
+
+    def test_a_bad_row_fails_only_its_own_caller(self):
+        def predict_fn(X):
+            if np.isnan(X).any():
+                raise ValueError('NaN row')
+            return X.sum(axis=1)
+
+        batcher = MicroBatcher(predict_fn, window_ms=50, max_batch_size=3)
+        futures = [batcher.submit(row) for row in ((1.0, 1.0), (np.nan, 1.0), (2.0, 2.0))]
+
+        self.assertEqual(futures[0].result(timeout=5), 2.0)
+        with self.assertRaises(ValueError):
+            futures[1].result(timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), 4.0)
+        self.assertEqual(batcher.stats.snapshot()['fallbacks'], 1)
+
+    def test_stats_are_exposed_on_the_metrics_endpoint(self):
+        batcher = MicroBatcher(lambda X: X.sum(axis=1), window_ms=1, max_batch_size=4)
+        batcher.submit((1.0,)).result(timeout=5)
+        with mock.patch('predictor.batching._active', batcher):
+            body = render_prometheus()
+        self.assertIn(f'predictor_microbatch_rows_total{{pid="{os.getpid()}"}} 1', body)
+        self.assertIn('predictor_microbatch_queue_delay_seconds_count', body)
+
+
+class PredictViewTests(TestCase):
+    payload = {
+        'product_name': 'Cotton T-Shirt',
+        'material': 'Cotton',
+        'weight_kg': 0.5,
+        'transport_mode': 'AIR',
+        'transport_distance_km': 8000,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        get_test_service()
+
+    def test_predict_logs_prediction(self):
+        response = self.client.post('/api/predict/', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PredictionLog.objects.get().material, 'Cotton')
+
+    def test_stage_timings_are_exposed(self):
+        self.client.post('/api/predict/', self.payload, content_type='application/json')
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('predictor_stage_seconds_count{stage="model"}', body)
+        self.assertIn('predictor_requests_total{endpoint="predict"}', body)
+        self.assertEqual(body, render_prometheus())
+
+    def test_dead_workers_files_are_folded_not_truncated(self):
+        size = len(snapshot())
+        dead_pid = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                  capture_output=True, text=True).stdout.strip()
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('predictor.metrics._values'), mock.patch('predictor.metrics._flusher'), \
+                override_settings(PREDICTOR_METRICS={'MULTIPROCESS_DIR': directory, 'FLUSH_INTERVAL_S': 60}):
+            np.ones(size).tofile(os.path.join(directory, 'predictor_dead.bin'))
+            np.full(size, 2.0).tofile(os.path.join(directory, f'predictor_{dead_pid}_1.bin'))
+            # An earlier process that had this pid
+            np.full(size, 3.0).tofile(os.path.join(directory, f'predictor_{os.getpid()}_1.bin'))
+            _open_store()
+            [own] = [name for name in os.listdir(directory) if name.startswith(f'predictor_{os.getpid()}_')]
+            self.assertNotEqual(own, f'predictor_{os.getpid()}_1.bin')
+            self.assertEqual(set(os.listdir(directory)), {own, 'predictor_dead.bin', 'predictor_dead.lock'})
+            np.testing.assert_array_equal(snapshot(), np.full(size, 6.0))
+
+    async def test_async_predict_logs_prediction(self):
+        response = await self.async_client.post('/api/async/predict/', self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(await PredictionLog.objects.acount(), 1)
+
+    async def test_malformed_bodies_are_client_errors(self):
+        nan_body = '{"material": "Cotton", "weight_kg": NaN, "transport_mode": "SEA", "transport_distance_km": 10}'
+        for path in ('/api/predict/', '/api/async/predict/'):
+            for body in ('[1, 2]', '"Cotton"', nan_body, '{"material": '):
+                response = await self.async_client.post(path, body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, (path, body))
+        self.assertEqual(await PredictionLog.objects.acount(), 0)
+
+    async def test_async_predict_validates_ranges(self):
+        response = await self.async_client.post('/api/async/predict/', {
+            'material': 'Cotton', 'weight_kg': 5000, 'transport_mode': 'AIR', 'transport_distance_km': 10,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_predict_goes_through_admission(self):
+        controller = AdmissionController(latency_budget_ms=1, workers=1, min_samples=1)
+        controller.acquire()
+        controller.release(1.0)
+        controller.acquire()  # the only worker is busy
+        with mock.patch('predictor.async_views.get_admission_controller', return_value=controller):
+            response = await self.async_client.post('/api/async/predict/', self.payload,
+                                                    content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    async def test_async_concurrency_limit_is_process_wide(self):
+        limit = threading.BoundedSemaphore(1)
+        self.assertTrue(await acquire_slot(limit, 0))
+        self.assertFalse(await acquire_slot(limit, 0.02))
+        limit.release()
+        with mock.patch('predictor.async_views._limit', limit), \
+                override_settings(PREDICTOR_ASYNC={'QUEUE_TIMEOUT_S': 0.01}):
+            limit.acquire()
+            response = await self.async_client.get('/api/async/materials/')
+            limit.release()
+        self.assertEqual(response.status_code, 503)
+
+    async def test_async_materials(self):
+        response = await self.async_client.get('/api/async/materials/')
+        self.assertIn('Cotton', response.json()['materials'])
+
+    async def test_async_reads_match_the_sync_views(self):
+        for path in ('/api/async/materials/', '/api/async/model-info/'):
+            response = await self.async_client.get(path)
+            self.assertIn('X-RateLimit-Remaining', response)
+            self.assertIn('max-age=300', response['Cache-Control'])
+            revalidated = await self.async_client.get(path, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(revalidated.status_code, 304)
+
+    async def test_first_model_load_runs_off_the_event_loop(self):
+        service = CarbonFootprintService._instance
+        loop_thread = threading.get_ident()
+        hashed_on = []
+
+        def hash_artifact():
+            hashed_on.append(threading.get_ident())
+            service._model_version = 'abc'
+
+        with mock.patch.object(service, '_model_version', None), \
+                mock.patch.object(service, '_model_path', 'model.joblib'), \
+                mock.patch('predictor.async_views.model_version', side_effect=hash_artifact):
+            response = await self.async_client.get('/api/async/materials/')
+        self.assertEqual(response['ETag'], '"abc-json"')
+        self.assertNotEqual(hashed_on, [loop_thread])
+        self.assertEqual(len(hashed_on), 1)
+
+
+class AdmissionControllerTests(TestCase):
+    def test_sheds_when_expected_wait_exceeds_budget(self):
+        controller = AdmissionController(latency_budget_ms=100, workers=1, min_samples=5)
+        for _ in range(5):
+            self.assertEqual(controller.acquire(), ADMIT)
+            controller.release(0.04)
+
+        # One request in flight: expected latency 2 * 40 ms is within budget
+        self.assertEqual(controller.acquire(), ADMIT)
+        # Two in flight: 3 * 40 ms is not
+        self.assertEqual(controller.acquire(), ADMIT)
+        self.assertEqual(controller.acquire(), SHED)
+        self.assertEqual(controller.stats()['shed'], 1)
+        self.assertGreaterEqual(controller.retry_after(), 1)
+
+    def test_degrades_instead_of_shedding(self):
+        controller = AdmissionController(latency_budget_ms=10, workers=1, degrade=True, min_samples=1)
+        controller.acquire()
+        controller.release(0.05)
+        # The idle worker still takes one request at full fidelity
+        self.assertEqual(controller.acquire(), ADMIT)
+        self.assertEqual(controller.acquire(), DEGRADE)
+        controller.release()
+        controller.release(0.05)
+        self.assertEqual(controller.stats()['in_flight'], 0)
+
+    def test_recovers_after_a_latency_spike(self):
+        controller = AdmissionController(latency_budget_ms=100, workers=1, window=32, min_samples=5)
+        for _ in range(32):
+            controller.acquire()
+            controller.release(1.0)
+        controller.acquire()
+        self.assertEqual(controller.acquire(), SHED)
+        controller.release(0.01)
+        # Requests arriving at an idle worker refill the window with fast samples
+        for _ in range(32):
+            self.assertEqual(controller.acquire(), ADMIT)
+            controller.release(0.01)
+        controller.acquire()
+        self.assertEqual(controller.acquire(), ADMIT)
+
+
+class TokenBucketTests(TestCase):
+    def test_refill_and_weighted_cost(self):
+        registry = TokenBucketRegistry(rate=10, capacity=20)
+        self.assertEqual(registry.consume('a', cost=15, now=0)[:2], (True, 5))
+        allowed, _, wait = registry.consume('a', cost=10, now=0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.5)
+        self.assertTrue(registry.consume('a', cost=10, now=0.5)[0])
+
+    def test_oversized_request_goes_into_debt(self):
+        registry = TokenBucketRegistry(rate=10, capacity=20)
+        self.assertEqual(registry.consume('a', cost=50, now=0)[:2], (True, -30))
+        self.assertFalse(registry.consume('a', cost=1, now=1)[0])
+
+    def test_idle_and_excess_buckets_are_evicted(self):
+        registry = TokenBucketRegistry(rate=10, capacity=20, max_buckets=3)
+        for i in range(5):
+            registry.consume(f'client-{i}', now=0)
+        self.assertEqual(len(registry), 3)
+        registry.consume('late', now=10)
+        self.assertEqual(len(registry), 1)
+
+    def test_rate_limit_headers(self):
+        get_test_service()
+        response = self.client.get('/api/materials/', HTTP_X_API_KEY='integration-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-RateLimit-Remaining', response)
+
+    def test_only_configured_api_keys_get_their_own_bucket(self):
+        request = RequestFactory().get('/', HTTP_X_API_KEY='made-up', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(TokenBucketThrottle().get_client_key(request), 'ip:10.0.0.1')
+        with override_settings(PREDICTOR_THROTTLE={'API_KEYS': {'made-up'}}):
+            self.assertEqual(TokenBucketThrottle().get_client_key(request), 'key:made-up')
+
+    def test_rotating_forwarded_for_shares_one_bucket(self):
+        get_test_service()
+        with mock.patch('predictor.throttling._registry', TokenBucketRegistry(rate=0.001, capacity=1)):
+            statuses = [self.client.get('/api/materials/', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+                        for i in range(3)]
+        self.assertEqual(statuses, [200, 429, 429])
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.7', REMOTE_ADDR='10.0.0.2')
+        with override_settings(PREDICTOR_THROTTLE={'NUM_PROXIES': 1}):
+            self.assertEqual(TokenBucketThrottle().get_client_key(request), 'ip:10.0.0.7')
+
+    @override_settings(PREDICTOR_THROTTLE={'SHARED_LIMIT_PER_MINUTE': 10, 'SHARED_CACHE': 'default'})
+    def test_shared_limit_refuses_a_local_memory_cache(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.3')
+        with self.assertRaises(ImproperlyConfigured):
+            TokenBucketThrottle().allow_request(request, None)
+
+    def test_async_predict_is_throttled(self):
+        with mock.patch('predictor.throttling._registry', TokenBucketRegistry(rate=0.001, capacity=1)):
+            payload = dict(PredictViewTests.payload, weight_kg=5000)
+            first = self.client.post('/api/async/predict/', payload, content_type='application/json')
+            second = self.client.post('/api/async/predict/', payload, content_type='application/json')
+        self.assertEqual(first.status_code, 400)
+        self.assertIn('X-RateLimit-Remaining', first)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+
+    def test_scalar_batch_column_is_a_client_error(self):
+        get_test_service()
+        response = APIClient().post('/api/predict/batch/', {'columns': {
+            'material': 'Cotton', 'weight_kg': 5, 'transport_mode': 'AIR', 'transport_distance_km': 100,
+        }}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProfilerTests(TestCase):
+    def test_ring_keeps_newest_profiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ProfileStore(directory, max_profiles=2)
+            ids = [store.save({'path': f'/api/{i}/'}, Counter({'main;predict': 3})) for i in range(3)]
+            self.assertEqual([p['id'] for p in store.list()], ids[:0:-1])
+            self.assertIsNone(store.path(ids[0]))
+            with open(store.path(ids[2])) as f:
+                self.assertEqual(f.read(), 'main;predict 3\n')
+
+    def test_sampled_request_is_profiled(self):
+        get_test_service()
+        with tempfile.TemporaryDirectory() as directory:
+            config = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'INTERVAL_MS': 0.5, 'DIRECTORY': directory}
+            with override_settings(PREDICTOR_PROFILING=config):
+                Client().post('/api/predict/', PredictViewTests.payload, content_type='application/json')
+                profiles = ProfileStore(directory).list()
+            self.assertEqual(len(profiles), 1)
+            self.assertEqual(profiles[0]['reason'], 'sampled')
+            self.assertGreater(profiles[0]['samples'], 0)
+
+    def test_async_request_is_profiled_by_the_shared_sampler(self):
+        get_test_service()
+        with tempfile.TemporaryDirectory() as directory:
+            config = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'INTERVAL_MS': 0.5, 'DIRECTORY': directory}
+            with override_settings(PREDICTOR_PROFILING=config):
+                Client().get('/api/model-info/')
+                sampler = get_sampler()
+                # Blocks the event loop inside the request's own coroutine
+                slow_parse = lambda data: time.sleep(0.05) or ({}, 'slow')
+                with mock.patch('predictor.async_views.parse_prediction_input', side_effect=slow_parse):
+                    async_to_sync(AsyncClient().post)('/api/async/predict/', PredictViewTests.payload,
+                                                       content_type='application/json')
+                profiles = ProfileStore(directory).list()
+            self.assertIs(get_sampler(), sampler)
+            self.assertEqual(sum(t.name == 'predictor-profiler' for t in threading.enumerate()), 1)
+            self.assertEqual(profiles[0]['path'], '/api/async/predict/')
+            self.assertGreater(profiles[0]['samples'], 0)
+
+    def test_admin_lists_and_downloads_profiles(self):
+        from django.contrib.auth.models import User
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        with tempfile.TemporaryDirectory() as directory:
+            profile_id = ProfileStore(directory).save({'path': '/api/predict/'}, Counter({'a;b': 1}))
+            with override_settings(PREDICTOR_PROFILING={'DIRECTORY': directory}):
+                self.client.login(username='admin', password='pw')
+                self.assertContains(self.client.get('/admin/profiles/'), profile_id)
+                response = self.client.get(f'/admin/profiles/{profile_id}/download/')
+                self.assertEqual(b''.join(response.streaming_content), b'a;b 1\n')
+
+
+class LoadTestHarnessTests(TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('predict=3,model-info'), {'predict': 3.0, 'model-info': 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix('predict=1,unknown=2')
+
+    def test_recorder_and_summary(self):
+        recorder = LatencyRecorder(interval=60)
+        for ms in range(1, 101):
+            recorder.record('predict', ms / 1000, 200 if ms <= 90 else 503)
+        [(start, bucket)] = recorder.intervals()
+        stats = summarize(bucket['latencies'], bucket['errors'], duration=10)
+        self.assertEqual(start, 0)
+        self.assertEqual(bucket['statuses'], {200: 90, 503: 10})
+        self.assertAlmostEqual(stats['throughput'], 10.0)
+        self.assertAlmostEqual(stats['error_rate'], 0.1)
+        self.assertAlmostEqual(stats['p50'], 50.5)
+        self.assertLessEqual(stats['p99'], stats['p999'])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        PredictionLog.objects.bulk_create([
+            PredictionLog(product_name=f'Item {i}', material='Cotton' if i % 2 else 'Steel', weight_kg=1.0,
+                          transport_mode='SEA', transport_distance_km=100.0, predicted_co2_kg=float(i))
+            for i in range(25)
+        ])
+
+    def test_csv_pages_through_all_rows(self):
+        body = b''.join(stream_export('csv', {}, chunk_size=4)).decode()
+        lines = body.strip().split('\r\n')
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'created_at', 'product_name', 'material'])
+        self.assertEqual(len(lines), 26)
+
+    def test_ndjson_material_filter_and_gzip(self):
+        body = gzip.decompress(b''.join(stream_export('ndjson', build_filters(material='Cotton'), 5, compress=True)))
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(records), 12)
+        self.assertEqual({r['material'] for r in records}, {'Cotton'})
+
+    def test_chunk_size_is_validated_and_clamped(self):
+        with self.assertRaises(ValueError):
+            stream_export('csv', {}, chunk_size=0)
+        with mock.patch('predictor.export.iter_chunks', return_value=iter(())) as chunks:
+            stream_export('csv', {}, chunk_size=10 ** 9)
+        chunks.assert_called_once_with({}, MAX_CHUNK_SIZE)
+
+    def test_date_range_filter(self):
+        self.assertEqual(b''.join(stream_export('ndjson', build_filters(end='2000-01-01'))), b'')
+        with self.assertRaises(ValueError):
+            build_filters(start='yesterday')
+
+    def test_admin_export_endpoint(self):
+        from django.contrib.auth.models import User
+        User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.login(username='admin', password='pw')
+        response = self.client.get('/admin/predictions/export/?format=ndjson&material=Steel')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 13)
+        self.assertEqual(self.client.get('/admin/predictions/export/?format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/admin/predictions/export/?chunk_size=0').status_code, 400)
+
+
+class AnalyticsTests(TestCase):
+    def log(self, when, material, co2, mode='SEA'):
+        entry = PredictionLog.objects.create(product_name='Item', material=material, weight_kg=1.0,
+                                             transport_mode=mode, transport_distance_km=10.0,
+                                             predicted_co2_kg=co2, material_co2=co2 / 2)
+        PredictionLog.objects.filter(pk=entry.pk).update(created_at=when)
+
+    def setUp(self):
+        self.day = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+        self.log(self.day.replace(hour=9), 'Cotton', 2.0)
+        self.log(self.day.replace(hour=9, minute=30), 'Cotton', 4.0, mode='AIR')
+        self.log(self.day.replace(hour=17), 'Cotton', 6.0)
+        self.log(self.day + datetime.timedelta(days=1), 'Steel', 10.0)
+
+    def test_compaction_builds_hourly_and_daily_rollups(self):
+        self.assertEqual(compact_rollups(batch_size=3), 4)
+        self.assertEqual(compact_rollups(), 0)
+        cotton_day = DailyRollup.objects.get(dimension='material', value='Cotton')
+        self.assertEqual((cotton_day.count, cotton_day.sum_co2, cotton_day.min_co2, cotton_day.max_co2),
+                         (3, 12.0, 2.0, 6.0))
+        self.assertEqual(cotton_day.sum_material_co2, 6.0)
+        self.assertEqual(HourlyRollup.objects.filter(dimension='material', value='Cotton').count(), 2)
+        self.assertEqual(DailyRollup.objects.get(dimension='transport_mode', value='SEA', bucket_start=self.day).count, 2)
+
+    def test_query_merges_uncompacted_tail(self):
+        compact_rollups()
+        self.log(self.day.replace(hour=20), 'Cotton', 1.0)
+        result = query_rollups('day', 'material', start=self.day)
+        self.assertEqual(result['totals'][0], dict(result['totals'][0], value='Cotton', count=4, min_co2=1.0))
+        self.assertEqual([(row['value'], row['count']) for row in result['series']], [('Cotton', 4), ('Steel', 1)])
+        self.assertEqual(query_rollups('day', end=self.day + datetime.timedelta(days=1))['totals'][0]['count'], 4)
+
+    def test_end_is_floored_to_the_bucket(self):
+        end = self.day.replace(hour=9, minute=15)
+        before = query_rollups('hour', 'material', end=end)['totals']
+        compact_rollups()
+        self.assertEqual(query_rollups('hour', 'material', end=end)['totals'], before)
+        self.assertEqual(before, [])
+        self.assertEqual(query_rollups('hour', 'material', end=end.replace(hour=10))['totals'][0]['count'], 2)
+
+    def test_quantiles_from_merged_digests(self):
+        compact_rollups()
+        self.log(self.day.replace(hour=21), 'Cotton', 8.0)
+        cotton = query_rollups('hour', 'material', values=['Cotton'], quantiles=(0, 0.5, 1))['totals'][0]
+        self.assertEqual((cotton['p0'], cotton['p100']), (2.0, 8.0))
+        self.assertTrue(2.0 < cotton['p50'] < 8.0)
+
+    def test_analytics_endpoint(self):
+        compact_rollups()
+        response = Client().get('/api/analytics/?granularity=hour&dimension=material&value=Cotton&series=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('series', response.json())
+        self.assertEqual(response.json()['totals'][0]['mean_co2'], 4.0)
+        self.assertEqual(Client().get('/api/analytics/?dimension=product_name').status_code, 400)
+
+
+class TDigestTests(TestCase):
+    QUANTILES = (0.01, 0.1, 0.5, 0.9, 0.99, 0.999)
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # Skewed, multi-modal like real emissions: light goods plus an air-freight tail
+        self.values = np.concatenate([rng.lognormal(1.0, 1.0, 40000), rng.exponential(60.0, 10000)])
+        rng.shuffle(self.values)
+        self.sorted = np.sort(self.values)
+
+    def assertWithinBound(self, digest):
+        for q in self.QUANTILES:
+            rank = np.searchsorted(self.sorted, digest.quantile(q)) / self.sorted.size
+            bound = np.pi * np.sqrt(q * (1 - q)) / digest.compression
+            self.assertLessEqual(abs(rank - q), max(bound, 1e-3), f'q={q}')
+
+    def test_accuracy_against_exact_quantiles(self):
+        digest = TDigest.from_values(self.values)
+        self.assertWithinBound(digest)
+        self.assertEqual((digest.quantile(0), digest.quantile(1)), (self.sorted[0], self.sorted[-1]))
+        self.assertLessEqual(digest.means.size, digest.compression)
+
+    def test_merged_digests_keep_the_bound(self):
+        chunks = np.array_split(self.values, 500)
+        parts = [TDigest.from_values(chunk) for chunk in chunks]
+        self.assertWithinBound(merge_digests(parts))
+        # Folding digests in one at a time, as compaction does across batches
+        chained = TDigest()
+        for part in parts[:100]:
+            chained.merge(part)
+        self.sorted = np.sort(np.concatenate(chunks[:100]))
+        self.assertWithinBound(chained)
+
+    def test_serialization_round_trip(self):
+        digest = TDigest.from_values(self.values)
+        restored = TDigest.from_bytes(digest.to_bytes())
+        self.assertLess(len(digest.to_bytes()), 1024)
+        np.testing.assert_allclose(restored.quantile(self.QUANTILES), digest.quantile(self.QUANTILES))
+        self.assertTrue(np.isnan(TDigest().quantile(0.5)))
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.now = datetime.datetime(2026, 6, 1, tzinfo=datetime.timezone.utc)
+        for days_ago, material in ((400, 'Cotton'), (400, 'Steel'), (380, 'Cotton'), (10, 'Cotton')):
+            AnalyticsTests.log(self, self.now - datetime.timedelta(days=days_ago), material, float(days_ago))
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def test_archives_old_rows_by_day_and_deletes_them(self):
+        archived = archive_predictions(max_age_days=365, batch_size=2, directory=self.directory, now=self.now)
+        self.assertEqual(archived, 3)
+        self.assertEqual(list(PredictionLog.objects.values_list('predicted_co2_kg', flat=True)), [10.0])
+        rows = list(iter_archive(directory=self.directory))
+        self.assertEqual([(row[3], row[7]) for row in rows], [('Cotton', 400.0), ('Steel', 400.0), ('Cotton', 380.0)])
+        # Rollups were compacted before the rows left the table
+        self.assertEqual(query_rollups('day', include_series=False, quantiles=())['totals'][0]['count'], 3)
+
+    def test_rerun_after_a_crash_does_not_duplicate_rows(self):
+        def archived_files():
+            return sorted(name for _, _, names in os.walk(self.directory) for name in names)
+
+        # The first batch reaches the archive, then the DELETE fails
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive_predictions(max_age_days=365, batch_size=3, directory=self.directory, now=self.now)
+        self.assertEqual(PredictionLog.objects.count(), 4)
+        files = archived_files()
+        # A rerun with a different batch size splits the rows differently and skips them all
+        self.assertEqual(archive_predictions(max_age_days=365, batch_size=1, directory=self.directory, now=self.now), 3)
+        self.assertEqual(archived_files(), files)
+        rows = list(iter_archive(directory=self.directory))
+        self.assertEqual(sorted(row[0] for row in rows), sorted(set(row[0] for row in rows)))
+        self.assertEqual([row[7] for row in rows], [400.0, 400.0, 380.0])
+
+    def test_archive_filters_and_export(self):
+        archive_predictions(max_age_days=365, directory=self.directory, now=self.now)
+        start = (self.now - datetime.timedelta(days=390)).date().isoformat()
+        filters = build_filters(start=start, material='Cotton')
+        self.assertEqual([row[7] for row in iter_archive(filters, directory=self.directory)], [380.0])
+        with override_settings(PREDICTOR_RETENTION={'ARCHIVE_DIR': self.directory}):
+            body = b''.join(stream_export('ndjson', build_filters(material='Cotton'), include_archive=True))
+        self.assertEqual([json.loads(line)['predicted_co2_kg'] for line in body.splitlines()], [400.0, 380.0, 10.0])
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        settings_dict = connections.configure_settings({
+            'default': {'ENGINE': 'predictor.sqlite_backend', 'NAME': self.path},
+        })['default']
+        self.wrapper = TunedDatabaseWrapper(settings_dict, 'tuned')
+
+    def tearDown(self):
+        import shutil
+        self.wrapper.close()
+        shutil.rmtree(self.directory)
+
+    def test_connection_pragmas(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    @override_settings(PREDICTOR_SQLITE={'BUSY_TIMEOUT_MS': 0, 'BUSY_RETRIES': 8, 'BUSY_BACKOFF_MS': 5})
+    def test_busy_writes_are_retried(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x INTEGER)')
+        holder = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        holder.execute('BEGIN IMMEDIATE')
+        threading.Timer(0.05, holder.commit).start()
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (%s)', [1])
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 1)
+        holder.close()
+
+
+class FactorRegistryTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def setUp(self):
+        factor_registry.invalidate()
+
+    def tearDown(self):
+        factor_registry.invalidate()
+
+    def manufacturing_co2(self, material='Aluminum', intensity='MEDIUM'):
+        result = self.service.predict(material, 2.0, 'SEA', 1000.0, intensity, engine='analytic')
+        return result['breakdown']['manufacturing_co2']
+
+    def test_breakdown_uses_per_material_multiplier(self):
+        self.assertEqual(self.manufacturing_co2('Aluminum'), round(2.0 * 1.5 * 2.5, 2))
+        self.assertEqual(self.manufacturing_co2('Potatoes', 'LOW'), round(2.0 * 0.5 * 0.5, 2))
+        batch = self.service.predict_batch({
+            'material': np.array(['Aluminum']), 'weight_kg': np.array([2.0]), 'transport_mode': np.array(['SEA']),
+            'transport_distance_km': np.array([1000.0]), 'manufacturing_intensity': np.array(['MEDIUM']),
+        })
+        self.assertEqual(batch['manufacturing_co2'][0], 7.5)
+
+    def test_save_bumps_version_and_reloads_on_commit(self):
+        version = factor_registry.get().version
+        with self.captureOnCommitCallbacks(execute=True):
+            aluminum = MaterialFactor.objects.get(name='Aluminum')
+            aluminum.manufacturing_multiplier = 1.0
+            aluminum.save()
+        self.assertEqual(factor_registry.get().version, version + 1)
+        self.assertEqual(self.manufacturing_co2('Aluminum'), 3.0)
+
+    def test_other_processes_pick_up_changes_after_check_interval(self):
+        factor_registry.get()
+        # Another process: rows and counter change without signals reaching this one
+        TransportFactor.objects.filter(mode='SEA').update(kg_co2_per_kg_per_1000km=1.0)
+        FactorVersion.objects.filter(pk=1).update(version=F('version') + 1)
+        with override_settings(PREDICTOR_FACTORS={'CHECK_INTERVAL_S': 60}), self.assertNumQueries(0):
+            self.assertEqual(factor_registry.get().transport('SEA'), 0.015)
+        with override_settings(PREDICTOR_FACTORS={'CHECK_INTERVAL_S': 0}):
+            self.assertEqual(factor_registry.get().transport('SEA'), 1.0)
+
+    def test_csv_import_upserts_with_one_version_bump(self):
+        version = factor_registry.get().version
+        data = io.StringIO(
+            'name,category,emission_factor_kg_co2_per_kg,manufacturing_multiplier\n'
+            'Cotton,Material,6.0,1.3\n'
+            'Hemp,Material,1.6,0.9\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(import_factors('materials', data), 2)
+        tables = factor_registry.get()
+        self.assertEqual(tables.version, version + 1)
+        self.assertEqual(tables.material('Cotton'), (6.0, 1.3))
+        self.assertEqual(tables.material('Hemp'), (1.6, 0.9))
+        self.assertEqual(MaterialFactor.objects.get(name='Cotton').category, 'Material')
+
+        with self.assertRaisesMessage(ValueError, 'Line 2'):
+            import_factors('transport', io.StringIO('mode,kg_co2_per_kg_per_1000km\nAIR,-1\n'))
+        with self.assertRaisesMessage(ValueError, 'need columns'):
+            import_factors('materials', io.StringIO('name,manufacturing_multiplier\nJute,1.0\n'))
+
+
+class InsightsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def test_training_embeds_insights(self):
+        artifacts, _ = train_model.train_model(train_model.generate_synthetic_dataset(num_samples=300))
+        insights = artifacts['insights']
+        self.assertEqual(insights['n_samples'], 300)
+        self.assertEqual([i['feature'] for i in insights['feature_importances']], artifacts['feature_names'])
+        material_curve = insights['partial_dependence']['Material']
+        self.assertEqual(material_curve['x'], list(artifacts['material_encoder'].classes_))
+        self.assertEqual(len(material_curve['y']), len(material_curve['x']))
+        self.assertEqual(insights['partial_dependence']['Weight']['kind'], 'numeric')
+        # 20% of the samples are held out for the residuals
+        self.assertEqual(sum(sum(g['counts']) for g in insights['residuals']['categories']), 60)
+        self.assertIn({'mode': 'SEA', 'factor': 0.015}, insights['factors']['transport'])
+
+    def test_api_etag_and_cache_lifetimes(self):
+        client = Client()
+        response = client.get('/api/insights/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        etag = response['ETag']
+        version = etag.strip('"')
+        self.assertIn('max-age=3600', response['Cache-Control'])
+        self.assertEqual(client.get('/api/insights/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        versioned = client.get('/api/insights/', {'v': version})
+        self.assertIn('immutable', versioned['Cache-Control'])
+        self.assertContains(client.get('/insights/'), f'?v={version}')
+
+    def test_missing_training_data_degrades(self):
+        artifacts = {k: v for k, v in self.service._model_artifacts.items() if k != 'insights'}
+        CarbonFootprintService.use_artifacts(artifacts)
+        try:
+            with mock.patch('predictor.services.insights_from_training_data', side_effect=FileNotFoundError), \
+                    self.assertLogs('predictor.services', 'ERROR'):
+                self.assertEqual(Client().get('/api/insights/').status_code, 503)
+            page = Client().get('/insights/')
+        finally:
+            CarbonFootprintService.use_artifacts(self.service._model_artifacts)
+        self.assertEqual(page.status_code, 200)
+        self.assertNotContains(page, '/api/insights/?v=')
+
+    def test_build_insights_command_embeds_the_payload(self):
+        artifacts = {k: v for k, v in self.service._model_artifacts.items() if k != 'insights'}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.joblib')
+            joblib.dump(artifacts, path)
+            call_command('build_insights', model=path, stdout=io.StringIO())
+            self.assertIn('feature_importances', joblib.load(path)['insights'])
+
+
+class HTTPCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    PREDICT = {'material': 'Cotton', 'weight_kg': '0.5', 'transport_mode': 'AIR', 'transport_distance_km': '8000'}
+
+    def test_materials_revalidate_without_touching_the_service(self):
+        client = APIClient()
+        response = client.get('/api/materials/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        with mock.patch.object(CarbonFootprintService, 'get_available_materials') as materials:
+            response = client.get('/api/materials/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        materials.assert_not_called()
+
+    def test_model_info_reports_the_etag_version(self):
+        response = APIClient().get('/api/model-info/')
+        self.assertEqual(response['ETag'], f'"{response.json()["model_info"]["version"]}-json"')
+
+    def test_get_predict_etag_follows_inputs(self):
+        client = APIClient()
+        first = client.get('/api/predict/', self.PREDICT)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.json()['success'])
+        self.assertIn('max-age=3600', first['Cache-Control'])
+        self.assertEqual(client.get('/api/predict/', self.PREDICT)['ETag'], first['ETag'])
+        self.assertEqual(client.get('/api/predict/', self.PREDICT, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        other = client.get('/api/predict/', dict(self.PREDICT, weight_kg='0.6'))
+        self.assertNotEqual(other['ETag'], first['ETag'])
+        invalid = client.get('/api/predict/', dict(self.PREDICT, weight_kg='-1'))
+        self.assertEqual(invalid.status_code, 400)
+        self.assertFalse(invalid.has_header('ETag'))
+
+    def test_get_predict_is_not_logged(self):
+        client = APIClient()
+        feed = LiveFeed(8)
+        with mock.patch('predictor.live.get_feed', return_value=feed):
+            self.assertEqual(client.get('/api/predict/', self.PREDICT).status_code, 200)
+        self.assertEqual(PredictionLog.objects.count(), 0)
+        self.assertEqual(feed.ring.next_seq, 0)
+
+    def test_get_predict_without_numbers_is_a_client_error(self):
+        client = APIClient()
+        response = client.get('/api/predict/', {'material': 'Cotton'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Missing required fields')
+        self.assertEqual(client.post('/api/predict/', {'material': 'Cotton', 'weight_kg': [1], 'transport_mode': 'SEA',
+                                                       'transport_distance_km': 10}, format='json').status_code, 400)
+
+    def test_non_finite_numbers_are_a_client_error(self):
+        client = APIClient()
+        for name in ('weight_kg', 'transport_distance_km'):
+            for value in ('nan', 'inf'):
+                response = client.get('/api/predict/', dict(self.PREDICT, **{name: value}))
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(PredictionLog.objects.count(), 0)
+
+    @override_settings(PREDICTOR_HTTP_CACHE={'PREDICT_GET': False})
+    def test_get_predict_can_be_disabled(self):
+        self.assertEqual(APIClient().get('/api/predict/', self.PREDICT).status_code, 405)
+
+    def test_new_model_changes_the_etag(self):
+        client = Client()
+        response = client.get('/')
+        self.assertEqual(client.get('/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        CarbonFootprintService.use_artifacts(self.service._model_artifacts)
+        self.assertEqual(client.get('/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+def mp4_box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = os.path.join(directory.name, 'src')
+        self.root = os.path.join(directory.name, 'root')
+        os.makedirs(os.path.join(self.source, 'css'))
+        os.makedirs(os.path.join(self.source, 'videos'))
+        self.css = ('body { color: #64ffb4; }\n' * 100).encode()
+        with open(os.path.join(self.source, 'css', 'site.css'), 'wb') as f:
+            f.write(self.css)
+        self.video = bytes(range(256)) * 40
+        with open(os.path.join(self.source, 'videos', 'clip.mp4'), 'wb') as f:
+            f.write(self.video)
+        self.settings = override_settings(
+            STATIC_ROOT=self.root, STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'predictor.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+            PREDICTOR_STATIC={'ENABLED': True, 'MAX_AGE': 60, 'COMPRESS_MIN_BYTES': 512},
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as f:
+            self.paths = json.load(f)['paths']
+        self.middleware = StaticAssetMiddleware(lambda request: HttpResponse(status=404))
+        self.factory = RequestFactory()
+
+    def get(self, name, **headers):
+        return self.middleware(self.factory.get('/static/' + name, **headers))
+
+    def test_hashed_assets_are_immutable_and_precompressed(self):
+        response = self.get(self.paths['css/site.css'], HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.css)
+        plain = self.get('css/site.css')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.get('css/site.css', HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+        self.assertEqual(self.get('css/missing.css').status_code, 404)
+
+    def test_byte_ranges(self):
+        name = self.paths['videos/clip.mp4']
+        response = self.get(name, HTTP_RANGE='bytes=100-355')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-355/{len(self.video)}')
+        self.assertEqual(b''.join(response.streaming_content), self.video[100:356])
+        self.assertEqual(b''.join(self.get(name, HTTP_RANGE='bytes=-10').streaming_content), self.video[-10:])
+        self.assertEqual(self.get(name, HTTP_RANGE=f'bytes={len(self.video)}-').status_code, 416)
+        self.assertEqual(self.get(name, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 100))
+
+    def test_faststart_moves_the_index_and_rebases_chunk_offsets(self):
+        ftyp = mp4_box(b'ftyp', b'isom\0\0\0\0')
+        mdat = mp4_box(b'mdat', b'A' * 50 + b'B' * 50)
+        offsets = (len(ftyp) + 8, len(ftyp) + 58)
+        stco = mp4_box(b'stco', struct.pack('>4I', 0, 2, *offsets))
+        moov = mp4_box(b'moov', mp4_box(b'trak', mp4_box(b'mdia', mp4_box(b'minf', mp4_box(b'stbl', stco)))))
+        moved = faststart(ftyp + mdat + moov)
+        self.assertEqual(moved[len(ftyp) + 4:len(ftyp) + 8], b'moov')
+        shifted = struct.unpack_from('>2I', moved, len(ftyp) + 5 * 8 + 16)
+        self.assertEqual(moved[shifted[0]:shifted[0] + 50], b'A' * 50)
+        self.assertEqual(moved[shifted[1]:shifted[1] + 50], b'B' * 50)
+        self.assertEqual(faststart(moved), moved)
+
+
+class FactorTableTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def setUp(self):
+        factor_registry.invalidate()
+
+    def tearDown(self):
+        factor_registry.invalidate()
+
+    def test_table_matches_the_analytic_engine(self):
+        response = Client().get('/api/factors/')
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(response['ETag'], f'"{payload["version"]}"')
+        factors = payload['factors']
+        self.assertEqual(factors['materials'], self.service.get_available_materials())
+        m, t = factors['materials'].index('Aluminum'), factors['transport_modes'].index('SEA')
+        i = factors['intensities'].index('MEDIUM')
+        result = self.service.predict('Aluminum', 2.0, 'SEA', 1000.0, 'MEDIUM', engine='analytic')['breakdown']
+        self.assertEqual(result['material_co2'], round(2.0 * factors['material_factor'][m], 2))
+        self.assertEqual(result['manufacturing_co2'],
+                         round(2.0 * factors['intensity_base'][i] * factors['manufacturing_multiplier'][m], 2))
+        self.assertEqual(result['transport_co2'], round(2.0 * factors['transport_factor'][t], 2))
+
+    def test_version_follows_factor_edits(self):
+        client = Client()
+        version = client.get('/api/factors/').json()['version']
+        versioned = client.get('/api/factors/', {'v': version})
+        self.assertIn('immutable', versioned['Cache-Control'])
+        self.assertEqual(client.get('/api/factors/', HTTP_IF_NONE_MATCH=f'"{version}"').status_code, 304)
+        self.assertContains(client.get('/'), f'data-factors-version="{version}"')
+        with self.captureOnCommitCallbacks(execute=True):
+            TransportFactor.objects.filter(mode='SEA').update(kg_co2_per_kg_per_1000km=0.02)
+            bump_version()
+        self.assertNotEqual(client.get('/api/factors/').json()['version'], version)
+
+    def test_seeded_dataset_matches_the_committed_training_data(self):
+        reference = pd.read_csv(os.path.join(os.path.dirname(__file__), 'training', 'training_data.csv'), nrows=50)
+        np.random.seed(42)
+        df = train_model.generate_synthetic_dataset(num_samples=50)
+        columns = ['material', 'weight_kg', 'transport_mode', 'transport_distance_km', 'manufacturing_intensity',
+                   'total_co2_kg']
+        self.assertTrue(df[columns].equals(reference[columns]))
+
+
+class LiveFeedTests(TestCase):
+    def test_ring_keeps_the_newest_entries(self):
+        ring = RingBuffer(3)
+        for i in range(5):
+            ring.append(i)
+        self.assertEqual(ring.since(-1), [(2, 2), (3, 3), (4, 4)])
+        self.assertEqual(ring.since(3), [(4, 4)])
+        self.assertEqual(ring.since(4), [])
+
+    def test_stream_resumes_after_last_event_id(self):
+        feed = LiveFeed(8)
+        stream = feed.stream(feed.start_position(None, 20), heartbeat=0.01, max_duration=0.2)
+        self.assertEqual(next(stream), 'retry: 2000\n\n')
+        feed.publish({'material': 'Cotton'})
+        event = next(stream)
+        self.assertIn('data: {"material":"Cotton"}', event)
+        last_id = event.split('\n')[0][len('id: '):]
+
+        feed.publish({'material': 'Wool'})
+        resumed = list(feed.stream(feed.start_position(last_id, 20), heartbeat=0.01, max_duration=0.05))
+        self.assertIn('data: {"material":"Wool"}', resumed[1])
+        self.assertTrue(all('Cotton' not in event for event in resumed))
+        self.assertEqual(feed.start_position('other-0', 1), 0)
+
+    def test_workers_share_entries_over_sockets(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = LiveFeed(8, directory), LiveFeed(8, directory)
+            try:
+                first.publish({'material': 'Cotton'})
+                self.assertTrue(second.wait(-1, 5))
+                self.assertEqual(second.ring.since(-1), [(0, ('{"material":"Cotton"}', False))])
+            finally:
+                first.close()
+                second.close()
+
+    def test_predictions_are_streamed(self):
+        get_test_service()
+        response = Client().get('/api/live/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.client.post('/api/predict/', PredictViewTests.payload, content_type='application/json')
+        events = response.streaming_content
+        self.assertEqual(next(events), b'retry: 2000\n\n')
+        data = json.loads(next(events).decode().split('data: ')[1])
+        self.assertEqual((data['material'], data['engine']), ('Cotton', 'model'))
+        self.assertNotIn('product_name', data)
+        response.close()
+
+    async def test_asgi_streams_events_before_the_stream_ends(self):
+        feed = LiveFeed(8)
+        with mock.patch('predictor.views.get_feed', return_value=feed):
+            response = await self.async_client.get('/api/live/')
+        self.assertTrue(response.is_async)
+        self.assertEqual(feed.subscribers, 1)
+        events = aiter(response.streaming_content)
+        self.assertEqual(await asyncio.wait_for(anext(events), 5), b'retry: 2000\n\n')
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.01)
+        feed.publish({'material': 'Wool'})
+        # Arrives while the stream (MAX_STREAM_S=300) is still open
+        self.assertIn(b'"material":"Wool"', await asyncio.wait_for(pending, 5))
+        await sync_to_async(response.close)()
+        self.assertEqual(feed.subscribers, 0)
+
+    def test_streams_per_worker_are_capped(self):
+        with override_settings(PREDICTOR_LIVE={'MAX_SUBSCRIBERS': 1}):
+            client = Client()
+            first = client.get('/api/live/')
+            refused = client.get('/api/live/')
+            self.assertEqual(refused.status_code, 503)
+            self.assertIn('Retry-After', refused)
+            # Closing a stream (here never iterated) frees its slot
+            first.close()
+            again = client.get('/api/live/')
+            self.assertEqual(again.status_code, 200)
+            again.close()
+
+    @override_settings(PREDICTOR_LIVE={'ENABLED': False})
+    def test_disabled_feed_is_not_found(self):
+        self.assertEqual(Client().get('/api/live/').status_code, 404)
+
+
+class DriftMonitorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = get_test_service()
+
+    def setUp(self):
+        # A fresh window for each test
+        self.service._drift_cache = None
+
+    def monitor(self):
+        # Artifacts trained before drift references get one from the training data
+        reference = self.service._drift_monitor().reference
+        return DriftMonitor(reference, self.service._model_artifacts['transport_encoder'].classes_)
+
+    def test_inputs_outside_the_training_range_are_flagged(self):
+        response = self.client.post('/api/predict/', dict(PredictViewTests.payload, weight_kg=500),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['drift']['out_of_range'], ['weight_kg'])
+        result = self.service.predict('Cotton', 1.0, 'ROAD', 10000.0)
+        self.assertEqual(result['drift'], {'flagged': True, 'out_of_range': ['transport_distance_km'], 'drifting': []})
+        self.assertFalse(self.service.predict('Cotton', 1.0, 'SEA', 10000.0)['drift']['flagged'])
+
+        batch = self.service.predict_batch({
+            'material': ['Cotton', 'Cotton', 'Cotton'], 'weight_kg': [1.0, 500.0, 1.0],
+            'transport_mode': ['SEA', 'SEA', 'ROAD'], 'transport_distance_km': [10000.0, 10000.0, 10000.0],
+        })
+        self.assertEqual(batch['drift_flagged'].tolist(), [False, True, True])
+
+    def test_shifted_traffic_is_scored_as_drifting(self):
+        monitor = self.monitor()
+        sea = list(self.service._model_artifacts['transport_encoder'].classes_).index('SEA')
+        for i in range(300):
+            monitor.observe(0, 200.0 + i, sea, 10000.0, 1)
+        monitor.score(min_samples=200, decay=0.5)
+        self.assertIn('weight_kg', monitor.drifting)
+        self.assertGreater(monitor.psi['weight_kg'], 1.0)
+        self.assertAlmostEqual(monitor.ks['weight_kg'], 1.0)
+        self.assertEqual(monitor.out_of_range['weight_kg'], 150.0)
+
+        # Too few inputs left in the window to judge
+        monitor.score(min_samples=200)
+        self.assertEqual(monitor.drifting, ())
+
+    def test_forked_worker_gets_its_own_scored_monitor(self):
+        from . import drift, services
+        parent = self.service._drift_monitor()
+        with mock.patch('predictor.drift._scorer', None):
+            # What the after_in_child hooks run in a forked worker
+            drift._reset_after_fork()
+            services._reset_after_fork()
+            child = self.service._drift_monitor()
+            self.assertIsNot(child, parent)
+            self.assertIs(drift._monitor, child)
+            self.assertIsNotNone(drift._scorer)
+
+    def test_missing_reference_disables_monitoring(self):
+        artifacts = {k: v for k, v in self.service._model_artifacts.items() if k != 'drift'}
+        with mock.patch('predictor.drift.reference_from_training_data', side_effect=FileNotFoundError), \
+                self.assertLogs('predictor.services', 'ERROR'):
+            self.service._model_artifacts = artifacts
+            try:
+                result = self.service.predict('Cotton', 1.0, 'SEA', 10000.0)
+                batch = self.service.predict_batch({
+                    'material': ['Cotton'], 'weight_kg': [1.0], 'transport_mode': ['SEA'],
+                    'transport_distance_km': [10000.0],
+                })
+            finally:
+                CarbonFootprintService.use_artifacts(self.service._model_artifacts)
+        self.assertTrue(result['success'])
+        self.assertNotIn('drift', result)
+        self.assertNotIn('drift_flagged', batch)
+
+    def test_drift_is_exposed_on_the_metrics_endpoint(self):
+        monitor = self.service._drift_monitor()
+        for _ in range(200):
+            self.service.predict('Cotton', 900.0, 'AIR', 5000.0)
+        monitor.score(min_samples=200)
+        body = Client().get('/api/metrics/').content.decode()
+        self.assertIn('predictor_drift_out_of_range_total{feature="weight_kg"}', body)
+        self.assertRegex(body, r'predictor_drift_psi\{feature="weight_kg",pid="\d+"\} \d')
+        self.assertIn('weight_kg', self.service.predict('Cotton', 900.0, 'AIR', 5000.0)['drift']['drifting'])
+
+
+class ShardedModelTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.previous = get_test_service()._model_artifacts
+        cls.artifacts, cls.df = train_model.train_model(
+            train_model.generate_synthetic_dataset(num_samples=400), grouping='kind')
+        cls.service = CarbonFootprintService.use_artifacts(cls.artifacts)
+
+    @classmethod
+    def tearDownClass(cls):
+        CarbonFootprintService.use_artifacts(cls.previous)
+        super().tearDownClass()
+
+    def test_rows_are_routed_by_material_group(self):
+        model = self.artifacts['model']
+        self.assertIsInstance(model, ShardedRegressor)
+        self.assertEqual(model.names, ['food', 'manufactured'])
+        materials = list(self.artifacts['material_encoder'].classes_)
+        cotton, beef = materials.index('Cotton'), materials.index('Beef')
+        self.assertIsNot(model.route(cotton), model.route(beef))
+
+        X = np.array([[beef, 2.0, 0, 8000.0, 1], [cotton, 0.5, 1, 500.0, 0], [beef, 1.0, 2, 100.0, 2]])
+        expected = [model.route(row[0]).predict(row[np.newaxis])[0] for row in X]
+        np.testing.assert_allclose(model.predict(X), expected)
+        self.assertAlmostEqual(model.feature_importances_.sum(), 1.0)
+
+    def test_single_and_batch_predictions_agree(self):
+        result = self.service.predict('Beef', 2.0, 'AIR', 8000.0, 'HIGH')
+        batch = self.service.predict_batch({
+            'material': ['Cotton', 'Beef'], 'weight_kg': [0.5, 2.0], 'transport_mode': ['SEA', 'AIR'],
+            'transport_distance_km': [10000.0, 8000.0], 'manufacturing_intensity': ['LOW', 'HIGH'],
+        })
+        self.assertEqual(batch['co2_kg'][1], result['co2_kg'])
+        self.assertEqual(self.artifacts['grouping'], 'kind')
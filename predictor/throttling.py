@@ -0,0 +1,213 @@
+"""
+Per-client token-bucket throttling for the predictor API
+Buckets live in process memory so a decision is a dict lookup and a few
+float operations; an optional shared tier on Django's cache framework
+caps a client across worker processes
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+
+def _config():
+    return getattr(settings, 'PREDICTOR_THROTTLE', {})
+
+
+class TokenBucketRegistry:
+    """
+    LRU map of client key -> [tokens, last refill time]
+
+    Buckets idle long enough to have refilled completely are evicted, as
+    are the least recently used ones beyond max_buckets, so memory stays
+    bounded as client keys come and go.
+    """
+
+    def __init__(self, rate, capacity, max_buckets=10000, idle_seconds=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.max_buckets = max_buckets
+        # A bucket idle for capacity / rate seconds is full again, i.e. no
+        # different from a fresh one, so it is safe to forget
+        self.idle_seconds = idle_seconds if idle_seconds is not None else capacity / rate
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def consume(self, key, cost=1, now=None):
+        """
+        Take cost tokens from key's bucket
+
+        A request larger than the bucket is admitted when the bucket is
+        full and leaves it in debt, so oversized batches are slowed down
+        rather than refused forever.
+
+        Returns:
+            (allowed, remaining tokens, seconds until the request would fit)
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.capacity, now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            needed = min(cost, self.capacity)
+            if bucket[0] >= needed:
+                bucket[0] -= cost
+                allowed, wait = True, 0.0
+            else:
+                allowed, wait = False, (needed - bucket[0]) / self.rate
+            remaining = bucket[0]
+
+            self._evict(now)
+        return allowed, remaining, wait
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while len(buckets) > self.max_buckets:
+            buckets.popitem(last=False)
+        # Oldest-first order means we can stop at the first active bucket
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest[1] < self.idle_seconds:
+                break
+            buckets.popitem(last=False)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_bucket_registry():
+    """Process-wide bucket registry configured from PREDICTOR_THROTTLE"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                config = _config()
+                _registry = TokenBucketRegistry(
+                    rate=config.get('RATE', 1000),
+                    capacity=config.get('BURST', 10000),
+                    max_buckets=config.get('MAX_BUCKETS', 10000),
+                    idle_seconds=config.get('IDLE_SECONDS'),
+                )
+    return _registry
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Cost-weighted throttle keyed by X-API-Key when the key is one of
+    PREDICTOR_THROTTLE['API_KEYS'], by client IP otherwise (an unchecked
+    key would let a client pick a fresh bucket per request). The IP is
+    REMOTE_ADDR unless NUM_PROXIES trusted proxies append to
+    X-Forwarded-For, for the same reason.
+
+    Views may define get_throttle_cost(request); batch endpoints charge
+    one token per row. The decision is recorded on the request as
+    rate_limit so RateLimitHeadersMixin can emit X-RateLimit-* headers.
+    """
+
+    def get_client_key(self, request):
+        api_key = request.META.get('HTTP_X_API_KEY')
+        if api_key and api_key in _config().get('API_KEYS', ()):
+            return f'key:{api_key}'
+        return f'ip:{self.get_client_ip(request)}'
+
+    def get_client_ip(self, request):
+        """The address the outermost of NUM_PROXIES trusted proxies saw, else REMOTE_ADDR"""
+        num_proxies = _config().get('NUM_PROXIES', 0)
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if num_proxies and forwarded:
+            # Entries left of the ones our proxies appended are client-supplied
+            addrs = [addr.strip() for addr in forwarded.split(',')]
+            return addrs[-min(num_proxies, len(addrs))]
+        return request.META.get('REMOTE_ADDR', '')
+
+    def allow_request(self, request, view):
+        config = _config()
+        if not config.get('ENABLED', True):
+            return True
+
+        key = self.get_client_key(request)
+        cost = view.get_throttle_cost(request) if hasattr(view, 'get_throttle_cost') else 1
+        registry = get_bucket_registry()
+        allowed, remaining, self._wait = registry.consume(key, cost)
+
+        if allowed and config.get('SHARED_LIMIT_PER_MINUTE'):
+            allowed, self._wait = self._consume_shared(key, cost, config)
+
+        request.rate_limit = {
+            'limit': int(registry.capacity),
+            'remaining': max(int(remaining), 0),
+            'reset': math.ceil((registry.capacity - remaining) / registry.rate),
+        }
+        return allowed
+
+    def _consume_shared(self, key, cost, config):
+        """Fixed one-minute window counter in the configured cache (never the DB by default)"""
+        cache = caches[config.get('SHARED_CACHE', 'default')]
+        if isinstance(cache, LocMemCache):
+            raise ImproperlyConfigured(
+                "PREDICTOR_THROTTLE['SHARED_LIMIT_PER_MINUTE'] needs a SHARED_CACHE shared by all workers "
+                "(e.g. Redis or Memcached); a local-memory cache would count per process"
+            )
+        window = int(time.time() // 60)
+        cache_key = f'predictor-throttle:{key}:{window}'
+        cache.add(cache_key, 0, timeout=120)
+        used = cache.incr(cache_key, cost)
+        if used > config['SHARED_LIMIT_PER_MINUTE']:
+            return False, 60 - time.time() % 60
+        return True, 0.0
+
+    def wait(self):
+        return self._wait
+
+
+def add_rate_limit_headers(request, response):
+    """X-RateLimit-* headers from the throttle decision recorded on request"""
+    rate_limit = getattr(request, 'rate_limit', None)
+    if rate_limit:
+        response['X-RateLimit-Limit'] = str(rate_limit['limit'])
+        response['X-RateLimit-Remaining'] = str(rate_limit['remaining'])
+        response['X-RateLimit-Reset'] = str(rate_limit['reset'])
+    return response
+
+
+def check_throttle(request, view=None):
+    """
+    TokenBucketThrottle for plain Django views
+
+    Returns:
+        None when the request is allowed, otherwise a 429 JsonResponse
+        with Retry-After
+    """
+    throttle = TokenBucketThrottle()
+    if throttle.allow_request(request, view):
+        return None
+    response = JsonResponse({
+        'success': False,
+        'error': 'Rate limit exceeded, please retry later'
+    }, status=429)
+    response['Retry-After'] = str(max(math.ceil(throttle.wait()), 1))
+    return add_rate_limit_headers(request, response)
+
+
+class RateLimitHeadersMixin:
+    """Add X-RateLimit-* headers from the throttle decision"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return add_rate_limit_headers(request, response)
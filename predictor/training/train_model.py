@@ -14,74 +14,18 @@ import os
 # Set random seed for reproducibility
 np.random.seed(42)
 
-# ====== EMISSION FACTORS (Based on IPCC/EPA Guidelines) ======
+# Emission factors come from the core factor tables (predictor.factors);
+# this script only decides how the synthetic products are sampled
 
-MATERIAL_FACTORS = {
-    # Manufacturing Materials: (kg CO2e per kg, manufacturing intensity multiplier)
-    'Cotton': (5.5, 1.3),
-    'Polyester': (6.2, 1.5),
-    'Wool': (10.4, 1.4),
-    'Leather': (17.0, 2.0),
-    'Steel': (2.8, 1.8),
-    'Aluminum': (8.2, 2.5),
-    'Plastic': (3.5, 1.6),
-    'Glass': (0.9, 1.2),
-    'Paper': (1.3, 1.0),
-    'Wood': (0.5, 0.8),
-    
-    # Animal Products (High Emissions - Scientific Research Data)
-    'Beef': (27.0, 1.2),           # Ruminant livestock - very high methane
-    'Lamb': (24.0, 1.2),           # Ruminant livestock
-    'Pork': (12.1, 1.1),           # Monogastric - lower than ruminants
-    'Chicken': (6.9, 1.0),         # Most efficient meat
-    'Turkey': (10.9, 1.0),         # Poultry
-    
-    # Seafood
-    'Fish_Farmed': (5.1, 0.9),     # Aquaculture
-    'Fish_Wild': (2.9, 0.8),       # Wild-caught (fuel for boats)
-    'Shrimp': (18.0, 1.3),         # High emissions from farming
-    
-    # Dairy & Eggs
-    'Milk': (1.9, 0.7),            # Dairy cows
-    'Cheese': (13.5, 1.0),         # Concentrated dairy product
-    'Eggs': (4.8, 0.9),            # Chickens
-    'Butter': (12.0, 0.9),         # High fat dairy
-    
-    # Plant-Based Proteins
-    'Tofu': (2.0, 0.8),            # Soy-based
-    'Lentils': (0.9, 0.6),         # Legumes - carbon sequestering
-    'Beans': (1.0, 0.6),           # Legumes
-    'Nuts': (2.3, 0.7),            # Tree nuts
-    
-    # Grains & Staples
-    'Rice': (4.0, 0.8),            # Methane from paddies
-    'Wheat': (1.4, 0.7),           # Grains
-    'Oats': (1.6, 0.7),            # Grains
-    'Corn': (1.1, 0.7),            # Maize
-    
-    # Vegetables & Fruits
-    'Tomatoes': (2.1, 0.6),        # Greenhouse heating
-    'Potatoes': (0.5, 0.5),        # Low emissions
-    'Lettuce': (0.9, 0.5),         # Leafy greens
-    'Apples': (0.4, 0.5),          # Fruit
-    'Bananas': (0.7, 0.5),         # Tropical fruit
+# Transport mode sampling probabilities
+TRANSPORT_MIX = {
+    'AIR': 0.1,
+    'SEA': 0.3,
+    'ROAD': 0.45,
+    'RAIL': 0.15,
 }
 
-TRANSPORT_FACTORS = {
-    # Mode: kg CO2e per kg per 1000 km
-    'AIR': 0.95,
-    'SEA': 0.015,
-    'ROAD': 0.12,
-    'RAIL': 0.025,
-}
-
-MANUFACTURING_BASE = {
-    'LOW': 0.5,      # Assembly, packaging
-    'MEDIUM': 1.5,   # Standard manufacturing
-    'HIGH': 3.5,     # Smelting, chemical processing
-}
-
-def calculate_carbon_footprint(material, weight_kg, transport_mode, distance_km, manufacturing_intensity):
+def calculate_carbon_footprint(material, weight_kg, transport_mode, distance_km, manufacturing_intensity, factors):
     """
     Calculate total carbon footprint based on LCA principles
     
@@ -89,15 +33,15 @@ def calculate_carbon_footprint(material, weight_kg, transport_mode, distance_km,
     Total CO2e = Material Emissions + Manufacturing Emissions + Transport Emissions
     """
     # Material emissions
-    material_factor, mfg_multiplier = MATERIAL_FACTORS[material]
+    material_factor, mfg_multiplier = factors.material(material)
     material_co2 = weight_kg * material_factor
     
     # Manufacturing emissions
-    mfg_base = MANUFACTURING_BASE[manufacturing_intensity]
+    mfg_base = factors.intensity(manufacturing_intensity)
     manufacturing_co2 = weight_kg * mfg_base * mfg_multiplier
     
     # Transport emissions
-    transport_factor = TRANSPORT_FACTORS[transport_mode]
+    transport_factor = factors.transport(transport_mode)
     transport_co2 = weight_kg * (distance_km / 1000) * transport_factor
     
     total_co2 = material_co2 + manufacturing_co2 + transport_co2
@@ -109,13 +53,18 @@ def calculate_carbon_footprint(material, weight_kg, transport_mode, distance_km,
         'transport': transport_co2
     }
 
-def generate_synthetic_dataset(num_samples=5000):
-    """Generate realistic synthetic training data"""
+def generate_synthetic_dataset(num_samples=5000, factors=None):
+    """Generate realistic synthetic training data from the factor tables"""
+    from predictor.factors import load_tables  # needs Django set up (see __main__)
+    
+    factors = factors or load_tables()
     data = []
     
-    materials = list(MATERIAL_FACTORS.keys())
-    transport_modes = list(TRANSPORT_FACTORS.keys())
-    intensities = list(MANUFACTURING_BASE.keys())
+    materials = factors.materials
+    transport_modes = [mode for mode in TRANSPORT_MIX if mode in factors.transport_modes]
+    transport_p = np.array([TRANSPORT_MIX[mode] for mode in transport_modes])
+    transport_p /= transport_p.sum()
+    intensities = factors.intensities
     
     for i in range(num_samples):
         # Realistic distributions
@@ -123,7 +72,7 @@ def generate_synthetic_dataset(num_samples=5000):
         weight = np.random.lognormal(0.5, 1.2)  # Most products 0.1-10 kg
         weight = np.clip(weight, 0.05, 100)
         
-        transport_mode = np.random.choice(transport_modes, p=[0.1, 0.3, 0.45, 0.15])
+        transport_mode = np.random.choice(transport_modes, p=transport_p)
         
         # Distance varies by transport mode
         if transport_mode == 'AIR':
@@ -151,7 +100,7 @@ def generate_synthetic_dataset(num_samples=5000):
             intensity = np.random.choice(intensities)
         
         # Calculate carbon footprint
-        footprint = calculate_carbon_footprint(material, weight, transport_mode, distance, intensity)
+        footprint = calculate_carbon_footprint(material, weight, transport_mode, distance, intensity, factors)
         
         # Add realistic noise (±5%)
         noise_factor = np.random.normal(1.0, 0.05)
@@ -171,8 +120,11 @@ def generate_synthetic_dataset(num_samples=5000):
     
     return pd.DataFrame(data)
 
-def train_model(df):
-    """Train Random Forest model"""
+def train_model(df, grouping=None):
+    """
+    Train the Random Forest model, or with grouping ('category' or 'kind')
+    one smaller forest per material group (see predictor.sharding)
+    """
     print("🌍 Training Carbon Footprint Prediction Model...")
     print(f"Dataset size: {len(df)} samples\n")
     
@@ -192,17 +144,24 @@ def train_model(df):
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # Train Random Forest
-    model = RandomForestRegressor(
-        n_estimators=150,
-        max_depth=20,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42,
-        n_jobs=-1
-    )
-    
-    model.fit(X_train, y_train)
+    if grouping:
+        # One shard per material group, routed by material code
+        from predictor.sharding import ShardedRegressor, material_groups
+        model = ShardedRegressor.fit(X_train, y_train, material_groups(le_material.classes_, grouping))
+        print(f"Shards ({grouping}): " + ", ".join(
+            f"{name} ({n} rows)" for name, n in zip(model.names, model.n_samples)) + "\n")
+    else:
+        # Train Random Forest
+        model = RandomForestRegressor(
+            n_estimators=150,
+            max_depth=20,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42,
+            n_jobs=-1
+        )
+        
+        model.fit(X_train, y_train)
     
     # Evaluate
     y_pred_train = model.predict(X_train)
@@ -234,6 +193,7 @@ def train_model(df):
         'transport_encoder': le_transport,
         'intensity_encoder': le_intensity,
         'feature_names': feature_names,
+        'grouping': grouping,
         'metrics': {
             'r2_score': test_r2,
             'rmse': test_rmse,
@@ -241,9 +201,17 @@ def train_model(df):
         }
     }
     
+    # Precomputed /insights/ data: importances, partial dependence, held-out residuals
+    from predictor.insights import build_insights
+    model_artifacts['insights'] = build_insights(model_artifacts, X_test.to_numpy(), y_test.to_numpy(), len(df))
+    
+    # Training input histograms and ranges for the drift monitor
+    from predictor.drift import build_reference
+    model_artifacts['drift'] = build_reference(model_artifacts, df.loc[X_train.index])
+    
     return model_artifacts, df
 
-def main():
+def main(grouping=None):
     print("=" * 60)
     print("  CARBON FOOTPRINT ML MODEL TRAINING")
     print("=" * 60)
@@ -261,7 +229,7 @@ def main():
     print(f"  CO2 Median: {df['total_co2_kg'].median():.2f} kg\n")
     
     # Train model
-    model_artifacts, df = train_model(df)
+    model_artifacts, df = train_model(df, grouping)
     
     # Save model
     output_path = os.path.join('predictor', 'ml_models', 'carbon_model.joblib')
@@ -278,4 +246,17 @@ def main():
     print("=" * 60)
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    import sys
+    
+    import django
+    
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sharded', nargs='?', const='category', choices=('category', 'kind'),
+                        help='Train one smaller forest per material category (or per kind: food/manufactured)')
+    args = parser.parse_args()
+    
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_project.settings')
+    django.setup()
+    main(args.sharded)
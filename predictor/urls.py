@@ -1,8 +1,20 @@
 from django.urls import path
-from .views import PredictCarbonFootprintView, GetMaterialsView, ModelInfoView
+from .views import PredictCarbonFootprintView, BatchPredictView, GetMaterialsView, ModelInfoView, AnalyticsView, ServiceStatsView, factors_view, insights_view, live_view, metrics_view
+from .async_views import AsyncPredictView, AsyncMaterialsView, AsyncModelInfoView
 
 urlpatterns = [
     path('predict/', PredictCarbonFootprintView.as_view(), name='predict'),
+    path('predict/batch/', BatchPredictView.as_view(), name='predict_batch'),
     path('materials/', GetMaterialsView.as_view(), name='materials'),
     path('model-info/', ModelInfoView.as_view(), name='model_info'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('insights/', insights_view, name='insights_api'),
+    path('factors/', factors_view, name='factors_api'),
+    path('stats/', ServiceStatsView.as_view(), name='service_stats'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('live/', live_view, name='live'),
+    # Native async variants for ASGI deployments
+    path('async/predict/', AsyncPredictView.as_view(), name='async_predict'),
+    path('async/materials/', AsyncMaterialsView.as_view(), name='async_materials'),
+    path('async/model-info/', AsyncModelInfoView.as_view(), name='async_model_info'),
 ]
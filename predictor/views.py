@@ -1,18 +1,159 @@
+import math
+import time
+from collections.abc import Mapping
+
+import numpy as np
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import JsonResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from .services import CarbonFootprintService
+from .columnar import COLUMNAR_PARSERS, COLUMNAR_RENDERERS, columns_from_data
+from .admission import DEGRADE, SHED, get_admission_controller
+from .throttling import RateLimitHeadersMixin, TokenBucketThrottle, add_rate_limit_headers, check_throttle
+from .analytics import DEFAULT_QUANTILES, query_rollups
+from .export import build_filters
+from .http_cache import api_etag, conditional_get, predict_etag
+from .live import get_feed, publish as publish_live
+from .metrics import ADMISSION, BATCH_ROWS, STAGE_SECONDS, record_response, render_prometheus
 from core.models import PredictionLog
 
 
-class PredictCarbonFootprintView(APIView):
+def parse_prediction_input(data):
+    """
+    Extract and validate /api/predict/ parameters
+    
+    Returns:
+        (params, error) - params holds product_name plus the
+        CarbonFootprintService.predict kwargs; error is a message or None
+    
+    Raises:
+        ValueError when data is not an object or weight or distance is not numeric
+    """
+    if not isinstance(data, Mapping):
+        raise ValueError('Request body must be a JSON object')
+    try:
+        weight_kg = float(data.get('weight_kg'))
+        transport_distance_km = float(data.get('transport_distance_km'))
+    except TypeError:
+        # float(None) for an absent field (or a list/object): a client error
+        if data.get('weight_kg') is None or data.get('transport_distance_km') is None:
+            return {}, 'Missing required fields'
+        raise ValueError('weight_kg and transport_distance_km must be numbers')
+    
+    params = {
+        'product_name': data.get('product_name', 'Unknown Product'),
+        'material': data.get('material'),
+        'weight_kg': weight_kg,
+        'transport_mode': data.get('transport_mode'),
+        'transport_distance_km': transport_distance_km,
+        'manufacturing_intensity': data.get('manufacturing_intensity', 'MEDIUM'),
+    }
+    
+    # Validate required fields
+    if not all([params['material'], params['weight_kg'], params['transport_mode'], params['transport_distance_km']]):
+        return params, 'Missing required fields'
+    
+    # Validate ranges (NaN fails every comparison, so it is rejected explicitly)
+    if not math.isfinite(params['weight_kg']) or not math.isfinite(params['transport_distance_km']):
+        return params, 'Weight and distance must be finite numbers'
+    
+    if params['weight_kg'] <= 0 or params['weight_kg'] > 1000:
+        return params, 'Weight must be between 0 and 1000 kg'
+    
+    if params['transport_distance_km'] < 0 or params['transport_distance_km'] > 50000:
+        return params, 'Distance must be between 0 and 50000 km'
+    
+    return params, None
+
+
+def prediction_log_fields(product_name, params, result):
+    """PredictionLog fields for a successful prediction"""
+    return {
+        'product_name': product_name,
+        'material': params['material'],
+        'weight_kg': params['weight_kg'],
+        'transport_mode': params['transport_mode'],
+        'transport_distance_km': params['transport_distance_km'],
+        'predicted_co2_kg': result['co2_kg'],
+        'material_co2': result['breakdown']['material_co2'],
+        'manufacturing_co2': result['breakdown']['manufacturing_co2'],
+        'transport_co2': result['breakdown']['transport_co2'],
+        'trees_to_offset': result['compensation']['trees_per_year'],
+    }
+
+
+class PredictCarbonFootprintView(RateLimitHeadersMixin, APIView):
     """API endpoint for carbon footprint prediction"""
+    throttle_classes = [TokenBucketThrottle]
     
     def post(self, request):
         """
         POST /api/predict/
         
+        Requests pass admission control first: when the expected wait
+        exceeds PREDICTOR_ADMISSION['LATENCY_BUDGET_MS'] they get a fast 503
+        with Retry-After, or the analytic engine if DEGRADE is set.
+        """
+        started = time.perf_counter()
+        response = self._admit(request)
+        STAGE_SECONDS.observe('total', time.perf_counter() - started)
+        record_response('predict', response.status_code)
+        return response
+    
+    @method_decorator(conditional_get(predict_etag, 'PREDICT_MAX_AGE', vary=('Accept',)))
+    def get(self, request):
+        """
+        GET /api/predict/?material=Cotton&weight_kg=0.5&transport_mode=AIR&transport_distance_km=8000
+        
+        Cacheable form of POST (same parameters as query string). Identical
+        inputs share an ETag until the model or the emission factors change.
+        A GET is a read: it is neither logged to PredictionLog nor published
+        to the live feed, so caches and crawlers can't inflate the analytics.
+        """
+        if not getattr(settings, 'PREDICTOR_HTTP_CACHE', {}).get('PREDICT_GET', True):
+            return self.http_method_not_allowed(request)
+        response = self.post(request)
+        if response.status_code == 200 and response.data.get('engine') != 'model':
+            # A degraded answer must not be cached under the model's ETag
+            patch_cache_control(response, no_store=True)
+        return response
+    
+    def _admit(self, request):
+        """Run admission control, then predict"""
+        admission = get_admission_controller()
+        if admission is None:
+            return self._predict(request)
+        
+        decision = admission.acquire()
+        ADMISSION.inc(decision)
+        if decision == SHED:
+            response = Response({
+                'success': False,
+                'error': 'Server overloaded, please retry later'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(admission.retry_after())
+            return response
+        
+        # Only model-engine service times feed the p95 estimate
+        engine = 'analytic' if decision == DEGRADE else 'model'
+        started = time.perf_counter()
+        try:
+            return self._predict(request, engine=engine)
+        finally:
+            admission.release(time.perf_counter() - started if engine == 'model' else None)
+    
+    def _predict(self, request, engine='model'):
+        """
+        Validate, predict and (for POST) log one request
+        
         Body:
         {
             "product_name": "Cotton T-Shirt",
@@ -22,66 +163,37 @@ class PredictCarbonFootprintView(APIView):
             "transport_distance_km": 8000,
             "manufacturing_intensity": "MEDIUM" (optional)
         }
+        (query string parameters for GET)
         """
         try:
-            # Extract parameters
-            product_name = request.data.get('product_name', 'Unknown Product')
-            material = request.data.get('material')
-            weight_kg = float(request.data.get('weight_kg'))
-            transport_mode = request.data.get('transport_mode')
-            transport_distance_km = float(request.data.get('transport_distance_km'))
-            manufacturing_intensity = request.data.get('manufacturing_intensity', 'MEDIUM')
-            
-            # Validate required fields
-            if not all([material, weight_kg, transport_mode, transport_distance_km]):
+            # Extract and validate parameters
+            t0 = time.perf_counter()
+            params, error = parse_prediction_input(request.query_params if request.method == 'GET' else request.data)
+            STAGE_SECONDS.observe('validate', time.perf_counter() - t0)
+            if error:
                 return Response({
                     'success': False,
-                    'error': 'Missing required fields'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Validate ranges
-            if weight_kg <= 0 or weight_kg > 1000:
-                return Response({
-                    'success': False,
-                    'error': 'Weight must be between 0 and 1000 kg'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if transport_distance_km < 0 or transport_distance_km > 50000:
-                return Response({
-                    'success': False,
-                    'error': 'Distance must be between 0 and 50000 km'
+                    'error': error
                 }, status=status.HTTP_400_BAD_REQUEST)
+            product_name = params.pop('product_name')
             
             # Get prediction
             service = CarbonFootprintService()
-            result = service.predict(
-                material=material,
-                weight_kg=weight_kg,
-                transport_mode=transport_mode,
-                transport_distance_km=transport_distance_km,
-                manufacturing_intensity=manufacturing_intensity
-            )
+            result = service.predict(**params, engine=engine)
             
             if not result['success']:
                 return Response(result, status=status.HTTP_400_BAD_REQUEST)
             
             # Log prediction
-            PredictionLog.objects.create(
-                product_name=product_name,
-                material=material,
-                weight_kg=weight_kg,
-                transport_mode=transport_mode,
-                transport_distance_km=transport_distance_km,
-                predicted_co2_kg=result['co2_kg'],
-                material_co2=result['breakdown']['material_co2'],
-                manufacturing_co2=result['breakdown']['manufacturing_co2'],
-                transport_co2=result['breakdown']['transport_co2'],
-                trees_to_offset=result['compensation']['trees_per_year']
-            )
+            if request.method != 'GET':
+                t0 = time.perf_counter()
+                PredictionLog.objects.create(**prediction_log_fields(product_name, params, result))
+                STAGE_SECONDS.observe('log_write', time.perf_counter() - t0)
+                publish_live(params, result, engine)
             
             return Response(result, status=status.HTTP_200_OK)
         
-        except ValueError as e:
+        except (ParseError, ValueError) as e:
             return Response({
                 'success': False,
                 'error': f'Invalid input: {str(e)}'
@@ -94,9 +206,80 @@ class PredictCarbonFootprintView(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class GetMaterialsView(APIView):
+class BatchPredictView(RateLimitHeadersMixin, APIView):
+    """Columnar bulk prediction endpoint"""
+    parser_classes = COLUMNAR_PARSERS
+    renderer_classes = COLUMNAR_RENDERERS
+    throttle_classes = [TokenBucketThrottle]
+    
+    def post(self, request):
+        """
+        POST /api/predict/batch/
+        
+        Body (any of):
+            application/json     {"columns": {"material": [...], "weight_kg": [...], ...}}
+            application/msgpack  same layout; numeric columns may be
+                                 {"dtype": "<f8", "data": <bytes>} buffers
+            application/x-npz    one array per column
+            application/x-npy    structured array with one field per column
+        
+        The response uses the same format as the request body, with output
+        columns co2_kg, lower, upper, material_co2, manufacturing_co2,
+        transport_co2, trees_per_year and drift_flagged (an input outside
+        the training range). Batch rows are not logged.
+        """
+        try:
+            columns = self._get_columns(request)
+            service = CarbonFootprintService()
+            result = service.predict_batch(columns)
+            BATCH_ROWS.inc('predict_batch', len(result['co2_kg']))
+            
+            return Response({
+                'success': True,
+                'count': len(result['co2_kg']),
+                'columns': result
+            }, status=status.HTTP_200_OK)
+        
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': f'Invalid input: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+    
+    def get_throttle_cost(self, request):
+        """Each row costs one token"""
+        # np.size: a scalar "column" costs one token here and is rejected by predict_batch
+        return max((int(np.size(values)) for values in self._get_columns(request).values()), default=1)
+    
+    def _get_columns(self, request):
+        """Parsed input columns, decoded once per request"""
+        if not hasattr(request, 'prediction_columns'):
+            request.prediction_columns = columns_from_data(request.data)
+        return request.prediction_columns
+    
+    def perform_content_negotiation(self, request, force=False):
+        """Answer in the request body's format unless Accept says otherwise"""
+        accept = request.META.get('HTTP_ACCEPT', '*/*')
+        if accept in ('', '*/*'):
+            for renderer in self.get_renderers():
+                if renderer.media_type == request.content_type.split(';')[0].strip():
+                    return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Errors are always rendered as JSON"""
+        record_response('predict_batch', response.status_code)
+        if response.status_code >= 400:
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class GetMaterialsView(RateLimitHeadersMixin, APIView):
     """Return available materials"""
+    throttle_classes = [TokenBucketThrottle]
     
+    @method_decorator(conditional_get(api_etag, vary=('Accept',)))
     def get(self, request):
         service = CarbonFootprintService()
         materials = service.get_available_materials()
@@ -107,9 +290,11 @@ class GetMaterialsView(APIView):
         })
 
 
-class ModelInfoView(APIView):
+class ModelInfoView(RateLimitHeadersMixin, APIView):
     """Return model performance metrics"""
+    throttle_classes = [TokenBucketThrottle]
     
+    @method_decorator(conditional_get(api_etag, vary=('Accept',)))
     def get(self, request):
         service = CarbonFootprintService()
         info = service.get_model_info()
@@ -118,3 +303,162 @@ class ModelInfoView(APIView):
             'success': True,
             'model_info': info
         })
+
+
+class AnalyticsView(RateLimitHeadersMixin, APIView):
+    """Emission rollups by material or transport mode over time"""
+    throttle_classes = [TokenBucketThrottle]
+    
+    def get(self, request):
+        """
+        GET /api/analytics/?granularity=day&dimension=material&start=2026-01-01&end=2026-12-31&value=Cotton
+        
+        Served from the hourly/daily rollup tables plus the rows logged
+        since the last compact_rollups run. Pass series=0 for totals only
+        and quantiles=0.5,0.95 to choose the estimated percentiles.
+        """
+        try:
+            quantiles = request.query_params.get('quantiles')
+            quantiles = tuple(float(q) for q in quantiles.split(',') if q) if quantiles is not None else DEFAULT_QUANTILES
+            bounds = build_filters(request.query_params.get('start'), request.query_params.get('end'))
+            result = query_rollups(
+                granularity=request.query_params.get('granularity', 'day'),
+                dimension=request.query_params.get('dimension', 'material'),
+                start=bounds.get('created_at__gte'),
+                end=bounds.get('created_at__lt'),
+                values=request.query_params.getlist('value') or None,
+                include_series=request.query_params.get('series', '1') not in ('0', 'false'),
+                quantiles=quantiles,
+            )
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            **result
+        })
+
+
+class ServiceStatsView(APIView):
+    """Return admission-control and micro-batching counters"""
+    
+    def get(self, request):
+        admission = get_admission_controller()
+        service = CarbonFootprintService()
+        
+        return Response({
+            'success': True,
+            'admission': admission.stats() if admission else None,
+            'batching': service.get_batching_stats()
+        })
+
+
+# Lifetime of /api/insights/ responses requested with the current ?v= version
+INSIGHTS_MAX_AGE = 365 * 24 * 3600
+# ... and without it (clients revalidate with If-None-Match afterwards)
+INSIGHTS_UNVERSIONED_MAX_AGE = 3600
+
+
+def _insights_etag(request):
+    try:
+        return CarbonFootprintService().get_insights()[1]
+    except RuntimeError:
+        return None
+
+
+@condition(etag_func=_insights_etag)
+def insights_view(request):
+    """
+    GET /api/insights/ - feature importances, partial dependence, factor
+    tables and residuals precomputed at training time. The /insights/ page
+    requests ?v=<etag>, which changes with the model and is cached for a year.
+    """
+    try:
+        body, etag = CarbonFootprintService().get_insights()
+    except RuntimeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response = HttpResponse(b'{"success":true,"insights":' + body + b'}', content_type='application/json')
+    if request.GET.get('v') == etag:
+        patch_cache_control(response, public=True, max_age=INSIGHTS_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=INSIGHTS_UNVERSIONED_MAX_AGE)
+    return response
+
+
+# /api/factors/ lifetimes, as for /api/insights/ (factors can change without a new model)
+FACTORS_MAX_AGE = INSIGHTS_MAX_AGE
+FACTORS_UNVERSIONED_MAX_AGE = 300
+
+
+def _factors_etag(request):
+    try:
+        return CarbonFootprintService().get_factor_table()[1]
+    except RuntimeError:
+        return None
+
+
+@condition(etag_func=_factors_etag)
+def factors_view(request):
+    """
+    GET /api/factors/ - emission factors for every label the model accepts,
+    as parallel arrays, for the estimate computed in the browser. Pages embed
+    the current ETag and request ?v=<etag>, which is cached for a year.
+    """
+    try:
+        body, etag = CarbonFootprintService().get_factor_table()
+    except RuntimeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response = HttpResponse(
+        b'{"success":true,"version":"' + etag.encode() + b'","factors":' + body + b'}',
+        content_type='application/json',
+    )
+    if request.GET.get('v') == etag:
+        patch_cache_control(response, public=True, max_age=FACTORS_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=FACTORS_UNVERSIONED_MAX_AGE)
+    return response
+
+
+def metrics_view(request):
+    """GET /api/metrics/ - Prometheus text exposition, summed across workers"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def live_view(request):
+    """
+    GET /api/live/ - server-sent events for predictions as they are made
+    
+    A new stream starts with the last PREDICTOR_LIVE['BACKLOG'] entries;
+    a reconnect with Last-Event-ID continues after that event when it came
+    from this worker and is still in the ring.
+    
+    Under ASGI the stream is served from the event loop; under WSGI each
+    stream holds a worker thread. Either way requests are throttled like
+    the other API views and a worker serves at most MAX_SUBSCRIBERS streams
+    (503 with Retry-After beyond that).
+    """
+    feed = get_feed()
+    if feed is None:
+        raise Http404("Live feed is disabled")
+    throttled = check_throttle(request)
+    if throttled is not None:
+        return throttled
+    config = getattr(settings, 'PREDICTOR_LIVE', {})
+    after = feed.start_position(request.headers.get('Last-Event-ID'), config.get('BACKLOG', 20))
+    subscription = feed.subscribe(after, config.get('HEARTBEAT_S', 15), config.get('MAX_STREAM_S', 300),
+                                  config.get('MAX_SUBSCRIBERS', 8), asynchronous=isinstance(request, ASGIRequest))
+    if subscription is None:
+        response = JsonResponse({
+            'success': False,
+            'error': 'Too many live streams, please retry later'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = str(config.get('RETRY_AFTER_S', 30))
+        return response
+    response = add_rate_limit_headers(request, StreamingHttpResponse(subscription, content_type='text/event-stream'))
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
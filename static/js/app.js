@@ -8,18 +8,21 @@ document.addEventListener('DOMContentLoaded', function() {
     const form = document.getElementById('carbonForm');
     
     if (form) {
+        // Emission factors for the instant estimate (null until loaded)
+        let factors = null;
+        loadFactors(form.dataset.factorsUrl, form.dataset.factorsVersion)
+            .then(table => {
+                factors = table;
+                updateEstimatePreview(factors);
+            })
+            .catch(error => console.warn('Estimate unavailable:', error));
+        form.addEventListener('input', () => updateEstimatePreview(factors));
+        
         form.addEventListener('submit', async function(e) {
             e.preventDefault();
             
             // Get form values
-            const formData = {
-                product_name: document.getElementById('productName').value,
-                material: document.getElementById('material').value,
-                weight_kg: parseFloat(document.getElementById('weight').value),
-                transport_mode: document.getElementById('transportMode').value,
-                transport_distance_km: parseFloat(document.getElementById('distance').value),
-                manufacturing_intensity: 'MEDIUM'
-            };
+            const formData = readCarbonForm();
             
             // Validate
             if (!formData.material || !formData.transport_mode) {
@@ -27,6 +30,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             
+            // Show the estimate straight away; the results page confirms it with the model
+            const estimate = factors && estimateFootprint(factors, formData);
+            if (estimate) {
+                sessionStorage.setItem('carbonResults', JSON.stringify(estimate));
+                sessionStorage.setItem('carbonPending', JSON.stringify(formData));
+                window.location.href = '/results/';
+                return;
+            }
+            
             // Show loading state
             document.getElementById('loadingState').classList.remove('hidden');
             form.style.opacity = '0.5';
@@ -68,6 +80,183 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+function readCarbonForm() {
+    return {
+        product_name: document.getElementById('productName').value,
+        material: document.getElementById('material').value,
+        weight_kg: parseFloat(document.getElementById('weight').value),
+        transport_mode: document.getElementById('transportMode').value,
+        transport_distance_km: parseFloat(document.getElementById('distance').value),
+        manufacturing_intensity: 'MEDIUM'
+    };
+}
+
+// ========== CLIENT-SIDE ESTIMATE ==========
+
+const FACTORS_STORAGE_KEY = 'carbonFactors';
+
+/**
+ * Emission-factor table for the given version: from localStorage when it
+ * is already there, otherwise from /api/factors/?v=<version> (cached by the
+ * browser for a year), then stored for the next visit
+ */
+async function loadFactors(url, version) {
+    if (!url || !version) return null;
+    try {
+        const stored = JSON.parse(localStorage.getItem(FACTORS_STORAGE_KEY));
+        if (stored && stored.version === version) return stored.factors;
+    } catch (error) {
+        // Unreadable or disabled storage: fall back to the network
+    }
+    
+    const response = await fetch(`${url}?v=${encodeURIComponent(version)}`);
+    const result = await response.json();
+    if (!result.success) return null;
+    try {
+        localStorage.setItem(FACTORS_STORAGE_KEY, JSON.stringify({ version: result.version, factors: result.factors }));
+    } catch (error) {
+        // Quota exceeded or storage disabled: keep the table for this page only
+    }
+    return result.factors;
+}
+
+/**
+ * Emission-factor estimate shaped like a /api/predict/ response (the
+ * server's analytic engine), or null for inputs the table can't price
+ */
+function estimateFootprint(factors, input) {
+    const m = factors.materials.indexOf(input.material);
+    const t = factors.transport_modes.indexOf(input.transport_mode);
+    const i = factors.intensities.indexOf(input.manufacturing_intensity);
+    if (m < 0 || t < 0 || i < 0 || !(input.weight_kg > 0) || !(input.transport_distance_km >= 0)) {
+        return null;
+    }
+    
+    const materialCo2 = input.weight_kg * factors.material_factor[m];
+    const manufacturingCo2 = input.weight_kg * factors.intensity_base[i] * factors.manufacturing_multiplier[m];
+    const transportCo2 = input.weight_kg * (input.transport_distance_km / 1000) * factors.transport_factor[t];
+    const total = materialCo2 + manufacturingCo2 + transportCo2;
+    const breakdown = {
+        materials_percent: roundTo(materialCo2 / total * 100, 1),
+        manufacturing_percent: roundTo(manufacturingCo2 / total * 100, 1),
+        transport_percent: roundTo(transportCo2 / total * 100, 1),
+        material_co2: roundTo(materialCo2, 2),
+        manufacturing_co2: roundTo(manufacturingCo2, 2),
+        transport_co2: roundTo(transportCo2, 2)
+    };
+    // The server's analytic engine sums the rounded parts
+    const co2 = breakdown.material_co2 + breakdown.manufacturing_co2 + breakdown.transport_co2;
+    
+    const trees = co2 / 20;
+    const treesDisplay = Math.max(Math.ceil(trees), 1);
+    const carKm = roundTo(co2 / 0.25, 1);
+    return {
+        success: true,
+        engine: 'estimate',
+        co2_kg: roundTo(co2, 2),
+        breakdown: breakdown,
+        compensation: {
+            trees_per_year: Math.max(roundTo(trees, 2), 0.01),
+            trees_display: treesDisplay,
+            rec_credits: roundTo(co2 / 1000, 3),
+            days_vegan: roundTo(co2 / 2.5, 1),
+            message: `Plant ${treesDisplay} tree${trees > 1 ? 's' : ''} to offset this footprint`
+        },
+        equivalency: {
+            car_km: carKm,
+            smartphone_charges: Math.floor(co2 / 0.008),
+            washing_loads: roundTo(co2 / 0.6, 1),
+            display: `Driving a car for ${carKm.toFixed(1)} km`
+        },
+        confidence_interval: {
+            lower: roundTo(co2 * 0.92, 2),
+            upper: roundTo(co2 * 1.08, 2)
+        }
+    };
+}
+
+/**
+ * Live estimate under the home form
+ */
+function updateEstimatePreview(factors) {
+    const preview = document.getElementById('estimatePreview');
+    if (!preview) return;
+    
+    const estimate = factors && estimateFootprint(factors, readCarbonForm());
+    if (estimate) {
+        preview.textContent = `Estimated footprint: ${estimate.co2_kg} kg CO₂e`;
+        preview.classList.remove('hidden');
+    } else {
+        preview.classList.add('hidden');
+    }
+}
+
+/**
+ * Replace the estimate on the results page with the model's prediction
+ */
+async function confirmEstimate(formData) {
+    const status = document.getElementById('estimateStatus');
+    if (status) {
+        status.textContent = 'Estimated from emission factors, confirming with the model...';
+        status.classList.remove('hidden');
+    }
+    
+    try {
+        const response = await fetch('/api/predict/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify(formData)
+        });
+        const result = await response.json();
+        if (result.queued) {
+            // Offline: the service worker sends it later and posts the result back
+            sessionStorage.setItem('carbonPendingQueueId', result.queue_id);
+            if (status) status.textContent = "Estimated from emission factors; you're offline, the model's prediction will follow";
+            return;
+        }
+        if (!result.success) throw new Error(result.error);
+        showConfirmedResult(result);
+    } catch (error) {
+        console.error('Error:', error);
+        if (status) status.textContent = 'Estimated from emission factors (model prediction unavailable)';
+    }
+}
+
+function showConfirmedResult(result) {
+    sessionStorage.setItem('carbonResults', JSON.stringify(result));
+    sessionStorage.removeItem('carbonPending');
+    sessionStorage.removeItem('carbonPendingQueueId');
+    displayResults(result);
+    const status = document.getElementById('estimateStatus');
+    if (status) status.classList.add('hidden');
+}
+
+// ========== SERVICE WORKER ==========
+
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function() {
+        navigator.serviceWorker.register('/sw.js').catch(error => console.warn('Service worker not registered:', error));
+    });
+    
+    // Predictions queued while offline are sent by the worker on reconnect
+    window.addEventListener('online', function() {
+        if (navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({ type: 'replay-predictions' });
+        }
+    });
+    
+    navigator.serviceWorker.addEventListener('message', function(event) {
+        const data = event.data || {};
+        if (data.type !== 'prediction-replayed' || !data.result.success) return;
+        if (String(data.queue_id) === sessionStorage.getItem('carbonPendingQueueId')) {
+            showConfirmedResult(data.result);
+        }
+    });
+}
+
 // ========== RESULTS DISPLAY ==========
 function displayResults(data) {
     // Hide empty state, show results
@@ -170,22 +359,28 @@ function updateCompensation(compensation, equivalency) {
 }
 
 // ========== CHART CREATION ==========
+let breakdownChart = null;
+
 function createBreakdownChart(breakdown) {
     const canvas = document.getElementById('breakdownChart');
     if (!canvas) return;
     
+    // Confirmed results update the estimate's chart in place
+    const values = [breakdown.materials_percent, breakdown.manufacturing_percent, breakdown.transport_percent];
+    if (breakdownChart) {
+        breakdownChart.data.datasets[0].data = values;
+        breakdownChart.update();
+        return;
+    }
+    
     const ctx = canvas.getContext('2d');
     
-    new Chart(ctx, {
+    breakdownChart = new Chart(ctx, {
         type: 'doughnut',
         data: {
             labels: ['Materials', 'Manufacturing', 'Transport'],
             datasets: [{
-                data: [
-                    breakdown.materials_percent,
-                    breakdown.manufacturing_percent,
-                    breakdown.transport_percent
-                ],
+                data: values,
                 backgroundColor: [
                     'rgba(100, 255, 180, 0.9)',
                     'rgba(139, 92, 246, 0.9)',
@@ -244,16 +439,23 @@ function createBreakdownChart(breakdown) {
 // ========== UTILITY FUNCTIONS ==========
 
 /**
- * Animate number from start to end
+ * Animate number from start to end (or from the value a previous
+ * animation of the element ended on)
  */
 function animateValue(element, start, end, duration, suffix = '') {
+    clearInterval(element.animationTimer);
+    if (element.dataset.animatedValue !== undefined) {
+        start = parseFloat(element.dataset.animatedValue);
+    }
+    element.dataset.animatedValue = end;
+    
     const range = end - start;
     const increment = range / (duration / 16);
     let current = start;
     
-    const timer = setInterval(() => {
+    const timer = element.animationTimer = setInterval(() => {
         current += increment;
-        if ((increment > 0 && current >= end) || (increment < 0 && current <= end)) {
+        if (increment === 0 || (increment > 0 && current >= end) || (increment < 0 && current <= end)) {
             current = end;
             clearInterval(timer);
         }
@@ -284,6 +486,21 @@ function getCookie(name) {
     return cookieValue;
 }
 
+/**
+ * Round like Python's round(): toFixed rounds the exact binary value, but
+ * sends exact ties up where Python picks the even neighbour
+ */
+function roundTo(value, digits) {
+    const rounded = value.toFixed(digits);
+    const exact = value.toFixed(100).replace(/0+$/, '');
+    const point = exact.indexOf('.');
+    if (point >= 0 && exact.length - point - 1 === digits + 1 && exact.endsWith('5')) {
+        const lower = exact.slice(0, -1).replace(/\.$/, '');
+        if (Number(lower.slice(-1)) % 2 === 0) return Number(lower);
+    }
+    return Number(rounded);
+}
+
 /**
  * Format large numbers with commas
  */
@@ -310,6 +527,13 @@ if (window.location.pathname === '/results/') {
         if (results) {
             displayResults(JSON.parse(results));
         }
+        
+        // Submitted with a browser estimate: fetch the model's prediction
+        // (unless it is already queued in the service worker)
+        const pending = sessionStorage.getItem('carbonPending');
+        if (pending && !sessionStorage.getItem('carbonPendingQueueId')) {
+            confirmEstimate(JSON.parse(pending));
+        }
     });
 }
 
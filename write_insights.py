@@ -1,7 +1,7 @@
 import os
 
 content = r"""{% extends 'base.html' %}
-{% load static %}
+{% load static cache %}
 
 {% block title %}Model Insights{% endblock %}
 
@@ -193,6 +193,7 @@ content = r"""{% extends 'base.html' %}
 
     <div class="glass-card scroll-scale">
         <h2 style="color: #64ffb4 !important;">Model Performance</h2>
+        {% cache fragment_timeout insights_metrics page_version %}
         {% if model_info %}
         <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 2rem; align-items: center; margin-top: 1rem;">
             <div class="accuracy-ring-container">
@@ -226,7 +227,7 @@ content = r"""{% extends 'base.html' %}
                 <div>
                     <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
                         <span>Training Samples</span>
-                        <span class="metric-counter" style="font-size: 1.5rem;" data-target="5000">0</span>
+                        <span class="metric-counter" id="samplesCounter" style="font-size: 1.5rem;" data-target="0">0</span>
                     </div>
                     <small style="opacity: 0.7;">Synthetic dataset size</small>
                 </div>
@@ -235,6 +236,7 @@ content = r"""{% extends 'base.html' %}
         {% else %}
         <p class="text-muted">Model information not available.</p>
         {% endif %}
+        {% endcache %}
     </div>
 
     <div class="glass-card mt-4 scroll-fade-in">
@@ -256,8 +258,8 @@ content = r"""{% extends 'base.html' %}
                 <span class="formula-toggle" style="color: #64ffb4 !important;">+</span>
             </div>
             <div class="formula-details">
-                <div class="formula-code" style="color: #64ffb4 !important;">CO2 = Weight x Intensity Factor x 1.4</div>
-                <p style="margin-top: 1rem; font-size: 0.9rem; opacity: 0.7;">Intensity: Low (0.5), Medium (1.5), High (3.5).</p>
+                <div class="formula-code" style="color: #64ffb4 !important;">CO2 = Weight x Intensity Factor x Material Multiplier</div>
+                <p style="margin-top: 1rem; font-size: 0.9rem; opacity: 0.7;">Intensity: Low (0.5), Medium (1.5), High (3.5). Multiplier: per material, from 0.5 (produce) to 2.5 (aluminum).</p>
             </div>
         </div>
         <div class="formula-card" onclick="toggleFormula(this)">
@@ -319,22 +321,63 @@ content = r"""{% extends 'base.html' %}
             </div>
         </div>
     </div>
+
+    <div class="glass-card mt-4 scroll-fade-in">
+        <h2 style="color: #64ffb4 !important;">What Drives the Model</h2>
+        <p style="margin-top: 0.5rem; opacity: 0.8;">Computed when the model was trained: feature importances, the average prediction as one input varies, and held-out errors by category.</p>
+        <div class="charts-grid">
+            <div class="chart-wrapper">
+                <h3>Feature Importance</h3>
+                <canvas id="importanceChart"></canvas>
+            </div>
+            <div class="chart-wrapper">
+                <h3>Partial Dependence
+                    <select id="pdFeature" onchange="createPartialDependenceChart()" style="margin-left: 0.5rem; background: rgba(10, 25, 47, 0.9); color: #64ffb4; border: 1px solid rgba(100, 255, 180, 0.3); border-radius: 4px;"></select>
+                </h3>
+                <canvas id="partialDependenceChart"></canvas>
+            </div>
+        </div>
+        <div class="chart-wrapper" style="margin-top: 2rem;">
+            <h3>Prediction Error by Category (kg CO2e, 5th-95th percentile and median)</h3>
+            <canvas id="residualChart"></canvas>
+        </div>
+    </div>
 </div>
 {% endblock %}
 
 {% block extra_js %}
 <script>
-/* ============ DATA ============ */
-var MATERIALS = {
-    'Leather': 17.0, 'Wool': 10.4, 'Aluminum': 8.2, 'Polyester': 6.2, 'Cotton': 5.5,
-    'Plastic': 3.5, 'Steel': 2.8, 'Paper': 1.3, 'Glass': 0.9, 'Wood': 0.5
-};
-var FOODS = {
-    'Beef': 27.0, 'Lamb': 24.0, 'Shrimp': 18.0, 'Cheese': 13.5, 'Pork': 12.1,
-    'Butter': 12.0, 'Turkey': 10.9, 'Chicken': 6.9, 'Fish': 5.1, 'Eggs': 4.8,
-    'Rice': 4.0, 'Tofu': 2.0
-};
-var TRANSPORT = {'Sea': 0.015, 'Rail': 0.025, 'Road': 0.120, 'Air': 0.950};
+/* ============ DATA (precomputed at training time, see /api/insights/) ============ */
+var INSIGHTS = null;
+var MATERIALS = {};
+var FOODS = {};
+var TRANSPORT = {};
+var FOOD_CHART_SIZE = 12;
+
+function titleCase(s) { return s.charAt(0) + s.slice(1).toLowerCase(); }
+
+function loadInsights() {
+    {% if insights_version %}
+    return fetch('{% url "insights_api" %}?v={{ insights_version|urlencode }}')
+        .then(function(r) { return r.json(); })
+        .then(function(data) {
+            if (!data.success) throw new Error(data.error);
+            INSIGHTS = data.insights;
+            var foods = [];
+            INSIGHTS.factors.materials.forEach(function(m) {
+                var label = m.name.replace('_', ' ');
+                if (m.category === 'Material') MATERIALS[label] = m.factor;
+                else foods.push([label, m.factor]);
+            });
+            /* Materials arrive sorted by factor, highest first */
+            foods.slice(0, FOOD_CHART_SIZE).forEach(function(f) { FOODS[f[0]] = f[1]; });
+            INSIGHTS.factors.transport.forEach(function(t) { TRANSPORT[titleCase(t.mode)] = t.factor; });
+            return INSIGHTS;
+        });
+    {% else %}
+    return Promise.reject(new Error('Model information not available'));
+    {% endif %}
+}
 
 /* ============ CHART DEFAULTS ============ */
 Chart.defaults.color = 'rgba(255, 255, 255, 0.7)';
@@ -473,8 +516,9 @@ function createFoodCharts() {
     var sorted = Object.entries(FOODS).sort(function(a, b) { return a[1] - b[1]; });
     var labels = sorted.map(function(e) { return e[0]; });
     var data = sorted.map(function(e) { return e[1]; });
+    var maxFactor = Math.max.apply(null, data);
     var colors = data.map(function(v) {
-        var ratio = v / 27.0;
+        var ratio = v / maxFactor;
         if (ratio > 0.7) return '#ff5050';
         if (ratio > 0.4) return '#ff8533';
         if (ratio > 0.2) return '#ffc53d';
@@ -686,6 +730,139 @@ function createTransportCharts() {
     });
 }
 
+/* ============ MODEL DRIVER CHARTS ============ */
+var tooltipStyle = {
+    backgroundColor: 'rgba(10, 25, 47, 0.95)',
+    borderColor: '#64ffb4',
+    borderWidth: 1,
+    titleColor: '#64ffb4',
+    bodyColor: '#fff',
+    padding: 12,
+    cornerRadius: 8
+};
+
+function createImportanceChart() {
+    var items = INSIGHTS.feature_importances.slice().sort(function(a, b) { return b.importance - a.importance; });
+    destroyChart('importance');
+    charts['importance'] = new Chart(document.getElementById('importanceChart').getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: items.map(function(i) { return i.feature; }),
+            datasets: [{
+                label: 'Importance',
+                data: items.map(function(i) { return i.importance; }),
+                backgroundColor: transportColors,
+                borderRadius: 4
+            }]
+        },
+        options: {
+            indexAxis: 'y',
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: { display: false },
+                tooltip: Object.assign({}, tooltipStyle, {
+                    callbacks: { label: function(ctx) { return (ctx.parsed.x * 100).toFixed(1) + '% of impurity reduction'; } }
+                })
+            },
+            scales: {
+                x: { ticks: { color: 'rgba(255,255,255,0.5)' }, grid: { color: 'rgba(255,255,255,0.05)' } },
+                y: { ticks: { color: 'rgba(255,255,255,0.7)' }, grid: { display: false } }
+            }
+        }
+    });
+
+    var select = document.getElementById('pdFeature');
+    select.innerHTML = '';
+    Object.keys(INSIGHTS.partial_dependence).forEach(function(name) {
+        var option = document.createElement('option');
+        option.value = name;
+        option.textContent = name;
+        select.appendChild(option);
+    });
+    select.value = items[0].feature;
+}
+
+function createPartialDependenceChart() {
+    var name = document.getElementById('pdFeature').value;
+    var curve = INSIGHTS.partial_dependence[name];
+    var numeric = curve.kind === 'numeric';
+    destroyChart('partialDependence');
+    charts['partialDependence'] = new Chart(document.getElementById('partialDependenceChart').getContext('2d'), {
+        type: numeric ? 'line' : 'bar',
+        data: {
+            labels: numeric ? curve.x.map(function(x) { return x.toFixed(1); }) : curve.x.map(function(x) { return x.replace('_', ' '); }),
+            datasets: [{
+                label: 'Mean predicted kg CO2e',
+                data: curve.y,
+                borderColor: '#64ffb4',
+                backgroundColor: numeric ? 'rgba(100, 255, 180, 0.15)' : materialColors,
+                fill: numeric,
+                tension: 0.3,
+                borderRadius: 4
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            animation: { duration: 800 },
+            plugins: { legend: { display: false }, tooltip: tooltipStyle },
+            scales: {
+                x: { ticks: { color: 'rgba(255,255,255,0.6)', font: { size: 10 }, maxRotation: 45 }, grid: { display: false } },
+                y: {
+                    ticks: { color: 'rgba(255,255,255,0.5)' },
+                    grid: { color: 'rgba(255,255,255,0.05)' },
+                    title: { display: true, text: 'kg CO2e', color: 'rgba(255,255,255,0.4)' }
+                }
+            }
+        }
+    });
+}
+
+function createResidualChart() {
+    var groups = INSIGHTS.residuals.categories;
+    destroyChart('residual');
+    charts['residual'] = new Chart(document.getElementById('residualChart').getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: groups.map(function(g) { return g.category + ' (n=' + g.n + ')'; }),
+            datasets: [{
+                type: 'line',
+                label: 'Median error',
+                data: groups.map(function(g) { return g.p50; }),
+                showLine: false,
+                pointRadius: 6,
+                pointBackgroundColor: '#ffc53d',
+                pointBorderColor: '#fff'
+            }, {
+                label: '5th-95th percentile',
+                data: groups.map(function(g) { return [g.p5, g.p95]; }),
+                backgroundColor: 'rgba(0, 217, 255, 0.35)',
+                borderColor: '#00d9ff',
+                borderWidth: 1,
+                borderRadius: 4,
+                borderSkipped: false
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: { labels: { color: 'rgba(255,255,255,0.7)', usePointStyle: true } },
+                tooltip: tooltipStyle
+            },
+            scales: {
+                x: { ticks: { color: 'rgba(255,255,255,0.6)', font: { size: 10 } }, grid: { display: false } },
+                y: {
+                    ticks: { color: 'rgba(255,255,255,0.5)' },
+                    grid: { color: 'rgba(255,255,255,0.05)' },
+                    title: { display: true, text: 'actual - predicted (kg CO2e)', color: 'rgba(255,255,255,0.4)' }
+                }
+            }
+        }
+    });
+}
+
 /* ============ GENERAL FUNCTIONS ============ */
 function toggleFormula(card) { card.classList.toggle('expanded'); }
 
@@ -701,18 +878,20 @@ function switchTab(event, tabId) {
     else if (tabId === 'tabTransport') createTransportCharts();
 }
 
+function animateCounter(el) {
+    var target = parseFloat(el.dataset.target);
+    var start = performance.now();
+    function tick(now) {
+        var p = Math.min((now - start)/2000, 1);
+        var e = 1 - Math.pow(1 - p, 3);
+        el.textContent = target >= 100 ? Math.round(e * target) : (e * target).toFixed(2);
+        if (p < 1) requestAnimationFrame(tick);
+    }
+    requestAnimationFrame(tick);
+}
+
 function animateCounters() {
-    document.querySelectorAll('.metric-counter').forEach(function(el) {
-        var target = parseFloat(el.dataset.target);
-        var start = performance.now();
-        function tick(now) {
-            var p = Math.min((now - start)/2000, 1);
-            var e = 1 - Math.pow(1 - p, 3);
-            el.textContent = target >= 100 ? Math.round(e * target) : (e * target).toFixed(2);
-            if (p < 1) requestAnimationFrame(tick);
-        }
-        requestAnimationFrame(tick);
-    });
+    document.querySelectorAll('.metric-counter').forEach(animateCounter);
 }
 
 function animateRing() {
@@ -757,10 +936,22 @@ function initParticles() {
 
 /* ============ INIT ============ */
 document.addEventListener('DOMContentLoaded', function() {
-    createMaterialCharts();
     animateCounters();
     initParticles();
     animateRing();
+    loadInsights().then(function(insights) {
+        var samples = document.getElementById('samplesCounter');
+        if (samples) {
+            samples.dataset.target = insights.n_samples;
+            animateCounter(samples);
+        }
+        createMaterialCharts();
+        createImportanceChart();
+        createPartialDependenceChart();
+        createResidualChart();
+    }).catch(function(err) {
+        console.error('Insights unavailable:', err);
+    });
 });
 </script>
 {% endblock %}